@@ -0,0 +1,79 @@
+"""
+Mede o tempo de inicialização do pipeline: importação de cada módulo de `src/`
+e execução de um `main` sem etapas. Cada medição roda em um processo Python
+novo, para que o cache de módulos de uma medição não afete a seguinte.
+
+Uso:
+    python benchmarks/bench_inicializacao.py [--repeticoes 5] [--limite 1.0]
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+DIRETORIO_SRC = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src")
+
+# Dependências que só devem ser carregadas quando a etapa correspondente roda
+MODULOS_PESADOS = ["sklearn", "scipy", "matplotlib", "seaborn"]
+
+CENARIOS = {
+    "import main": "import main",
+    "main([])": "import main; main.main([])",
+    "import puxar_sidra": "import puxar_sidra",
+    "import populacao_dados": "import populacao_dados",
+    "import tratamento": "import tratamento",
+    "import analize": "import analize",
+    "import graficos": "import graficos",
+}
+
+SCRIPT_MEDICAO = """
+import json, sys, time
+sys.path.insert(0, {src!r})
+inicio = time.perf_counter()
+{codigo}
+duracao = time.perf_counter() - inicio
+pesados = sorted(m for m in {pesados!r} if m in sys.modules)
+print(json.dumps({{"segundos": duracao, "pesados": pesados}}))
+"""
+
+def medir_cenario(codigo, repeticoes):
+    """Executa o código em processos novos e retorna os tempos e os módulos pesados carregados."""
+    script = SCRIPT_MEDICAO.format(src=DIRETORIO_SRC, codigo=codigo, pesados=MODULOS_PESADOS)
+    tempos = []
+    pesados = []
+    for _ in range(repeticoes):
+        saida = subprocess.run([sys.executable, "-c", script], capture_output=True, text=True, check=True)
+        resultado = json.loads(saida.stdout.strip().splitlines()[-1])
+        tempos.append(resultado["segundos"])
+        pesados = resultado["pesados"]
+    return tempos, pesados
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark de inicialização do pipeline.")
+    parser.add_argument("--repeticoes", type=int, default=5)
+    parser.add_argument("--limite", type=float, default=1.0,
+                        help="Tempo máximo (s) aceito para 'import main' e 'main([])'.")
+    args = parser.parse_args()
+
+    falhas = []
+    print(f"{'Cenário':<26}{'mediana (s)':>12}{'mín (s)':>10}  dependências pesadas")
+    for nome, codigo in CENARIOS.items():
+        tempos, pesados = medir_cenario(codigo, args.repeticoes)
+        mediana = statistics.median(tempos)
+        print(f"{nome:<26}{mediana:>12.3f}{min(tempos):>10.3f}  {', '.join(pesados) or '-'}")
+        if pesados:
+            falhas.append(f"{nome} carregou {pesados}")
+        if nome in ("import main", "main([])") and mediana > args.limite:
+            falhas.append(f"{nome} levou {mediana:.3f}s (limite {args.limite}s)")
+
+    if falhas:
+        print("\nFalhas:")
+        for falha in falhas:
+            print(f"- {falha}")
+        sys.exit(1)
+    print("\nOK: nenhum módulo importa dependências pesadas e a inicialização está dentro do limite.")
+
+if __name__ == "__main__":
+    main()
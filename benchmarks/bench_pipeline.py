@@ -0,0 +1,260 @@
+"""
+Benchmark das funções principais do pipeline sobre dados sintéticos (ver
+dados_sinteticos.py), em vários tamanhos.
+
+Para cada função e tamanho, mede o tempo (mínimo e mediana de algumas
+repetições) e o pico de memória alocada pelo Python (tracemalloc, em uma
+execução separada, para não distorcer o tempo). A instrumentação do pipeline
+(instrumentacao.py) fica desligada durante as medições. Os resultados são
+gravados em `benchmarks/resultados/ultimo.json` e acrescentados a
+`historico.jsonl`.
+
+Tempos só são comparáveis na mesma máquina, então a referência é gravada por
+máquina (`referencia_<arquitetura>_<n>cpu.json`, ou o arquivo indicado em
+`--referencia`). Para gravar a referência desta máquina, rode o benchmark com
+`--atualizar-referencia` a partir de um commit conhecido; nas execuções
+seguintes, cada medição é comparada com ela e o script termina com erro
+quando alguma fica mais lenta ou usa mais memória do que a tolerância
+permite. Sem referência para a máquina, as medições apenas são gravadas.
+
+Uso:
+    python benchmarks/bench_pipeline.py [--tamanhos pequeno medio] [--casos combinar_dados]
+        [--repeticoes 3] [--tolerancia 1.5] [--atualizar-referencia] [--referencia CAMINHO]
+"""
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime, timezone
+
+DIRETORIO_BENCHMARKS = os.path.dirname(os.path.abspath(__file__))
+DIRETORIO_SRC = os.path.join(os.path.dirname(DIRETORIO_BENCHMARKS), "src")
+DIRETORIO_RESULTADOS = os.path.join(DIRETORIO_BENCHMARKS, "resultados")
+sys.path.insert(0, DIRETORIO_SRC)
+
+import matplotlib  # noqa: E402
+matplotlib.use("Agg")
+
+import pandas as pd  # noqa: E402
+
+import dados_sinteticos  # noqa: E402
+from indice_idades import FAIXAS_PADRAO  # noqa: E402
+from instrumentacao import definir_instrumentacao  # noqa: E402
+
+TAMANHOS = {
+    "pequeno": {"locais": 28, "variaveis": 3, "idades": tuple(range(0, 91))},
+    "medio": {"locais": 560, "variaveis": 3, "idades": tuple(range(30, 66))},
+    "grande": {"locais": 5570, "variaveis": 3, "idades": tuple(range(30, 66))},
+}
+
+# Anos das projeções nos benchmarks (a planilha real vai de 2000 a 2070)
+ANOS_PROJECAO = tuple(range(2005, 2026))
+
+# Fração dos locais sem dados de empresas em 2021 e 2022, para a interpolação ter o que estimar
+FRACAO_SEM_ANOS_FINAIS = 0.1
+
+def preparar_entradas(tamanho, diretorio):
+    """Gera os dados sintéticos de um tamanho e as entradas de cada função medida."""
+    from armazenamento import aplicar_esquema
+    from puxar_sidra import ajustar_dataframe
+    from populacao_dados import processar_projecoes
+    from analize import (preparar_dados_populacao, combinar_dados, interpolar_dados, aplicar_clusterizacao,
+                         matriz_clusterizacao)
+    from indice_idades import construir_indice
+    from main import tratar_dados
+
+    parametros = TAMANHOS[tamanho]
+    sidra = dados_sinteticos.gerar_sidra(parametros["locais"], n_variaveis=parametros["variaveis"])
+    projecoes = dados_sinteticos.gerar_projecoes(parametros["locais"], anos=ANOS_PROJECAO,
+                                                 idades=parametros["idades"])
+    xlsx_projecoes = dados_sinteticos.salvar_projecoes_xlsx(projecoes, os.path.join(diretorio, "projecoes.xlsx"))
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        variaveis = aplicar_esquema(ajustar_dataframe(sidra))
+        populacao = processar_projecoes(xlsx_projecoes)
+        empresas, populacao = tratar_dados(variaveis, aplicar_esquema(populacao), salvar=False)
+    empresas = empresas.rename(columns={"Brasil e Unidade da Federação": "LOCAL"})
+    empresas = empresas[["LOCAL", "Ano", "Número de empresas ativas"]]
+    locais = empresas["LOCAL"].astype(str).unique()
+    sem_anos_finais = locais[:: int(1 / FRACAO_SEM_ANOS_FINAIS)]
+    empresas = empresas[~(empresas["Ano"].isin([2021, 2022]) & empresas["LOCAL"].isin(sem_anos_finais))]
+    empresas = empresas.groupby(["Ano", "LOCAL"], as_index=False, observed=True).sum()
+
+    populacao = preparar_dados_populacao(populacao)
+    painel = combinar_dados(populacao, empresas)
+    interpolado = interpolar_dados(painel, metodo="linear")
+    clusterizado = aplicar_clusterizacao(interpolar_dados(painel, metodo="linear"))
+    X, validos = matriz_clusterizacao(interpolado, "kmeans")
+
+    # Índice de idades a partir da tabela completa, como obter_indice faz com a planilha
+    tabela = projecoes.rename(columns=str)
+    tabela["IDADE"] = pd.to_numeric(tabela["IDADE"].astype(str).str.rstrip("+"))
+    anos_indice = [str(ano) for ano in ANOS_PROJECAO]
+    idades = parametros["idades"]
+    return {
+        "sidra": sidra,
+        "xlsx_projecoes": xlsx_projecoes,
+        "variaveis": variaveis,
+        "populacao": populacao,
+        "empresas": empresas,
+        "painel": painel,
+        "interpolado": interpolado,
+        "graficos": clusterizado.sem_locais("Brasil"),
+        "indice": construir_indice(tabela, anos_indice),
+        "faixas": [(inicio, fim) for inicio, fim in FAIXAS_PADRAO if inicio >= idades[0] and fim <= idades[-1]],
+        "matriz": X[validos],
+        "diretorio": diretorio,
+    }
+
+def casos():
+    """Dicionário nome -> função que recebe as entradas e executa a operação medida."""
+    from puxar_sidra import ajustar_dataframe
+    from populacao_dados import processar_projecoes
+    from analize import combinar_dados, interpolar_dados, aplicar_clusterizacao
+    from razoes import RAZOES_PADRAO, calcular_razoes
+    from indice_idades import varrer_cenarios
+    from reamostragem import probabilidades_classificacao
+    from estabilidade_clusters import varrer_estabilidade
+    from graficos import gerar_grafico_dispersao, gerar_grafico_tendencia, gerar_heatmap_saturacao
+
+    return {
+        "ajustar_dataframe": lambda e: ajustar_dataframe(e["sidra"]),
+        "processar_projecoes": lambda e: processar_projecoes(e["xlsx_projecoes"]),
+        "combinar_dados": lambda e: combinar_dados(e["populacao"], e["empresas"]),
+        "interpolar_dados[linear]": lambda e: interpolar_dados(e["painel"], metodo="linear"),
+        "interpolar_dados[automatico]": lambda e: interpolar_dados(e["painel"], metodo="automatico"),
+        "aplicar_clusterizacao[kmeans]": lambda e: aplicar_clusterizacao(e["interpolado"], metodo="kmeans"),
+        "aplicar_clusterizacao[minibatch]": lambda e: aplicar_clusterizacao(e["interpolado"], metodo="minibatch"),
+        "aplicar_clusterizacao[dtw]": lambda e: aplicar_clusterizacao(e["interpolado"], metodo="dtw"),
+        "calcular_razoes": lambda e: calcular_razoes(e["interpolado"], e["variaveis"], RAZOES_PADRAO),
+        "varrer_cenarios": lambda e: varrer_cenarios(e["indice"], e["interpolado"].sem_locais("Brasil"),
+                                                     faixas=e["faixas"]),
+        "probabilidades_classificacao": lambda e: probabilidades_classificacao(
+            e["interpolado"].sem_locais("Brasil"), metodo="linear"),
+        "varrer_estabilidade": lambda e: varrer_estabilidade(e["matriz"]),
+        "gerar_grafico_dispersao": lambda e: gerar_grafico_dispersao(e["graficos"], e["diretorio"], mostrar=False),
+        "gerar_grafico_tendencia": lambda e: gerar_grafico_tendencia(
+            e["graficos"], e["graficos"].locais_por_cluster(), e["diretorio"], mostrar=False),
+        "gerar_heatmap_saturacao": lambda e: gerar_heatmap_saturacao(e["graficos"], e["diretorio"], mostrar=False),
+    }
+
+def medir(funcao, entradas, repeticoes):
+    """Retorna (tempo mínimo, tempo mediano, pico de memória em MB) da função."""
+    tempos = []
+    with contextlib.redirect_stdout(io.StringIO()):
+        for _ in range(repeticoes):
+            inicio = time.perf_counter()
+            funcao(entradas)
+            tempos.append(time.perf_counter() - inicio)
+
+        tracemalloc.start()
+        try:
+            funcao(entradas)
+            _, pico = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+    return min(tempos), statistics.median(tempos), pico / 1024 ** 2
+
+def ambiente():
+    """Versões e máquina em que as medições foram feitas."""
+    import numpy
+    import pandas
+    import sklearn
+
+    return {
+        "python": platform.python_version(),
+        "numpy": numpy.__version__,
+        "pandas": pandas.__version__,
+        "sklearn": sklearn.__version__,
+        "plataforma": platform.platform(),
+        "cpus": os.cpu_count(),
+    }
+
+def caminho_referencia_local():
+    """Referência desta máquina (arquitetura e número de CPUs)."""
+    return os.path.join(DIRETORIO_RESULTADOS, f"referencia_{platform.machine()}_{os.cpu_count()}cpu.json")
+
+def comparar(resultados, referencia, tolerancia):
+    """Lista de regressões: medições mais lentas ou com mais memória que `tolerancia` x referência."""
+    anteriores = {(r["tamanho"], r["caso"]): r for r in referencia.get("resultados", [])}
+    regressoes = []
+    for resultado in resultados:
+        anterior = anteriores.get((resultado["tamanho"], resultado["caso"]))
+        if anterior is None:
+            continue
+        for chave, unidade in (("segundos_min", "s"), ("pico_mb", "MB")):
+            # Medições muito pequenas variam demais para serem comparadas
+            minimo = 0.01 if unidade == "s" else 1.0
+            if resultado[chave] > max(anterior[chave], minimo) * tolerancia:
+                regressoes.append(f"{resultado['tamanho']}/{resultado['caso']}: {chave} "
+                                  f"{resultado[chave]:.3f}{unidade} (referência {anterior[chave]:.3f}{unidade})")
+    return regressoes
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark das funções do pipeline com dados sintéticos.")
+    parser.add_argument("--tamanhos", nargs="+", choices=list(TAMANHOS), default=list(TAMANHOS))
+    parser.add_argument("--casos", nargs="+", help="Casos a medir (padrão: todos).")
+    parser.add_argument("--repeticoes", type=int, default=3)
+    parser.add_argument("--tolerancia", type=float, default=1.5,
+                        help="Razão máxima aceita em relação à referência antes de acusar regressão.")
+    parser.add_argument("--atualizar-referencia", action="store_true",
+                        help="Grava os resultados desta execução como a nova referência.")
+    parser.add_argument("--referencia", default=caminho_referencia_local(),
+                        help="Arquivo de referência (padrão: o desta máquina em benchmarks/resultados/).")
+    args = parser.parse_args()
+    definir_instrumentacao(ativo=False)
+
+    funcoes = casos()
+    nomes = args.casos or list(funcoes)
+    desconhecidos = [nome for nome in nomes if nome not in funcoes]
+    if desconhecidos:
+        parser.error(f"Casos desconhecidos: {desconhecidos}. Opções: {list(funcoes)}")
+
+    resultados = []
+    print(f"{'Tamanho':<9}{'Caso':<36}{'mín (s)':>10}{'mediana (s)':>13}{'pico (MB)':>11}")
+    for tamanho in args.tamanhos:
+        with tempfile.TemporaryDirectory() as diretorio:
+            entradas = preparar_entradas(tamanho, diretorio)
+            for nome in nomes:
+                minimo, mediana, pico = medir(funcoes[nome], entradas, args.repeticoes)
+                print(f"{tamanho:<9}{nome:<36}{minimo:>10.3f}{mediana:>13.3f}{pico:>11.1f}")
+                resultados.append({"tamanho": tamanho, "caso": nome, "segundos_min": minimo,
+                                   "segundos_mediana": mediana, "pico_mb": pico})
+
+    execucao = {"data": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+                "ambiente": ambiente(), "resultados": resultados}
+    os.makedirs(DIRETORIO_RESULTADOS, exist_ok=True)
+    with open(os.path.join(DIRETORIO_RESULTADOS, "ultimo.json"), "w", encoding="utf-8") as f:
+        json.dump(execucao, f, ensure_ascii=False, indent=2)
+    with open(os.path.join(DIRETORIO_RESULTADOS, "historico.jsonl"), "a", encoding="utf-8") as f:
+        f.write(json.dumps(execucao, ensure_ascii=False) + "\n")
+
+    caminho_referencia = args.referencia
+    if args.atualizar_referencia:
+        with open(caminho_referencia, "w", encoding="utf-8") as f:
+            json.dump(execucao, f, ensure_ascii=False, indent=2)
+        print(f"\nReferência atualizada: {caminho_referencia}")
+        return
+    if not os.path.exists(caminho_referencia):
+        print(f"\nSem referência para esta máquina em {caminho_referencia} "
+              "(use --atualizar-referencia para gravar uma).")
+        return
+
+    with open(caminho_referencia, encoding="utf-8") as f:
+        regressoes = comparar(resultados, json.load(f), args.tolerancia)
+    if regressoes:
+        print(f"\nRegressões (tolerância {args.tolerancia}x):")
+        for regressao in regressoes:
+            print(f"- {regressao}")
+        sys.exit(1)
+    print(f"\nOK: nenhuma medição ultrapassou {args.tolerancia}x a referência.")
+
+if __name__ == "__main__":
+    main()
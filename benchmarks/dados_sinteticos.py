@@ -0,0 +1,169 @@
+"""
+Gerador de dados sintéticos nos formatos lidos pelo pipeline.
+
+Produz, sem acessar a rede:
+- a resposta JSON da API SIDRA (cabeçalho na primeira linha, seguido dos
+  registros com as chaves NC, NN, MC, MN, V, D1C, D1N, D2C, D2N, D3C, D3N);
+- a planilha de projeções populacionais do IBGE (5 linhas de título, cabeçalho
+  na linha 6 com IDADE, SEXO, CÓD., SIGLA, LOCAL e uma coluna por ano, idade
+  "90+" como texto e nota de rodapé), além da mesma tabela em CSV.
+
+O tamanho é controlado pelo número de locais (Brasil, UFs e, acima de 28,
+municípios fictícios), pelos anos, pelas idades e pelo número de variáveis.
+
+Uso:
+    python benchmarks/dados_sinteticos.py saida/ --locais 500 --variaveis 3
+"""
+import argparse
+import json
+import os
+
+import numpy as np
+import pandas as pd
+
+UFS = [
+    (11, "RO", "Rondônia"), (12, "AC", "Acre"), (13, "AM", "Amazonas"), (14, "RR", "Roraima"),
+    (15, "PA", "Pará"), (16, "AP", "Amapá"), (17, "TO", "Tocantins"), (21, "MA", "Maranhão"),
+    (22, "PI", "Piauí"), (23, "CE", "Ceará"), (24, "RN", "Rio Grande do Norte"), (25, "PB", "Paraíba"),
+    (26, "PE", "Pernambuco"), (27, "AL", "Alagoas"), (28, "SE", "Sergipe"), (29, "BA", "Bahia"),
+    (31, "MG", "Minas Gerais"), (32, "ES", "Espírito Santo"), (33, "RJ", "Rio de Janeiro"),
+    (35, "SP", "São Paulo"), (41, "PR", "Paraná"), (42, "SC", "Santa Catarina"),
+    (43, "RS", "Rio Grande do Sul"), (50, "MS", "Mato Grosso do Sul"), (51, "MT", "Mato Grosso"),
+    (52, "GO", "Goiás"), (53, "DF", "Distrito Federal"),
+]
+
+CABECALHO_SIDRA = {
+    "NC": "Nível Territorial (Código)", "NN": "Nível Territorial",
+    "MC": "Unidade de Medida (Código)", "MN": "Unidade de Medida", "V": "Valor",
+    "D1C": "Brasil e Unidade da Federação (Código)", "D1N": "Brasil e Unidade da Federação",
+    "D2C": "Ano (Código)", "D2N": "Ano", "D3C": "Variável (Código)", "D3N": "Variável",
+}
+
+# A primeira variável é a usada pelo pipeline
+VARIAVEIS = [
+    (630, "Número de empresas ativas", "Unidades"),
+    (706, "Pessoal ocupado total", "Pessoas"),
+    (707, "Pessoal ocupado assalariado", "Pessoas"),
+    (662, "Salários e outras remunerações", "Mil Reais"),
+]
+
+ANOS_SIDRA = tuple(range(2007, 2023))
+ANOS_PROJECAO = tuple(range(2000, 2071))
+IDADES = tuple(range(0, 91))
+SEXOS = ("Homens", "Mulheres", "Ambos")
+
+def gerar_locais(n_locais):
+    """
+    Lista de (código, sigla, nome, nível) com Brasil, as UFs e, se `n_locais`
+    passar de 28, municípios fictícios distribuídos entre as UFs.
+    """
+    locais = [(1, "BR", "Brasil", 1)] + [(codigo, sigla, nome, 3) for codigo, sigla, nome in UFS]
+    for i in range(max(0, n_locais - len(locais))):
+        codigo_uf, sigla, _ = UFS[i % len(UFS)]
+        locais.append((codigo_uf * 100000 + i // len(UFS), sigla, f"Município {i:05d} ({sigla})", 6))
+    return locais[:n_locais]
+
+def _variaveis(n_variaveis):
+    variaveis = list(VARIAVEIS[:n_variaveis])
+    for i in range(len(variaveis), n_variaveis):
+        variaveis.append((900 + i, f"Variável sintética {i}", "Unidades"))
+    return variaveis
+
+def gerar_sidra(n_locais=28, anos=ANOS_SIDRA, n_variaveis=3, faltantes=0.02, semente=0):
+    """
+    Retorna a resposta da SIDRA (lista de dicionários) para `n_locais` locais,
+    `anos` e `n_variaveis` variáveis. Uma fração `faltantes` dos valores vem como "-".
+    """
+    rng = np.random.default_rng(semente)
+    locais = gerar_locais(n_locais)
+    variaveis = _variaveis(n_variaveis)
+    base = rng.uniform(1_000, 100_000, size=(len(locais), len(variaveis)))
+    crescimento = rng.normal(0.02, 0.01, size=(len(locais), len(variaveis)))
+    ausentes = rng.random((len(locais), len(anos), len(variaveis))) < faltantes
+
+    niveis = {1: "Brasil", 3: "Unidade da Federação", 6: "Município"}
+    registros = [dict(CABECALHO_SIDRA)]
+    for i, (codigo, _, nome, nivel) in enumerate(locais):
+        for j, ano in enumerate(anos):
+            for k, (codigo_variavel, nome_variavel, unidade) in enumerate(variaveis):
+                valor = "-" if ausentes[i, j, k] else str(int(base[i, k] * (1 + crescimento[i, k]) ** j))
+                registros.append({
+                    "NC": str(nivel), "NN": niveis[nivel], "MC": "1", "MN": unidade, "V": valor,
+                    "D1C": str(codigo), "D1N": nome, "D2C": str(ano), "D2N": str(ano),
+                    "D3C": str(codigo_variavel), "D3N": nome_variavel,
+                })
+    return registros
+
+def gerar_projecoes(n_locais=28, anos=ANOS_PROJECAO, idades=IDADES, semente=0):
+    """
+    Retorna a tabela de projeções populacionais (uma linha por local, sexo e
+    idade; uma coluna por ano), com a última idade de 90 em diante como "90+".
+    """
+    rng = np.random.default_rng(semente)
+    locais = gerar_locais(n_locais)
+    n_linhas = len(locais) * len(SEXOS) * len(idades)
+    base = rng.uniform(100, 50_000, size=n_linhas)
+    crescimento = rng.normal(0.005, 0.005, size=n_linhas)
+    valores = np.rint(base[:, None] * (1 + crescimento[:, None]) ** np.arange(len(anos))[None, :]).astype(np.int64)
+
+    rotulos_idade = [f"{idade}+" if idade == 90 else idade for idade in idades]
+    tabela = pd.DataFrame({
+        "IDADE": np.tile(np.array(rotulos_idade, dtype=object), len(locais) * len(SEXOS)),
+        "SEXO": np.tile(np.repeat(SEXOS, len(idades)), len(locais)),
+        "CÓD.": np.repeat([codigo for codigo, _, _, _ in locais], len(SEXOS) * len(idades)),
+        "SIGLA": np.repeat([sigla for _, sigla, _, _ in locais], len(SEXOS) * len(idades)),
+        "LOCAL": np.repeat([nome for _, _, nome, _ in locais], len(SEXOS) * len(idades)),
+    })
+    return pd.concat([tabela, pd.DataFrame(valores, columns=list(anos))], axis=1)
+
+def salvar_sidra_json(registros, caminho):
+    """Grava a resposta da SIDRA em JSON, como a API devolve."""
+    with open(caminho, "w", encoding="utf-8") as f:
+        json.dump(registros, f, ensure_ascii=False)
+    return caminho
+
+def salvar_projecoes_xlsx(tabela, caminho):
+    """Grava a tabela no leiaute da planilha do IBGE (títulos, cabeçalho na linha 6 e rodapé)."""
+    from openpyxl import Workbook
+
+    workbook = Workbook(write_only=True)
+    planilha = workbook.create_sheet("1) POP. IDADE SIMPLES")
+    planilha.append(["PROJEÇÕES DA POPULAÇÃO (dados sintéticos)"])
+    planilha.append(["População por sexo e idade simples"])
+    for _ in range(3):
+        planilha.append([])
+    planilha.append(list(tabela.columns))
+    for linha in tabela.itertuples(index=False):
+        planilha.append(list(linha))
+    planilha.append([])
+    planilha.append(["Fonte: dados sintéticos gerados para testes e benchmarks."])
+    workbook.save(caminho)
+    return caminho
+
+def salvar_projecoes_csv(tabela, caminho):
+    """Grava a tabela de projeções em CSV (formato lido por `filtrar_csv`)."""
+    tabela.rename(columns=str).to_csv(caminho, index=False)
+    return caminho
+
+def main():
+    parser = argparse.ArgumentParser(description="Gera dados sintéticos da SIDRA e das projeções do IBGE.")
+    parser.add_argument("diretorio")
+    parser.add_argument("--locais", type=int, default=28)
+    parser.add_argument("--variaveis", type=int, default=3)
+    parser.add_argument("--anos", type=int, nargs=2, default=(2007, 2022), metavar=("INICIO", "FIM"),
+                        help="Anos da resposta da SIDRA.")
+    parser.add_argument("--idades", type=int, default=91, help="Número de idades (a partir de 0).")
+    parser.add_argument("--semente", type=int, default=0)
+    args = parser.parse_args()
+
+    os.makedirs(args.diretorio, exist_ok=True)
+    anos = tuple(range(args.anos[0], args.anos[1] + 1))
+    sidra = gerar_sidra(args.locais, anos, args.variaveis, semente=args.semente)
+    projecoes = gerar_projecoes(args.locais, idades=tuple(range(args.idades)), semente=args.semente)
+    for caminho in (salvar_sidra_json(sidra, os.path.join(args.diretorio, "sidra.json")),
+                    salvar_projecoes_xlsx(projecoes, os.path.join(args.diretorio, "projecoes.xlsx")),
+                    salvar_projecoes_csv(projecoes, os.path.join(args.diretorio, "projecoes.csv"))):
+        print(f"Arquivo gerado: {caminho}")
+
+if __name__ == "__main__":
+    main()
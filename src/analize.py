@@ -1,109 +1,243 @@
 import pandas as pd
 import numpy as np
-from scipy.interpolate import interp1d
-from sklearn.cluster import KMeans
 import os
 
+from armazenamento import caminho_intermediario, formato_atual, EXTENSOES, ler_tabela, salvar_tabela
+from painel import Painel
+from instrumentacao import instrumentar
+
+ANOS_POPULACAO = [str(ano) for ano in range(2007, 2023)]
+
+# Centros dos clusters da última análise, usados pela atualização incremental
+CAMINHO_CENTROIDES = os.path.join("data", "centroides.npz")
+
+@instrumentar()
 def carregar_dados_populacao(caminho_arquivo):
     """
-    Carrega os dados populacionais e transforma os anos de colunas para linhas.
+    Carrega os dados populacionais e soma a população de cada local por ano.
+    """
+    return preparar_dados_populacao(ler_tabela(caminho_arquivo, colunas=["LOCAL"] + ANOS_POPULACAO))
+
+@instrumentar()
+def preparar_dados_populacao(df):
+    """
+    Soma a população de cada local por ano em dados populacionais já carregados,
+    mantendo os anos como colunas (uma linha por local).
     """
-    df = pd.read_csv(caminho_arquivo)
-    anos = [str(ano) for ano in range(2007, 2023)]
-    df = df[["LOCAL"] + anos]
-    df = df.melt(id_vars=["LOCAL"], var_name="Ano", value_name="População")
-    df["Ano"] = df["Ano"].astype(int)
-    return df.groupby(["Ano", "LOCAL"], as_index=False).sum()
+    df = df[["LOCAL"] + ANOS_POPULACAO].groupby("LOCAL", observed=True).sum()
+    df.columns = df.columns.astype(int)
+    return df
 
+@instrumentar()
 def carregar_dados_empresas(caminho_arquivo):
     """
     Carrega os dados de empresas ativas e padroniza as colunas.
     """
-    df = pd.read_csv(caminho_arquivo)
-    df.rename(columns={"Brasil e Unidade da Federação": "LOCAL"}, inplace=True)
+    return preparar_dados_empresas(ler_tabela(
+        caminho_arquivo, colunas=["Brasil e Unidade da Federação", "Ano", "Número de empresas ativas"]))
+
+@instrumentar()
+def preparar_dados_empresas(df):
+    """
+    Padroniza as colunas de dados de empresas ativas já carregados.
+    """
+    df = df.rename(columns={"Brasil e Unidade da Federação": "LOCAL"})
     df = df[["LOCAL", "Ano", "Número de empresas ativas"]]
-    return df.groupby(["Ano", "LOCAL"], as_index=False).sum()
+    return df.groupby(["Ano", "LOCAL"], as_index=False, observed=True).sum()
 
+@instrumentar()
 def combinar_dados(populacao_df, empresas_df):
     """
-    Une os dados populacionais com os dados de empresas e calcula a razão População/Empresas.
+    Monta o painel local x ano com população, empresas e a razão População/Empresas,
+    apenas com os locais e anos presentes nas duas fontes.
     """
-    df = pd.merge(populacao_df, empresas_df, on=["LOCAL", "Ano"], how="inner")
-    df["Número de empresas ativas"] = df["Número de empresas ativas"].astype(float)
-    df["População"] = df["População"].astype(float)
-    df["Razão População/Empresas"] = df["População"] / df["Número de empresas ativas"]
-    return df.groupby(["Ano", "LOCAL"], as_index=False).agg({
-        "População": "sum",
-        "Número de empresas ativas": "sum",
-        "Razão População/Empresas": "mean"
-    }).dropna(subset=["Razão População/Empresas"])
+    locais_empresas = np.asarray(empresas_df["LOCAL"], dtype=object)
+    anos_empresas = empresas_df["Ano"].to_numpy(dtype=int)
+    locais = np.intersect1d(np.asarray(populacao_df.index, dtype=object), locais_empresas)
+    anos = np.intersect1d(populacao_df.columns.to_numpy(dtype=int), anos_empresas)
 
-def interpolar_dados(df):
+    populacao = populacao_df.loc[locais, anos].to_numpy(dtype=float)
+    empresas = np.full(populacao.shape, np.nan)
+    linhas = pd.Index(locais).get_indexer(locais_empresas)
+    colunas = pd.Index(anos).get_indexer(anos_empresas)
+    validos = (linhas >= 0) & (colunas >= 0)
+    empresas[linhas[validos], colunas[validos]] = empresas_df["Número de empresas ativas"].to_numpy(dtype=float)[validos]
+    return Painel(locais, anos, populacao, empresas)
+
+@instrumentar()
+def avaliar_previsoes(painel, anos_alvo=(2021, 2022), horizonte=2, n_origens=3, max_workers=None):
+    """
+    Mede a acurácia dos modelos de previsao.py com um backtest de origem móvel
+    sobre os anos anteriores aos `anos_alvo`.
+
+    Retorna um DataFrame com uma linha por local, o erro absoluto médio de cada
+    modelo e o modelo escolhido (menor erro).
+    """
+    from previsao import MODELOS, backtest, selecionar_modelos
+
+    treino = painel.anos < min(anos_alvo)
+    erros = backtest(painel.razao[:, treino], painel.anos[treino], horizonte=horizonte,
+                     n_origens=n_origens, max_workers=max_workers)
+
+    relatorio = pd.DataFrame(erros.T, columns=[f"Erro {modelo}" for modelo in MODELOS])
+    relatorio.insert(0, "LOCAL", painel.locais)
+    relatorio["Modelo"] = selecionar_modelos(erros)
+    return relatorio
+
+@instrumentar()
+def interpolar_dados(painel, anos_alvo=(2021, 2022), metodo="linear", k=3, modelos_por_local=None):
     """
     Interpola valores para os anos de 2021 e 2022 com base nos anos anteriores.
+
+    Todas as séries do painel são estimadas de uma vez. Os métodos de
+    extrapolacao.py ("linear", "tendencia", "inclinacao") usam todos os anos
+    observados; com `metodo="linear"` o resultado é o mesmo da interpolação
+    linear com extrapolação por estado. Os modelos de previsao.py ("naive",
+    "drift", "holt", "amortecido") usam apenas os anos anteriores aos
+    `anos_alvo`, e `metodo="automatico"` usa, em cada local, o modelo indicado em
+    `modelos_por_local` (saída de `avaliar_previsoes`, calculada se não for
+    informada). Retorna um novo painel em que apenas as razões ausentes dos
+    `anos_alvo` são preenchidas.
     """
-    estados = df["LOCAL"].unique()
-    for estado in estados:
-        estado_df = df[df["LOCAL"] == estado]
-        if len(estado_df) < 2:
-            continue
+    from extrapolacao import METODOS, extrapolar_matriz
 
-        anos_existentes = estado_df["Ano"].values
-        razao_existente = estado_df["Razão População/Empresas"].values
+    anos_alvo = np.asarray(anos_alvo)
+    if metodo in METODOS:
+        estimativas = extrapolar_matriz(painel.razao, painel.anos, anos_alvo, metodo=metodo, k=k)
+    else:
+        from previsao import prever_por_modelo
 
-        interpolador = interp1d(anos_existentes, razao_existente, kind='linear', fill_value="extrapolate")
-        estimativas = interpolador([2021, 2022])
+        if metodo == "automatico":
+            if modelos_por_local is None:
+                modelos_por_local = avaliar_previsoes(painel, anos_alvo)
+            escolhidos = modelos_por_local.set_index("LOCAL")["Modelo"].astype(object).reindex(painel.locais).fillna("drift")
+            escolhidos = escolhidos.to_numpy(dtype=object)
+        else:
+            escolhidos = np.full(len(painel), metodo, dtype=object)
+        treino = painel.anos < anos_alvo.min()
+        estimativas = prever_por_modelo(painel.razao[:, treino], painel.anos[treino], anos_alvo, escolhidos)
 
-        df = pd.concat([
-            df,
-            pd.DataFrame({"LOCAL": [estado, estado],
-                          "Ano": [2021, 2022],
-                          "Razão População/Empresas": estimativas})
-        ], ignore_index=True)
-    
-    return df.drop_duplicates(subset=["Ano", "LOCAL"])
+    resultado = painel.com_anos(anos_alvo)
+    razao = resultado.razao.copy()
+    colunas = resultado.colunas_anos(anos_alvo)
+    atuais = razao[:, colunas]
+    razao[:, colunas] = np.where(np.isnan(atuais), estimativas, atuais)
+    return Painel(resultado.locais, resultado.anos, resultado.populacao, resultado.empresas, razao, resultado.cluster,
+                  resultado.metricas, resultado.clusters_metricas)
 
-def aplicar_clusterizacao(df, num_clusters=4):
+def matriz_clusterizacao(painel, metodo="kmeans"):
     """
-    Aplica K-Means para agrupar os estados de acordo com a razão População/Empresas.
+    Matriz agrupada na clusterização (razões com anos ausentes preenchidos pelo
+    último valor observado) e máscara dos locais que podem ser agrupados.
     """
-    X = df.pivot(index="Ano", columns="LOCAL", values="Razão População/Empresas").fillna(method="ffill").T
-    kmeans = KMeans(n_clusters=num_clusters, random_state=42, n_init=10)
-    clusters = kmeans.fit_predict(X)
-    
-    mapa_clusters = {estado: cluster for estado, cluster in zip(X.index, clusters)}
-    df["Cluster"] = df["LOCAL"].map(mapa_clusters)
-    
-    return df
+    X = pd.DataFrame(painel.razao).ffill(axis=1)
+    if metodo != "kmeans":
+        # Séries que começam sem observação recebem o primeiro valor disponível
+        X = X.bfill(axis=1)
+    return X.to_numpy(), X.notna().all(axis=1).to_numpy()
+
+@instrumentar()
+def aplicar_clusterizacao(painel, num_clusters=4, metodo="kmeans", **opcoes):
+    """
+    Agrupa os locais de acordo com a série da razão do painel (População/Empresas,
+    ou outra métrica com `painel.metrica(nome)`).
 
-def identificar_oportunidades_e_saturacao(df):
+    `metodo` pode ser "kmeans" (K-Means sobre os valores, padrão), "minibatch"
+    (Mini-Batch K-Means sobre séries normalizadas) ou "dtw" (k-medoides com DTW);
+    ver clusterizacao.py. O resultado é gravado em `painel.cluster`.
+    """
+    from clusterizacao import agrupar_series
+
+    X, validos = matriz_clusterizacao(painel, metodo)
+    rotulos = agrupar_series(X[validos], num_clusters, metodo=metodo, **opcoes)
+
+    clusters = np.full(len(painel), np.nan)
+    clusters[validos] = rotulos
+    painel.cluster = clusters.astype(int) if validos.all() else clusters
+    return painel
+
+@instrumentar()
+def clusterizar_metricas(painel, num_clusters=4, metodo="kmeans", **opcoes):
+    """
+    Agrupa os locais segundo cada métrica adicional do painel (ver razoes.py),
+    com as mesmas regras de `aplicar_clusterizacao`; os rótulos são gravados em
+    `painel.clusters_metricas`.
+    """
+    for nome in painel.metricas:
+        metrica = painel.metrica(nome)
+        if matriz_clusterizacao(metrica, metodo)[1].sum() < num_clusters:
+            print(f"Métrica '{nome}' sem locais suficientes para {num_clusters} clusters; não agrupada.")
+            continue
+        painel.clusters_metricas[nome] = aplicar_clusterizacao(metrica, num_clusters=num_clusters, metodo=metodo,
+                                                               **opcoes).cluster
+    return painel
+
+@instrumentar()
+def identificar_oportunidades_e_saturacao(painel, percentis=(25, 75)):
     """
     Identifica estados saturados e com oportunidades futuras baseando-se na razão População/Empresas.
+
+    São saturados os estados acima do percentil alto de `percentis` e com
+    oportunidades os abaixo do percentil baixo. Para avaliar muitas faixas etárias
+    e percentis de uma vez, ver `indice_idades.varrer_cenarios`.
     """
-    media_razao_por_estado = df[df["Ano"].isin([2021, 2022])].groupby("LOCAL")["Razão População/Empresas"].mean()
+    valores = painel.razao[:, painel.colunas_anos([2021, 2022])]
+    observados = ~np.isnan(valores)
+    with np.errstate(invalid="ignore"):
+        media = np.where(observados, valores, 0.0).sum(axis=1) / observados.sum(axis=1)
+    media_razao_por_estado = pd.Series(media, index=painel.locais)
     
-    q75, q25 = np.percentile(media_razao_por_estado.dropna(), [75, 25])
+    q25, q75 = np.percentile(media_razao_por_estado.dropna(), percentis)
     estados_saturados = media_razao_por_estado[media_razao_por_estado > q75].index.tolist()
     estados_oportunidades = media_razao_por_estado[media_razao_por_estado < q25].index.tolist()
     
     return estados_saturados, estados_oportunidades
 
-def salvar_dados(df, caminho_pasta="data", nome_arquivo="merged_data.csv"):
+@instrumentar()
+def salvar_dados(df, caminho_pasta="data", nome_arquivo=None):
     """
-    Salva os dados processados em um arquivo CSV dentro da pasta especificada.
+    Salva os dados processados (DataFrame ou Painel, convertido para o formato
+    longo) dentro da pasta especificada, no formato dos arquivos intermediários
+    (por padrão `merged_data.parquet`; ver armazenamento.py).
     """
+    if isinstance(df, Painel):
+        df = df.para_dataframe()
     os.makedirs(caminho_pasta, exist_ok=True)
+    nome_arquivo = nome_arquivo or "merged_data" + EXTENSOES[formato_atual()]
     caminho_completo = os.path.join(caminho_pasta, nome_arquivo)
-    df.to_csv(caminho_completo, index=False)
+    salvar_tabela(df, caminho_completo)
     print(f"Arquivo salvo: {caminho_completo}")
 
+def salvar_centroides(painel, metodo="kmeans", caminho=CAMINHO_CENTROIDES):
+    """
+    Grava os centros dos clusters do painel (no espaço do método de
+    clusterização), com os anos e o método, para a atualização incremental
+    (ver incremental.py).
+    """
+    from clusterizacao import centroides
+
+    X, validos = matriz_clusterizacao(painel, metodo)
+    validos &= ~np.isnan(np.asarray(painel.cluster, dtype=float))
+    rotulos = np.asarray(painel.cluster, dtype=float)[validos].astype(int)
+    centros = centroides(X[validos], rotulos, int(rotulos.max()) + 1, metodo)
+    os.makedirs(os.path.dirname(caminho) or ".", exist_ok=True)
+    np.savez(caminho, centroides=centros, anos=painel.anos, metodo=metodo)
+    return caminho
+
+def carregar_centroides(caminho=CAMINHO_CENTROIDES):
+    """Lê os centros gravados por `salvar_centroides` (None se o arquivo não existir)."""
+    if not os.path.exists(caminho):
+        return None
+    with np.load(caminho) as arquivo:
+        return {"centroides": arquivo["centroides"], "anos": arquivo["anos"], "metodo": str(arquivo["metodo"])}
+
 def main():
     """
     Função principal que executa todo o pipeline de análise.
     """
     # Carregar dados
-    dados_populacao = carregar_dados_populacao("data/populacao_filtrada.csv")
-    dados_empresas = carregar_dados_empresas("data/dados_filtrados_numero_empresas_ativas.csv")
+    dados_populacao = carregar_dados_populacao(caminho_intermediario("populacao_filtrada"))
+    dados_empresas = carregar_dados_empresas(caminho_intermediario("dados_filtrados_numero_empresas_ativas"))
 
     # Combinar e processar dados
     dados_combinados = combinar_dados(dados_populacao, dados_empresas)
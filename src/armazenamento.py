@@ -0,0 +1,195 @@
+"""
+Armazenamento tipado dos arquivos intermediários do pipeline.
+
+Cada etapa grava suas tabelas em `data/` e a etapa seguinte as lê de volta.
+Em vez de CSV sem tipos, as tabelas são gravadas em formato colunar binário
+(Parquet por padrão, ou Feather) com um esquema explícito: colunas de texto
+como `LOCAL` viram categóricas, anos e códigos viram inteiros compactos e as
+medidas ficam em float64. A leitura pode projetar apenas as colunas
+necessárias e usa memory-map quando o formato permite.
+
+O CSV continua disponível, tanto como formato principal (`--formato csv`)
+quanto como exportação adicional ao lado do arquivo binário (`--exportar-csv`).
+"""
+import importlib.util
+import os
+import re
+import tempfile
+
+import pandas as pd
+
+EXTENSOES = {"parquet": ".parquet", "feather": ".feather", "csv": ".csv"}
+
+# Tipos explícitos por coluna. Colunas "(Código)" da SIDRA, colunas de ano da
+# projeção populacional e as métricas adicionais ("Razão ..." e "Cluster ...")
+# são tratadas por padrão de nome em `aplicar_esquema`.
+ESQUEMA = {
+    "Ano": "int16",
+    "IDADE": "int16",
+    "CÓD.": "int32",
+    "Cluster": "int8",
+    "Valor": "float64",
+    "População": "float64",
+    "Número de empresas ativas": "float64",
+    "Razão População/Empresas": "float64",
+}
+
+_PADRAO_ANO = re.compile(r"^\d{4}$")
+
+def _formato_inicial():
+    formato = os.environ.get("IMOBI_FORMATO")
+    if formato:
+        return formato
+    return "parquet" if importlib.util.find_spec("pyarrow") else "csv"
+
+_formato = _formato_inicial()
+_exportar_csv = False
+
+def definir_formato(formato, exportar_csv=None):
+    """Define o formato dos arquivos intermediários e, opcionalmente, a exportação adicional em CSV."""
+    global _formato, _exportar_csv
+    if formato not in EXTENSOES:
+        raise ValueError(f"Formato desconhecido: {formato}. Opções: {list(EXTENSOES)}")
+    _formato = formato
+    if exportar_csv is not None:
+        _exportar_csv = bool(exportar_csv)
+
+def formato_atual():
+    """Retorna o formato usado para os arquivos intermediários."""
+    return _formato
+
+def caminho_intermediario(nome, diretorio="data", formato=None):
+    """Monta o caminho do arquivo intermediário `nome` no formato atual (ex.: data/merged_data.parquet)."""
+    return os.path.join(diretorio, nome + EXTENSOES[formato or _formato])
+
+def _converter(serie, tipo):
+    """Converte a série para o tipo indicado; inteiros com valores ausentes ficam em float64."""
+    if str(serie.dtype) == tipo:
+        return serie
+    numerica = pd.to_numeric(serie, errors="coerce")
+    if tipo.startswith("int") and numerica.isna().any():
+        return numerica.astype("float64")
+    return numerica.astype(tipo)
+
+def aplicar_esquema(df):
+    """Retorna uma cópia do DataFrame com os tipos do esquema (texto vira categórico)."""
+    colunas = {}
+    for coluna in df.columns:
+        serie = df[coluna]
+        nome = str(coluna)
+        if nome in ESQUEMA:
+            colunas[coluna] = _converter(serie, ESQUEMA[nome])
+        elif nome.endswith("(Código)"):
+            colunas[coluna] = _converter(serie, "int32")
+        elif nome.startswith("Cluster "):
+            # Cluster de cada local segundo uma métrica adicional (ver razoes.py)
+            colunas[coluna] = _converter(serie, ESQUEMA["Cluster"])
+        elif nome.startswith("Razão "):
+            colunas[coluna] = _converter(serie, "float64")
+        elif _PADRAO_ANO.match(nome):
+            colunas[coluna] = _converter(serie, "float64")
+        elif serie.dtype == object:
+            colunas[coluna] = serie.astype("category")
+        else:
+            colunas[coluna] = serie
+    return pd.DataFrame(colunas, index=df.index)
+
+def _formato_do_caminho(caminho):
+    extensao = os.path.splitext(caminho)[1].lower()
+    for formato, ext in EXTENSOES.items():
+        if ext == extensao:
+            return formato
+    raise ValueError(f"Extensão não suportada: {caminho}")
+
+def _gravar_atomico(caminho, gravar):
+    """
+    Executa `gravar(temporario)` em um arquivo temporário no mesmo diretório e o
+    move para `caminho` de uma vez: quem lê o arquivo (como o serviço de
+    consultas) nunca encontra uma gravação pela metade.
+    """
+    diretorio = os.path.dirname(caminho) or "."
+    os.makedirs(diretorio, exist_ok=True)
+    fd, temporario = tempfile.mkstemp(dir=diretorio, suffix=".tmp")
+    os.close(fd)
+    try:
+        gravar(temporario)
+        os.replace(temporario, caminho)
+    except BaseException:
+        os.remove(temporario)
+        raise
+
+def salvar_tabela(df, caminho, exportar_csv=None):
+    """
+    Grava o DataFrame com o esquema explícito, no formato indicado pela extensão
+    do caminho, de forma atômica. Se a exportação em CSV estiver ativa, grava
+    também uma cópia CSV.
+    """
+    formato = _formato_do_caminho(caminho)
+    df = aplicar_esquema(df.reset_index(drop=True))
+    if formato == "parquet":
+        _gravar_atomico(caminho, lambda destino: df.to_parquet(destino, index=False))
+    elif formato == "feather":
+        # Sem compressão, para permitir leitura com memory-map sem cópia
+        _gravar_atomico(caminho, lambda destino: df.to_feather(destino, compression="uncompressed"))
+    else:
+        _gravar_atomico(caminho, lambda destino: df.to_csv(destino, index=False))
+
+    exportar_csv = _exportar_csv if exportar_csv is None else exportar_csv
+    if exportar_csv and formato != "csv":
+        _gravar_atomico(os.path.splitext(caminho)[0] + ".csv", lambda destino: df.to_csv(destino, index=False))
+    return caminho
+
+def ler_tabela(caminho, colunas=None):
+    """
+    Lê uma tabela intermediária já com os tipos do esquema, carregando apenas as
+    `colunas` pedidas (todas, se None).
+    """
+    formato = _formato_do_caminho(caminho)
+    if formato == "parquet":
+        return pd.read_parquet(caminho, columns=colunas, memory_map=True)
+    if formato == "feather":
+        from pyarrow import feather
+        return feather.read_table(caminho, columns=colunas, memory_map=True).to_pandas()
+    return aplicar_esquema(pd.read_csv(caminho, usecols=colunas))
+
+# Linhas por bloco nas leituras em blocos
+TAMANHO_BLOCO = 100_000
+
+def colunas_tabela(caminho):
+    """Nomes das colunas de uma tabela intermediária, sem ler os dados."""
+    formato = _formato_do_caminho(caminho)
+    if formato == "csv":
+        return list(pd.read_csv(caminho, nrows=0).columns)
+    import pyarrow.dataset as ds
+    return ds.dataset(caminho, format=formato).schema.names
+
+def ler_em_blocos(caminho, colunas=None, filtros=None, tamanho_bloco=TAMANHO_BLOCO):
+    """
+    Lê uma tabela intermediária em blocos de até `tamanho_bloco` linhas,
+    carregando apenas as `colunas` pedidas e as linhas que atendem a todos os
+    `filtros` (pares coluna, valor, comparados por igualdade).
+
+    Em Parquet e Feather, a projeção e os filtros são aplicados pelo leitor do
+    pyarrow (grupos de linhas descartados pelas estatísticas não são lidos); em
+    CSV, cada bloco é filtrado logo após ser lido. Os blocos não passam pelo
+    esquema: categorias podem diferir de um bloco para outro.
+    """
+    filtros = list(filtros or [])
+    leitura = None if colunas is None else list(dict.fromkeys(list(colunas) + [coluna for coluna, _ in filtros]))
+    formato = _formato_do_caminho(caminho)
+    if formato == "csv":
+        for bloco in pd.read_csv(caminho, usecols=leitura, chunksize=tamanho_bloco):
+            for coluna, valor in filtros:
+                bloco = bloco[bloco[coluna] == valor]
+            yield bloco if colunas is None else bloco[list(colunas)]
+        return
+
+    import pyarrow.dataset as ds
+    condicao = None
+    for coluna, valor in filtros:
+        termo = ds.field(coluna) == valor
+        condicao = termo if condicao is None else condicao & termo
+    dataset = ds.dataset(caminho, format=formato)
+    for lote in dataset.to_batches(columns=leitura, filter=condicao, batch_size=tamanho_bloco):
+        bloco = lote.to_pandas()
+        yield bloco if colunas is None else bloco[list(colunas)]
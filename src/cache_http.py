@@ -0,0 +1,299 @@
+"""
+Cache HTTP persistente para as fontes do IBGE/SIDRA.
+
+O conteúdo baixado é guardado em disco endereçado pelo seu SHA-256
+(`data/cache/objetos/<hash>`), e um índice JSON (`data/cache/indice.json`)
+associa cada URL ao objeto correspondente e aos validadores HTTP (ETag e
+Last-Modified). Em novas execuções a requisição é condicional: se o servidor
+responder 304, nada é baixado de novo. No modo offline nenhuma requisição é
+feita e o conteúdo é servido apenas a partir do cache.
+
+Os downloads são feitos em streaming, em blocos de tamanho fixo, para um
+arquivo temporário que é renomeado atomicamente ao final; um download
+interrompido é retomado com requisições Range.
+
+Todas as requisições compartilham uma única `requests.Session`, com pool de
+conexões, timeouts e novas tentativas com backoff exponencial.
+"""
+import hashlib
+import json
+import os
+import tempfile
+import threading
+import time
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+DIRETORIO_CACHE = os.environ.get("IMOBI_CACHE_DIR", os.path.join("data", "cache"))
+TIMEOUT_PADRAO = (10, 120)  # (conexão, leitura) em segundos
+TAMANHO_BLOCO = 1024 * 1024  # 1 MB por bloco nos downloads em streaming
+
+_offline = os.environ.get("IMOBI_OFFLINE", "") not in ("", "0")
+_sessao = None
+_trava_sessao = threading.Lock()
+_trava_indice = threading.Lock()
+
+def definir_modo_offline(ativo=True):
+    """Ativa ou desativa o modo offline (servir apenas a partir do cache)."""
+    global _offline
+    _offline = bool(ativo)
+
+def modo_offline():
+    """Indica se o modo offline está ativo."""
+    return _offline
+
+def obter_sessao():
+    """Retorna a sessão HTTP compartilhada, criando-a na primeira chamada."""
+    global _sessao
+    with _trava_sessao:
+        if _sessao is None:
+            tentativas = Retry(
+                total=5,
+                backoff_factor=1,
+                status_forcelist=(429, 500, 502, 503, 504),
+                allowed_methods=("GET", "HEAD"),
+                respect_retry_after_header=True,
+            )
+            adaptador = HTTPAdapter(pool_connections=4, pool_maxsize=16, max_retries=tentativas)
+            sessao = requests.Session()
+            sessao.mount("http://", adaptador)
+            sessao.mount("https://", adaptador)
+            _sessao = sessao
+        return _sessao
+
+def _caminho_indice(diretorio_cache):
+    return os.path.join(diretorio_cache, "indice.json")
+
+def _caminho_objeto(diretorio_cache, sha256):
+    return os.path.join(diretorio_cache, "objetos", sha256[:2], sha256)
+
+def carregar_indice(diretorio_cache=None):
+    """Lê o índice do cache (URL -> metadados). Retorna um dicionário vazio se não existir."""
+    caminho = _caminho_indice(diretorio_cache or DIRETORIO_CACHE)
+    if not os.path.exists(caminho):
+        return {}
+    with open(caminho, encoding="utf-8") as f:
+        return json.load(f)
+
+def _atualizar_indice(diretorio_cache, url, entrada):
+    """Grava a entrada da URL no índice de forma atômica."""
+    with _trava_indice:
+        indice = carregar_indice(diretorio_cache)
+        indice[url] = entrada
+        os.makedirs(diretorio_cache, exist_ok=True)
+        fd, temporario = tempfile.mkstemp(dir=diretorio_cache, suffix=".json.tmp")
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            json.dump(indice, f, ensure_ascii=False, indent=2)
+        os.replace(temporario, _caminho_indice(diretorio_cache))
+
+def _caminho_parcial(diretorio_cache, url):
+    """Arquivo temporário estável por URL, para que um download interrompido possa ser retomado."""
+    chave = hashlib.sha256(url.encode("utf-8")).hexdigest()
+    return os.path.join(diretorio_cache, "parciais", chave)
+
+def _hash_arquivo(caminho, tamanho_bloco=TAMANHO_BLOCO):
+    """Calcula o SHA-256 de um arquivo lendo-o em blocos."""
+    sha = hashlib.sha256()
+    with open(caminho, "rb") as f:
+        for bloco in iter(lambda: f.read(tamanho_bloco), b""):
+            sha.update(bloco)
+    return sha
+
+def exibir_progresso(baixados, total, segundos):
+    """Callback padrão de progresso: imprime bytes baixados, percentual e vazão."""
+    vazao = baixados / segundos / 1e6 if segundos > 0 else 0.0
+    if total:
+        print(f"  {baixados / 1e6:.1f} MB de {total / 1e6:.1f} MB ({100 * baixados / total:.0f}%) - {vazao:.2f} MB/s")
+    else:
+        print(f"  {baixados / 1e6:.1f} MB - {vazao:.2f} MB/s")
+
+def baixar_em_streaming(url, destino, cabecalhos=None, sha256_esperado=None, tentativas=5,
+                        tamanho_bloco=TAMANHO_BLOCO, progresso=exibir_progresso, intervalo_progresso=1.0,
+                        timeout=TIMEOUT_PADRAO):
+    """
+    Baixa a URL em blocos para `destino` sem manter o conteúdo em memória.
+
+    O conteúdo é gravado em `destino + ".part"`. Se esse arquivo já existir (de um
+    download interrompido) ou se a conexão cair no meio da transferência, o download
+    é retomado com uma requisição Range a partir do último byte gravado. Ao final,
+    o tamanho é conferido com o anunciado pelo servidor, o SHA-256 com
+    `sha256_esperado` (se informado) e o arquivo é renomeado atomicamente.
+
+    Retorna um dicionário com `status` (200 ou 304), `sha256`, `tamanho`, `etag` e
+    `last_modified`. Com status 304 (requisição condicional), nada é gravado.
+    """
+    parcial = destino + ".part"
+    arquivo_validador = parcial + ".validador"
+    os.makedirs(os.path.dirname(os.path.abspath(destino)), exist_ok=True)
+    cabecalhos = dict(cabecalhos or {})
+    sessao = obter_sessao()
+
+    # O validador (ETag/Last-Modified) do arquivo parcial garante, via If-Range, que
+    # só retomamos se o conteúdo remoto for o mesmo que começou a ser baixado.
+    validador = None
+    if os.path.exists(parcial) and os.path.exists(arquivo_validador):
+        with open(arquivo_validador, encoding="utf-8") as f:
+            validador = f.read().strip() or None
+    if validador is None and os.path.exists(parcial):
+        os.remove(parcial)
+
+    for tentativa in range(tentativas):
+        ja_baixados = os.path.getsize(parcial) if os.path.exists(parcial) else 0
+        if ja_baixados and not validador:
+            # Sem validador não há If-Range: o conteúdo remoto pode ter mudado, recomeça do zero
+            os.remove(parcial)
+            ja_baixados = 0
+        pedido = dict(cabecalhos)
+        if ja_baixados:
+            pedido["Range"] = f"bytes={ja_baixados}-"
+            pedido["If-Range"] = validador
+
+        try:
+            with sessao.get(url, headers=pedido, stream=True, timeout=timeout) as response:
+                if response.status_code == 304:
+                    return {"status": 304, "etag": response.headers.get("ETag"),
+                            "last_modified": response.headers.get("Last-Modified")}
+                if response.status_code == 416 and ja_baixados:
+                    # O arquivo parcial não corresponde mais ao remoto: recomeça do zero
+                    os.remove(parcial)
+                    continue
+                response.raise_for_status()
+
+                etag = response.headers.get("ETag")
+                last_modified = response.headers.get("Last-Modified")
+                # Com compressão na transferência, Content-Length e Range referem-se aos
+                # bytes comprimidos: não dá para conferir o tamanho nem retomar.
+                comprimido = response.headers.get("Content-Encoding", "identity") != "identity"
+                if response.status_code == 206:
+                    total = int(response.headers["Content-Range"].rsplit("/", 1)[-1])
+                    sha = _hash_arquivo(parcial, tamanho_bloco)
+                    modo = "ab"
+                else:
+                    comprimento = response.headers.get("Content-Length")
+                    total = int(comprimento) if comprimento and not comprimido else None
+                    sha = hashlib.sha256()
+                    ja_baixados, modo = 0, "wb"
+                    validador = None if comprimido else (etag or last_modified)
+                    with open(arquivo_validador, "w", encoding="utf-8") as f:
+                        f.write(validador or "")
+
+                baixados = ja_baixados
+                inicio = ultimo_aviso = time.monotonic()
+                with open(parcial, modo) as f:
+                    for bloco in response.iter_content(chunk_size=tamanho_bloco):
+                        f.write(bloco)
+                        sha.update(bloco)
+                        baixados += len(bloco)
+                        agora = time.monotonic()
+                        if progresso and agora - ultimo_aviso >= intervalo_progresso:
+                            progresso(baixados, total, agora - inicio)
+                            ultimo_aviso = agora
+                if progresso:
+                    progresso(baixados, total, time.monotonic() - inicio)
+        except (requests.exceptions.ChunkedEncodingError, requests.exceptions.ConnectionError,
+                requests.exceptions.Timeout) as erro:
+            if tentativa == tentativas - 1:
+                raise
+            if validador is None and os.path.exists(parcial):
+                os.remove(parcial)
+            print(f"Conexão interrompida ({erro}); retomando o download...")
+            time.sleep(min(2 ** tentativa, 30))
+            continue
+
+        tamanho = os.path.getsize(parcial)
+        if total is not None and tamanho != total:
+            if tentativa == tentativas - 1:
+                raise IOError(f"Download incompleto de '{url}': {tamanho} de {total} bytes.")
+            continue
+        sha256 = sha.hexdigest()
+        if sha256_esperado and sha256 != sha256_esperado:
+            os.remove(parcial)
+            raise IOError(f"SHA-256 divergente para '{url}': esperado {sha256_esperado}, obtido {sha256}.")
+        os.replace(parcial, destino)
+        if os.path.exists(arquivo_validador):
+            os.remove(arquivo_validador)
+        return {"status": response.status_code, "sha256": sha256, "tamanho": tamanho,
+                "etag": etag, "last_modified": last_modified}
+
+    raise IOError(f"Não foi possível concluir o download de '{url}' após {tentativas} tentativas.")
+
+def baixar_com_cache(url, offline=None, diretorio_cache=None, max_idade=None, timeout=TIMEOUT_PADRAO,
+                     progresso=exibir_progresso):
+    """
+    Retorna o caminho local do conteúdo da URL, baixando-o apenas se necessário.
+
+    - Se houver cópia em cache validada há menos de `max_idade` segundos, nenhuma
+      requisição é feita.
+    - Caso contrário, faz uma requisição condicional (If-None-Match /
+      If-Modified-Since); uma resposta 304 reaproveita a cópia em cache.
+    - O download é feito em streaming e pode ser retomado (ver `baixar_em_streaming`).
+    - No modo offline, serve apenas do cache e levanta FileNotFoundError se a URL
+      nunca foi baixada.
+    """
+    diretorio_cache = diretorio_cache or DIRETORIO_CACHE
+    offline = modo_offline() if offline is None else offline
+
+    entrada = carregar_indice(diretorio_cache).get(url)
+    caminho_em_cache = None
+    if entrada:
+        caminho_em_cache = _caminho_objeto(diretorio_cache, entrada["sha256"])
+        if not os.path.exists(caminho_em_cache):
+            entrada, caminho_em_cache = None, None
+
+    if offline:
+        if caminho_em_cache is None:
+            raise FileNotFoundError(f"Modo offline: '{url}' não está no cache ({diretorio_cache}).")
+        return caminho_em_cache
+
+    if caminho_em_cache and max_idade is not None and time.time() - entrada["validado_em"] < max_idade:
+        return caminho_em_cache
+
+    cabecalhos = {}
+    if caminho_em_cache:
+        if entrada.get("etag"):
+            cabecalhos["If-None-Match"] = entrada["etag"]
+        if entrada.get("last_modified"):
+            cabecalhos["If-Modified-Since"] = entrada["last_modified"]
+
+    baixado = _caminho_parcial(diretorio_cache, url)
+    resultado = baixar_em_streaming(url, baixado, cabecalhos=cabecalhos, progresso=progresso, timeout=timeout)
+    if resultado["status"] == 304:
+        if caminho_em_cache is None:
+            # Sem cópia em cache não houve requisição condicional: 304 é uma resposta indevida
+            raise IOError(f"O servidor respondeu 304 para '{url}', que não está no cache.")
+        entrada["validado_em"] = time.time()
+        _atualizar_indice(diretorio_cache, url, entrada)
+        print(f"Cache válido (304) para: {url}")
+        return caminho_em_cache
+
+    caminho = _caminho_objeto(diretorio_cache, resultado["sha256"])
+    os.makedirs(os.path.dirname(caminho), exist_ok=True)
+    os.replace(baixado, caminho)
+    agora = time.time()
+    _atualizar_indice(diretorio_cache, url, {
+        "sha256": resultado["sha256"],
+        "tamanho": resultado["tamanho"],
+        "etag": resultado["etag"],
+        "last_modified": resultado["last_modified"],
+        "baixado_em": agora,
+        "validado_em": agora,
+    })
+    return caminho
+
+def versoes_remotas(urls, max_idade=None, diretorio_cache=None, verificar=True):
+    """
+    SHA-256 do conteúdo atual de cada URL (None se nunca foi baixada), após a
+    revalidação condicional de `baixar_com_cache` (no máximo a cada `max_idade`
+    segundos). Se o servidor não responder, vale o conteúdo já em cache. Com
+    `verificar=False`, retorna apenas o que está no cache, sem acessar a rede.
+    """
+    diretorio_cache = diretorio_cache or DIRETORIO_CACHE
+    for url in urls if verificar else []:
+        try:
+            baixar_com_cache(url, max_idade=max_idade, diretorio_cache=diretorio_cache, progresso=None)
+        except (requests.RequestException, OSError) as erro:
+            print(f"Não foi possível revalidar '{url}' ({erro}); usando a versão em cache.")
+    indice = carregar_indice(diretorio_cache)
+    return {url: indice.get(url, {}).get("sha256") for url in urls}
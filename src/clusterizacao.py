@@ -0,0 +1,182 @@
+"""
+Agrupamento de séries temporais em escala (estados ou municípios).
+
+Métodos:
+- "kmeans": K-Means completo sobre os níveis da razão (comportamento original).
+- "minibatch": Mini-Batch K-Means sobre séries normalizadas (z-score por série),
+  que agrupa pelo formato da série e escala para milhares de locais.
+- "dtw": k-medoides com distância DTW (Dynamic Time Warping) restrita a uma
+  janela de Sakoe-Chiba, sobre séries normalizadas. A atribuição usa o limite
+  inferior LB_Keogh para descartar medoides sem calcular o DTW, e a escolha dos
+  medoides avalia apenas amostras de candidatos e membros, de modo que nunca se
+  monta a matriz de distâncias entre todos os pares de séries.
+
+Todas as funções recebem uma matriz (locais x anos) e retornam um rótulo
+inteiro de 0 a k-1 por linha.
+"""
+import numpy as np
+
+METODOS = ("kmeans", "minibatch", "dtw")
+
+def normalizar_series(X):
+    """Normaliza cada série (linha) para média 0 e desvio-padrão 1; séries constantes viram zeros."""
+    X = np.asarray(X, dtype=float)
+    media = X.mean(axis=1, keepdims=True)
+    desvio = X.std(axis=1, keepdims=True)
+    desvio[desvio == 0] = 1.0
+    return (X - media) / desvio
+
+def agrupar_kmeans(X, num_clusters, random_state=42):
+    """K-Means completo (n_init=10) sobre os valores originais."""
+    from sklearn.cluster import KMeans
+
+    return KMeans(n_clusters=num_clusters, random_state=random_state, n_init=10).fit_predict(X)
+
+def agrupar_minibatch(X, num_clusters, random_state=42, tamanho_lote=1024):
+    """Mini-Batch K-Means sobre as séries normalizadas."""
+    from sklearn.cluster import MiniBatchKMeans
+
+    modelo = MiniBatchKMeans(n_clusters=num_clusters, random_state=random_state,
+                             batch_size=tamanho_lote, n_init=3)
+    return modelo.fit_predict(normalizar_series(X))
+
+def dtw_lote(consulta, series, janela):
+    """
+    Distância DTW entre uma série `consulta` (T,) e cada linha de `series` (m, T),
+    com janela de Sakoe-Chiba de largura `janela`. O cálculo é vetorizado sobre as
+    m séries.
+    """
+    series = np.atleast_2d(series)
+    m, t = series.shape
+    acumulado = np.full((m, t + 1, t + 1), np.inf)
+    acumulado[:, 0, 0] = 0.0
+    for i in range(1, t + 1):
+        for j in range(max(1, i - janela), min(t, i + janela) + 1):
+            custo = (consulta[i - 1] - series[:, j - 1]) ** 2
+            acumulado[:, i, j] = custo + np.minimum(np.minimum(acumulado[:, i - 1, j], acumulado[:, i, j - 1]),
+                                                    acumulado[:, i - 1, j - 1])
+    return np.sqrt(acumulado[:, t, t])
+
+def envelope(serie, janela):
+    """Envelopes superior e inferior da série para o LB_Keogh."""
+    preenchida = np.pad(serie, janela, mode="edge")
+    janelas = np.lib.stride_tricks.sliding_window_view(preenchida, 2 * janela + 1)
+    return janelas.max(axis=1), janelas.min(axis=1)
+
+def lb_keogh(series, superior, inferior):
+    """Limite inferior LB_Keogh do DTW entre cada linha de `series` e a série dos envelopes."""
+    acima = np.clip(series - superior, 0, None)
+    abaixo = np.clip(inferior - series, 0, None)
+    return np.sqrt((acima ** 2 + abaixo ** 2).sum(axis=1))
+
+def _atribuir(X, medoides, janela):
+    """Atribui cada série ao medoide mais próximo, usando LB_Keogh para evitar cálculos de DTW."""
+    n, k = X.shape[0], len(medoides)
+    limites = np.empty((n, k))
+    for c, medoide in enumerate(medoides):
+        superior, inferior = envelope(X[medoide], janela)
+        limites[:, c] = lb_keogh(X, superior, inferior)
+
+    melhor = np.full(n, np.inf)
+    rotulos = np.zeros(n, dtype=int)
+    calculos = 0
+    ordem = np.argsort(limites, axis=1)
+    # Rodada r: cada série testa seu r-ésimo medoide mais promissor, se o limite ainda puder vencer
+    for rodada in range(k):
+        candidatos = ordem[:, rodada]
+        promissores = limites[np.arange(n), candidatos] < melhor
+        if not promissores.any():
+            break
+        for c in np.unique(candidatos[promissores]):
+            indices = np.flatnonzero(promissores & (candidatos == c))
+            distancias = dtw_lote(X[medoides[c]], X[indices], janela)
+            calculos += len(indices)
+            melhora = distancias < melhor[indices]
+            melhor[indices[melhora]] = distancias[melhora]
+            rotulos[indices[melhora]] = c
+    return rotulos, melhor, calculos
+
+def _inicializar_medoides(X, k, janela, rng):
+    """Escolha inicial no estilo k-means++: cada novo medoide é sorteado com peso D(x)^2."""
+    medoides = [int(rng.integers(X.shape[0]))]
+    distancia = dtw_lote(X[medoides[0]], X, janela)
+    for _ in range(1, k):
+        pesos = distancia ** 2
+        total = pesos.sum()
+        novo = int(rng.choice(X.shape[0], p=pesos / total)) if total > 0 else int(rng.integers(X.shape[0]))
+        medoides.append(novo)
+        distancia = np.minimum(distancia, dtw_lote(X[novo], X, janela))
+    return medoides
+
+def agrupar_dtw(X, num_clusters, janela=2, max_iter=20, random_state=42,
+                candidatos_por_cluster=16, membros_amostrados=256):
+    """
+    k-medoides com DTW sobre as séries normalizadas.
+
+    A cada iteração, o medoide de cada grupo é escolhido entre até
+    `candidatos_por_cluster` membros sorteados (mais o medoide atual), avaliando a
+    soma das distâncias a até `membros_amostrados` membros do grupo.
+    """
+    X = normalizar_series(X)
+    rng = np.random.default_rng(random_state)
+    medoides = _inicializar_medoides(X, num_clusters, janela, rng)
+    rotulos = None
+
+    for _ in range(max_iter):
+        novos_rotulos, _, _ = _atribuir(X, medoides, janela)
+        if rotulos is not None and np.array_equal(novos_rotulos, rotulos):
+            break
+        rotulos = novos_rotulos
+
+        for c in range(num_clusters):
+            membros = np.flatnonzero(rotulos == c)
+            if len(membros) == 0:
+                continue
+            amostra = membros if len(membros) <= membros_amostrados else rng.choice(
+                membros, membros_amostrados, replace=False)
+            candidatos = membros if len(membros) <= candidatos_por_cluster else rng.choice(
+                membros, candidatos_por_cluster, replace=False)
+            candidatos = np.unique(np.append(candidatos, medoides[c]))
+            custos = [dtw_lote(X[candidato], X[amostra], janela).sum() for candidato in candidatos]
+            medoides[c] = int(candidatos[int(np.argmin(custos))])
+
+    rotulos, _, _ = _atribuir(X, medoides, janela)
+    return rotulos
+
+def _espaco(X, metodo):
+    """Matriz no espaço em que o método agrupa (valores originais no K-Means, séries normalizadas nos demais)."""
+    return np.asarray(X, dtype=float) if metodo == "kmeans" else normalizar_series(X)
+
+def centroides(X, rotulos, num_clusters, metodo="kmeans"):
+    """Centro de cada grupo (média dos membros) no espaço do método; grupos vazios recebem a média geral."""
+    X = _espaco(X, metodo)
+    centros = np.tile(X.mean(axis=0), (num_clusters, 1))
+    for c in range(num_clusters):
+        membros = rotulos == c
+        if membros.any():
+            centros[c] = X[membros].mean(axis=0)
+    return centros
+
+def agrupar_a_partir_de(X, centros_iniciais, metodo="kmeans"):
+    """
+    K-Means (ou Mini-Batch K-Means) partindo dos centros informados, com uma única
+    inicialização. Os rótulos mantêm a numeração dos centros iniciais. Retorna
+    (rótulos, centros finais). Não se aplica ao método "dtw".
+    """
+    from sklearn.cluster import KMeans
+
+    if metodo == "dtw":
+        raise ValueError("O método 'dtw' não aceita centros iniciais; use agrupar_series.")
+    centros_iniciais = np.asarray(centros_iniciais, dtype=float)
+    modelo = KMeans(n_clusters=len(centros_iniciais), init=centros_iniciais, n_init=1).fit(_espaco(X, metodo))
+    return modelo.labels_, modelo.cluster_centers_
+
+def agrupar_series(X, num_clusters, metodo="kmeans", random_state=42, **opcoes):
+    """Agrupa as linhas de X (locais x anos) com o método escolhido."""
+    if metodo == "kmeans":
+        return agrupar_kmeans(X, num_clusters, random_state=random_state)
+    if metodo == "minibatch":
+        return agrupar_minibatch(X, num_clusters, random_state=random_state, **opcoes)
+    if metodo == "dtw":
+        return agrupar_dtw(X, num_clusters, random_state=random_state, **opcoes)
+    raise ValueError(f"Método desconhecido: {metodo}. Opções: {METODOS}")
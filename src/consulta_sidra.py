@@ -0,0 +1,203 @@
+"""
+Planejamento e execução particionada de consultas à API SIDRA.
+
+A API SIDRA limita a quantidade de valores devolvidos por consulta, e consultas
+grandes (por exemplo, nível municipal `n6` ou muitos períodos) ficam lentas ou
+são recusadas. Este módulo estima o tamanho de uma consulta e, se necessário,
+a divide em partições por nível territorial, período e variável, baixa as
+partições em paralelo (com um número limitado de threads) e as combina na
+mesma estrutura que uma consulta única devolveria.
+"""
+import json
+import math
+from concurrent.futures import ThreadPoolExecutor
+
+from cache_http import baixar_com_cache
+
+# Limite de valores por consulta imposto pela API SIDRA
+LIMITE_VALORES = 100_000
+
+# Quantidade de unidades territoriais de cada nível quando consultado com "all"
+UNIDADES_POR_NIVEL = {"n1": 1, "n2": 5, "n3": 27, "n6": 5570}
+
+# Códigos das Unidades da Federação, usados para dividir consultas municipais (n6)
+CODIGOS_UF = [11, 12, 13, 14, 15, 16, 17, 21, 22, 23, 24, 25, 26, 27, 28, 29,
+              31, 32, 33, 35, 41, 42, 43, 50, 51, 52, 53]
+MAX_MUNICIPIOS_POR_UF = 853  # Minas Gerais
+
+# Estimativa usada quando a consulta pede "all"/"allxp" variáveis ou períodos
+VARIAVEIS_ESTIMADAS = 20
+PERIODOS_ESTIMADOS = 20
+
+def decompor_url(url):
+    """Separa a URL da SIDRA em base (até `/values`) e lista ordenada de (parâmetro, valor)."""
+    base, _, caminho = url.partition("/values")
+    partes = [parte for parte in caminho.split("/") if parte]
+    if len(partes) % 2:
+        raise ValueError(f"URL da SIDRA malformada: {url}")
+    return base + "/values", list(zip(partes[::2], partes[1::2]))
+
+def montar_url(base, parametros):
+    """Monta a URL da SIDRA a partir da base e da lista de (parâmetro, valor)."""
+    return base + "".join(f"/{chave}/{valor}" for chave, valor in parametros)
+
+def _eh_nivel_territorial(chave):
+    return chave.startswith("n") and chave[1:].isdigit()
+
+def expandir_periodos(valor):
+    """Converte '2007-2010,2015' em [2007, 2008, 2009, 2010, 2015]; retorna None se não for expansível."""
+    anos = []
+    for trecho in valor.split(","):
+        inicio, _, fim = trecho.partition("-")
+        if not inicio.isdigit() or (fim and not fim.isdigit()):
+            return None
+        anos.extend(range(int(inicio), int(fim or inicio) + 1))
+    return anos
+
+def compactar_periodos(anos):
+    """Converte [2007, 2008, 2009, 2015] em '2007-2009,2015'."""
+    trechos = []
+    inicio = anterior = anos[0]
+    for ano in anos[1:] + [None]:
+        if ano is not None and ano == anterior + 1:
+            anterior = ano
+            continue
+        trechos.append(str(inicio) if inicio == anterior else f"{inicio}-{anterior}")
+        inicio = anterior = ano
+    return ",".join(trechos)
+
+def _contar_unidades(chave, valor):
+    """Estimativa do número de unidades territoriais de um nível."""
+    if valor == "all":
+        return UNIDADES_POR_NIVEL.get(chave, MAX_MUNICIPIOS_POR_UF)
+    if valor.startswith("in "):
+        return MAX_MUNICIPIOS_POR_UF
+    return len(valor.split(","))
+
+def _contar_periodos(valor):
+    anos = expandir_periodos(valor)
+    if anos is not None:
+        return len(anos)
+    if valor.startswith("last"):
+        return int(valor.split()[-1])
+    return PERIODOS_ESTIMADOS
+
+def _contar_variaveis(valor, variaveis_estimadas):
+    if valor.startswith("all"):
+        return variaveis_estimadas
+    return len(valor.split(","))
+
+def estimar_valores(parametros, variaveis_estimadas=VARIAVEIS_ESTIMADAS):
+    """Estima quantos valores a consulta devolverá (períodos x unidades territoriais x variáveis)."""
+    unidades = sum(_contar_unidades(chave, valor) for chave, valor in parametros if _eh_nivel_territorial(chave))
+    valores = dict(parametros)
+    periodos = _contar_periodos(valores.get("p", "all"))
+    variaveis = _contar_variaveis(valores.get("v", "allxp"), variaveis_estimadas)
+    return periodos * unidades * variaveis
+
+def _blocos_territoriais(niveis, limite_por_periodo):
+    """Separa os níveis territoriais em blocos; níveis municipais grandes são divididos por UF."""
+    blocos = []
+    for chave, valor in niveis:
+        if chave == "n6" and valor == "all" and UNIDADES_POR_NIVEL["n6"] > limite_por_periodo:
+            blocos.extend([("n6", f"in n3 {uf}")] for uf in CODIGOS_UF)
+        else:
+            blocos.append([(chave, valor)])
+    return blocos
+
+def planejar_consulta(url, limite=LIMITE_VALORES, variaveis_estimadas=VARIAVEIS_ESTIMADAS):
+    """
+    Retorna a lista de URLs (partições) necessárias para obter os dados de `url`
+    respeitando o limite de valores por consulta.
+
+    Consultas que já cabem no limite não são divididas. As demais são divididas,
+    nesta ordem, por nível territorial, por períodos e, se a lista de variáveis for
+    explícita, por variáveis. A ordem das partições é determinística.
+    """
+    base, parametros = decompor_url(url)
+    if estimar_valores(parametros, variaveis_estimadas) <= limite:
+        return [url]
+
+    valores = dict(parametros)
+    niveis = [(chave, valor) for chave, valor in parametros if _eh_nivel_territorial(chave)]
+    periodos = expandir_periodos(valores.get("p", "all"))
+    variaveis = valores.get("v", "allxp")
+    lista_variaveis = None if variaveis.startswith("all") else variaveis.split(",")
+    n_variaveis = _contar_variaveis(variaveis, variaveis_estimadas)
+
+    def substituir(novos):
+        """Reconstrói os parâmetros na ordem original, trocando níveis, período e variáveis."""
+        resultado, niveis_inseridos = [], False
+        for chave, valor in parametros:
+            if _eh_nivel_territorial(chave):
+                if not niveis_inseridos:
+                    resultado.extend(novos["niveis"])
+                    niveis_inseridos = True
+            elif chave in ("p", "v"):
+                resultado.append((chave, novos[chave]))
+            else:
+                resultado.append((chave, valor))
+        return resultado
+
+    particoes = []
+    for bloco in _blocos_territoriais(niveis, limite // n_variaveis):
+        unidades = sum(_contar_unidades(chave, valor) for chave, valor in bloco)
+
+        grupos_variaveis = [variaveis]
+        variaveis_por_particao = n_variaveis
+        if lista_variaveis and unidades * n_variaveis > limite:
+            variaveis_por_particao = max(1, limite // unidades)
+            grupos_variaveis = [",".join(lista_variaveis[i:i + variaveis_por_particao])
+                                for i in range(0, len(lista_variaveis), variaveis_por_particao)]
+
+        periodos_por_particao = max(1, limite // (unidades * variaveis_por_particao))
+        grupos_periodos = ([compactar_periodos(periodos[i:i + periodos_por_particao])
+                            for i in range(0, len(periodos), periodos_por_particao)]
+                           if periodos else [valores.get("p", "all")])
+
+        for grupo_periodos in grupos_periodos:
+            for grupo_variaveis in grupos_variaveis:
+                particoes.append(montar_url(base, substituir(
+                    {"niveis": bloco, "p": grupo_periodos, "v": grupo_variaveis})))
+    return particoes
+
+def baixar_particoes(urls, max_workers=4):
+    """Baixa as partições em paralelo e retorna as respostas JSON na mesma ordem das URLs."""
+    def baixar(url):
+        caminho = baixar_com_cache(url, progresso=None)
+        with open(caminho, encoding="utf-8") as file:
+            return json.load(file)
+
+    with ThreadPoolExecutor(max_workers=min(max_workers, len(urls))) as executor:
+        return list(executor.map(baixar, urls))
+
+def _combinar_rotulos(rotulos):
+    """Combina rótulos de cabeçalho como a SIDRA faz: 'Brasil' + 'Unidade da Federação' -> 'Brasil e Unidade da Federação'."""
+    sufixo = " (Código)"
+    if all(rotulo.endswith(sufixo) for rotulo in rotulos):
+        return _combinar_rotulos([rotulo[:-len(sufixo)] for rotulo in rotulos]) + sufixo
+    unicos = list(dict.fromkeys(rotulos))
+    if len(unicos) == 1:
+        return unicos[0]
+    return ", ".join(unicos[:-1]) + " e " + unicos[-1]
+
+def combinar_respostas(respostas):
+    """
+    Junta as respostas das partições em uma única lista no formato da SIDRA
+    (cabeçalho na primeira linha, seguido dos registros na ordem das partições).
+    """
+    respostas = [resposta for resposta in respostas if resposta]
+    if not respostas:
+        return None
+    cabecalhos = [resposta[0] for resposta in respostas]
+    cabecalho = {chave: _combinar_rotulos([c[chave] for c in cabecalhos]) for chave in cabecalhos[0]}
+    registros = [registro for resposta in respostas for registro in resposta[1:]]
+    return [cabecalho] + registros
+
+def obter_dados_sidra_particionado(url, limite=LIMITE_VALORES, max_workers=4):
+    """Executa a consulta `url` em partições (se necessário) e retorna o resultado combinado."""
+    particoes = planejar_consulta(url, limite=limite)
+    if len(particoes) > 1:
+        print(f"Consulta SIDRA dividida em {len(particoes)} partições "
+              f"({math.ceil(len(particoes) / max_workers)} rodadas com {max_workers} threads).")
+    return combinar_respostas(baixar_particoes(particoes, max_workers=max_workers))
@@ -0,0 +1,255 @@
+"""
+Cubo de agregação geográfica (Brasil -> região -> UF -> município).
+
+A análise trabalha em um único nível (`LOCAL`). O cubo recebe os dados do nível
+mais detalhado disponível (UFs ou municípios, identificados pelo código do
+IBGE) e pré-calcula, uma única vez, a população e o número de empresas de cada
+nó de todos os níveis em todos os anos. A hierarquia vem dos próprios códigos:
+os dois primeiros dígitos do código de um município são o código da UF, e o
+primeiro dígito do código da UF é o da região (mapa estático abaixo).
+
+Os nós ficam ordenados por nível e por pai, de modo que os filhos de cada nó
+são um trecho contíguo das matrizes: subir (roll-up) e descer (drill-down) na
+hierarquia são consultas por índice, sem reagrupar as linhas originais. As
+somas são acumuladas de baixo para cima, nível a nível, com `np.add.at`.
+
+A razão População/Empresas de um nó é calculada sobre as somas dos locais que
+têm as duas variáveis naquele ano; `cobertura` indica quantos são.
+"""
+import os
+import unicodedata
+
+import numpy as np
+import pandas as pd
+
+NIVEIS = ("Brasil", "Região", "UF", "Município")
+
+CODIGO_BRASIL = 0
+
+REGIOES = {1: "Norte", 2: "Nordeste", 3: "Sudeste", 4: "Sul", 5: "Centro-Oeste"}
+
+# Código do IBGE -> (sigla, nome) de cada UF; a região é o primeiro dígito do código
+UFS = {
+    11: ("RO", "Rondônia"), 12: ("AC", "Acre"), 13: ("AM", "Amazonas"), 14: ("RR", "Roraima"),
+    15: ("PA", "Pará"), 16: ("AP", "Amapá"), 17: ("TO", "Tocantins"),
+    21: ("MA", "Maranhão"), 22: ("PI", "Piauí"), 23: ("CE", "Ceará"), 24: ("RN", "Rio Grande do Norte"),
+    25: ("PB", "Paraíba"), 26: ("PE", "Pernambuco"), 27: ("AL", "Alagoas"), 28: ("SE", "Sergipe"),
+    29: ("BA", "Bahia"),
+    31: ("MG", "Minas Gerais"), 32: ("ES", "Espírito Santo"), 33: ("RJ", "Rio de Janeiro"), 35: ("SP", "São Paulo"),
+    41: ("PR", "Paraná"), 42: ("SC", "Santa Catarina"), 43: ("RS", "Rio Grande do Sul"),
+    50: ("MS", "Mato Grosso do Sul"), 51: ("MT", "Mato Grosso"), 52: ("GO", "Goiás"), 53: ("DF", "Distrito Federal"),
+}
+
+def _chave(nome):
+    """Nome sem acentos, em minúsculas e sem espaços extras, para comparar nomes de locais e níveis."""
+    return " ".join(unicodedata.normalize("NFKD", str(nome)).encode("ascii", "ignore").decode("ascii").lower().split())
+
+def indice_nivel(nivel):
+    """Índice em NIVEIS de um nível dado pelo nome (com ou sem acentos) ou pelo próprio índice."""
+    if isinstance(nivel, (int, np.integer)):
+        return int(nivel)
+    chaves = [_chave(nome) for nome in NIVEIS]
+    try:
+        return chaves.index(_chave(nivel))
+    except ValueError:
+        raise KeyError(f"Nível desconhecido: {nivel} (use {', '.join(NIVEIS)})") from None
+
+def nivel_do_codigo(codigo):
+    """Nível (índice em NIVEIS) de um código do IBGE, pelo número de dígitos."""
+    codigo = int(codigo)
+    if codigo == CODIGO_BRASIL:
+        return 0
+    return {1: 1, 2: 2, 7: 3}[len(str(codigo))]
+
+def codigo_pai(codigo):
+    """Código do nó pai: UF do município, região da UF, Brasil da região."""
+    codigo = int(codigo)
+    nivel = nivel_do_codigo(codigo)
+    if nivel == 3:
+        return codigo // 100_000
+    if nivel == 2:
+        return codigo // 10
+    return CODIGO_BRASIL
+
+def codigos_das_ufs(nomes):
+    """Código do IBGE de cada nome de UF (nome ou sigla); -1 quando o nome não é de uma UF."""
+    por_nome = {_chave(nome): codigo for codigo, (_, nome) in UFS.items()}
+    por_nome.update({_chave(sigla): codigo for codigo, (sigla, _) in UFS.items()})
+    return np.array([por_nome.get(_chave(nome), -1) for nome in nomes], dtype=int)
+
+class CuboGeografico:
+    """Somas de população e empresas por nó da hierarquia geográfica e ano."""
+
+    def __init__(self, codigos, anos, populacao, empresas, nomes=None):
+        """
+        `codigos` são os códigos do IBGE das linhas de `populacao` e `empresas`
+        (matrizes linhas x anos), todas do mesmo nível (UFs ou municípios);
+        `nomes` é necessário apenas para municípios.
+        """
+        codigos = np.asarray(codigos, dtype=np.int64)
+        niveis_folhas = {nivel_do_codigo(codigo) for codigo in codigos}
+        if len(niveis_folhas) != 1 or niveis_folhas & {0, 1}:
+            raise ValueError("As linhas devem ser todas UFs ou todas municípios.")
+        nivel_folhas = niveis_folhas.pop()
+        nomes_folhas = dict(zip(codigos.tolist(), nomes)) if nomes is not None else {}
+
+        # Nós de todos os níveis, dos ancestrais das folhas às folhas
+        por_nivel = [codigos]
+        for _ in range(nivel_folhas):
+            por_nivel.insert(0, np.unique([codigo_pai(codigo) for codigo in por_nivel[0]]))
+        self.anos = np.asarray(anos, dtype=int)
+        self.nivel_folhas = nivel_folhas
+
+        # Ordenação por nível, pai e código: os filhos de cada nó ficam contíguos
+        codigos_nos, niveis, pais = [], [], []
+        posicao = {}
+        for nivel, codigos_nivel in enumerate(por_nivel):
+            codigos_nivel = np.unique(codigos_nivel)
+            if nivel > 0:
+                pais_nivel = np.array([posicao[codigo_pai(codigo)] for codigo in codigos_nivel])
+                ordem = np.lexsort((codigos_nivel, pais_nivel))
+                codigos_nivel, pais_nivel = codigos_nivel[ordem], pais_nivel[ordem]
+            else:
+                pais_nivel = np.full(len(codigos_nivel), -1)
+            for codigo in codigos_nivel:
+                posicao[int(codigo)] = len(codigos_nos)
+                codigos_nos.append(int(codigo))
+            niveis.extend([nivel] * len(codigos_nivel))
+            pais.extend(pais_nivel.tolist())
+        self.codigos = np.array(codigos_nos, dtype=np.int64)
+        self.niveis = np.array(niveis, dtype=int)
+        self.pais = np.array(pais, dtype=int)
+        self.posicao = posicao
+        self.nomes = np.array([self._nome(codigo, nomes_folhas) for codigo in self.codigos], dtype=object)
+        self._por_nome = {}
+        for i, nome in enumerate(self.nomes):
+            self._por_nome.setdefault(_chave(nome), i)
+        for codigo, (sigla, _) in UFS.items():
+            if codigo in posicao:
+                self._por_nome.setdefault(_chave(sigla), posicao[codigo])
+
+        # Trecho [inicio, fim) dos filhos de cada nó
+        n = len(self.codigos)
+        filhos = np.flatnonzero(self.pais >= 0)
+        self.inicio_filhos = np.full(n, n)
+        self.fim_filhos = np.zeros(n, dtype=int)
+        np.minimum.at(self.inicio_filhos, self.pais[filhos], filhos)
+        np.maximum.at(self.fim_filhos, self.pais[filhos], filhos + 1)
+        self.inicio_filhos[self.fim_filhos == 0] = 0
+
+        # Somas de baixo para cima, nível a nível
+        folhas = np.array([posicao[int(codigo)] for codigo in codigos])
+        populacao = np.asarray(populacao, dtype=float)
+        empresas = np.asarray(empresas, dtype=float)
+        self._folhas = (codigos, populacao, empresas)
+        pares = ~np.isnan(populacao) & ~np.isnan(empresas)
+        somas = {nome: np.zeros((n, len(self.anos))) for nome in
+                 ("populacao", "empresas", "populacao_pares", "empresas_pares", "cobertura")}
+        np.add.at(somas["populacao"], folhas, np.nan_to_num(populacao))
+        np.add.at(somas["empresas"], folhas, np.nan_to_num(empresas))
+        np.add.at(somas["populacao_pares"], folhas, np.where(pares, populacao, 0.0))
+        np.add.at(somas["empresas_pares"], folhas, np.where(pares, empresas, 0.0))
+        np.add.at(somas["cobertura"], folhas, pares.astype(float))
+        for nivel in range(nivel_folhas, 0, -1):
+            nos = np.flatnonzero(self.niveis == nivel)
+            for soma in somas.values():
+                np.add.at(soma, self.pais[nos], soma[nos])
+
+        self.populacao, self.empresas = somas["populacao"], somas["empresas"]
+        self.cobertura = somas["cobertura"].astype(int)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            self.razao = np.where(self.cobertura > 0, somas["populacao_pares"] / somas["empresas_pares"], np.nan)
+
+    @staticmethod
+    def _nome(codigo, nomes_folhas):
+        nivel = nivel_do_codigo(codigo)
+        if nivel == 0:
+            return "Brasil"
+        if nivel == 1:
+            return REGIOES[codigo]
+        if nivel == 2:
+            return UFS[codigo][1]
+        return str(nomes_folhas.get(codigo, codigo))
+
+    @classmethod
+    def de_painel(cls, painel):
+        """
+        Cubo a partir de um painel por UF (ver painel.py), identificando as UFs
+        pelo nome. Linhas que não são UFs (como "Brasil", que o cubo calcula) são
+        ignoradas.
+        """
+        codigos = codigos_das_ufs(painel.locais)
+        ufs = codigos >= 0
+        return cls(codigos[ufs], painel.anos, painel.populacao[ufs], painel.empresas[ufs])
+
+    def __len__(self):
+        return len(self.codigos)
+
+    def __repr__(self):
+        contagens = ", ".join(f"{np.sum(self.niveis == nivel)} {NIVEIS[nivel]}"
+                              for nivel in range(self.nivel_folhas + 1))
+        return f"CuboGeografico({contagens}; {len(self.anos)} anos)"
+
+    def indice(self, no):
+        """Índice de um nó pelo código do IBGE (int), pelo nome ou pela sigla da UF."""
+        if isinstance(no, (int, np.integer)) or str(no).isdigit():
+            try:
+                return self.posicao[int(no)]
+            except KeyError:
+                raise KeyError(f"Código não encontrado: {no}") from None
+        try:
+            return self._por_nome[_chave(no)]
+        except KeyError:
+            raise KeyError(f"Local não encontrado: {no}") from None
+
+    def _tabela(self, indices, ano=None):
+        """Tabela dos nós indicados: valores do `ano` ou, sem ano, de todos os anos (formato longo)."""
+        indices = np.asarray(indices, dtype=int)
+        if ano is None:
+            colunas = np.arange(len(self.anos))
+        else:
+            colunas = np.flatnonzero(self.anos == int(ano))
+            if not len(colunas):
+                raise KeyError(f"Ano não disponível: {ano}")
+        linhas, colunas = np.repeat(indices, len(colunas)), np.tile(colunas, len(indices))
+        return pd.DataFrame({
+            "Nível": np.asarray(NIVEIS, dtype=object)[self.niveis[linhas]],
+            "Código": self.codigos[linhas],
+            "LOCAL": self.nomes[linhas],
+            "Ano": self.anos[colunas],
+            "População": self.populacao[linhas, colunas],
+            "Número de empresas ativas": self.empresas[linhas, colunas],
+            "Razão População/Empresas": self.razao[linhas, colunas],
+            "Locais com dados": self.cobertura[linhas, colunas],
+        })
+
+    def nivel(self, nivel, ano=None):
+        """Todos os nós de um nível ("Brasil", "Região", "UF", "Município" ou o índice)."""
+        return self._tabela(np.flatnonzero(self.niveis == indice_nivel(nivel)), ano)
+
+    def filhos(self, no, ano=None):
+        """Drill-down: os nós imediatamente abaixo de `no`."""
+        i = self.indice(no)
+        return self._tabela(np.arange(self.inicio_filhos[i], self.fim_filhos[i]), ano)
+
+    def ancestrais(self, no, ano=None):
+        """Roll-up: o próprio nó e seus ancestrais, até o Brasil."""
+        caminho = [self.indice(no)]
+        while self.pais[caminho[-1]] >= 0:
+            caminho.append(self.pais[caminho[-1]])
+        return self._tabela(caminho, ano)
+
+    def salvar(self, caminho):
+        """Grava os dados das folhas em um arquivo .npz (o cubo é refeito ao carregar)."""
+        codigos, populacao, empresas = self._folhas
+        nomes = self.nomes[[self.posicao[int(codigo)] for codigo in codigos]].astype(str)
+        os.makedirs(os.path.dirname(caminho) or ".", exist_ok=True)
+        np.savez_compressed(caminho, codigos=codigos, anos=self.anos, nomes=nomes, populacao=populacao,
+                            empresas=empresas)
+
+    @classmethod
+    def carregar(cls, caminho):
+        """Cubo a partir de um arquivo gravado por `salvar`."""
+        with np.load(caminho) as arquivo:
+            return cls(arquivo["codigos"], arquivo["anos"], arquivo["populacao"], arquivo["empresas"],
+                       arquivo["nomes"])
@@ -0,0 +1,204 @@
+"""
+Estabilidade da clusterização e escolha do número de clusters.
+
+A análise agrupa os locais com k=4 e uma única semente (42). Esta varredura
+repete a clusterização para vários valores de k e várias sementes, em um pool de
+processos, e mede para cada k:
+- a silhueta média (coesão e separação dos grupos), calculada no mesmo espaço em
+  que o método agrupa (valores originais no K-Means, séries normalizadas nos
+  demais; no "dtw", com distância euclidiana);
+- o consenso: fração das sementes em que cada par de locais cai no mesmo
+  cluster, e o PAC (proporção de pares ambíguos, com consenso entre 0,1 e 0,9);
+  quanto menor, mais estáveis os grupos;
+- a concordância (índice de Rand ajustado) das demais sementes com a semente 42.
+
+O consenso é acumulado por blocos de linhas, um k por vez, sem montar a matriz
+locais x locais: para municípios, ela teria dezenas de milhões de células por k.
+São guardados apenas os rótulos de cada semente, a partir dos quais
+`matriz_consenso` refaz a matriz de um k quando necessário.
+
+O k recomendado é o que maximiza silhueta média x (1 - PAC).
+
+A matriz de dados fica em memória compartilhada (`multiprocessing.shared_memory`):
+cada processo a acessa diretamente, sem recebê-la serializada a cada tarefa, e
+só os rótulos voltam ao processo principal. Cada processo usa uma única thread
+do BLAS/OpenMP, de modo que as tarefas (k, semente) escalam com o número de núcleos.
+"""
+import os
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+
+import numpy as np
+import pandas as pd
+
+from clusterizacao import _espaco, agrupar_series
+from instrumentacao import instrumentar
+
+VALORES_K = tuple(range(2, 9))
+N_SEMENTES = 20
+SEMENTE_REFERENCIA = 42
+
+# Pares com consenso nesse intervalo são considerados ambíguos (PAC)
+INTERVALO_AMBIGUO = (0.1, 0.9)
+
+# Acima desse número de locais, a silhueta é calculada sobre uma amostra
+AMOSTRA_SILHUETA = 5000
+
+# Células (pares de locais) do bloco de consenso acumulado de cada vez
+CELULAS_POR_BLOCO = 2 ** 22
+
+# Matriz de dados de cada processo do pool (ver _iniciar_processo)
+_dados = {}
+
+def _iniciar_processo(nome, forma, metodo):
+    """Anexa o processo ao bloco de memória compartilhada com a matriz de dados."""
+    from threadpoolctl import threadpool_limits
+
+    memoria = shared_memory.SharedMemory(name=nome)
+    X = np.ndarray(forma, dtype=np.float64, buffer=memoria.buf)
+    _dados.update(memoria=memoria, X=X, espaco=_espaco(X, metodo),
+                  limites=threadpool_limits(limits=1))
+
+def _silhueta(espaco, rotulos, semente):
+    from sklearn.metrics import silhouette_score
+
+    if len(np.unique(rotulos)) < 2:
+        return np.nan
+    amostra = AMOSTRA_SILHUETA if len(rotulos) > AMOSTRA_SILHUETA else None
+    return float(silhouette_score(espaco, rotulos, sample_size=amostra, random_state=semente))
+
+def _agrupar(X, espaco, k, semente, metodo, opcoes):
+    rotulos = np.asarray(agrupar_series(X, k, metodo=metodo, random_state=semente, **opcoes), dtype=np.int32)
+    return rotulos, _silhueta(espaco, rotulos, semente)
+
+def _tarefa(k, semente, metodo, opcoes):
+    """Tarefa executada em um processo do pool, sobre a matriz compartilhada."""
+    return _agrupar(_dados["X"], _dados["espaco"], k, semente, metodo, opcoes)
+
+def matriz_consenso(rotulos_por_semente, k):
+    """Fração das execuções em que cada par de locais ficou no mesmo cluster (locais x locais)."""
+    consenso = np.zeros((rotulos_por_semente.shape[1],) * 2, dtype=np.float32)
+    for rotulos in rotulos_por_semente:
+        pertinencia = np.eye(k, dtype=np.float32)[rotulos]
+        consenso += pertinencia @ pertinencia.T
+    return consenso / len(rotulos_por_semente)
+
+def pac(consenso, intervalo=INTERVALO_AMBIGUO):
+    """Proporção de pares de locais distintos com consenso ambíguo."""
+    pares = consenso[np.triu_indices(len(consenso), k=1)]
+    if len(pares) == 0:
+        return 0.0
+    return float(np.mean((pares > intervalo[0]) & (pares < intervalo[1])))
+
+def resumir_consenso(rotulos_por_semente, intervalo=INTERVALO_AMBIGUO, celulas_por_bloco=CELULAS_POR_BLOCO):
+    """
+    PAC e locais instáveis (com algum par de consenso ambíguo) dos rótulos de
+    cada semente (sementes x locais), acumulando o consenso por blocos de linhas.
+    Equivale a `pac` e a `locais_instaveis` sobre `matriz_consenso`, sem montá-la.
+    """
+    n_sementes, n_locais = rotulos_por_semente.shape
+    linhas = max(1, min(n_locais, celulas_por_bloco // max(n_locais, 1)))
+    # Consenso ambíguo em número de sementes: fração entre os limites do intervalo
+    minimo, maximo = intervalo[0] * n_sementes, intervalo[1] * n_sementes
+    contagem = np.empty((linhas, n_locais), dtype=np.uint16)
+    iguais = np.empty((linhas, n_locais), dtype=bool)
+    colunas = np.arange(n_locais)
+
+    instaveis = np.zeros(n_locais, dtype=bool)
+    ambiguos = 0
+    for inicio in range(0, n_locais, linhas):
+        fim = min(inicio + linhas, n_locais)
+        bloco, mesmo = contagem[:fim - inicio], iguais[:fim - inicio]
+        bloco[:] = 0
+        for rotulos in rotulos_por_semente:
+            np.equal(rotulos[inicio:fim, None], rotulos[None, :], out=mesmo)
+            bloco += mesmo
+        ambiguo = (bloco > minimo) & (bloco < maximo)
+        instaveis[inicio:fim] = ambiguo.any(axis=1)
+        # Cada par conta uma vez (coluna depois da linha)
+        ambiguos += int(np.count_nonzero(ambiguo & (colunas[None, :] > np.arange(inicio, fim)[:, None])))
+    pares = n_locais * (n_locais - 1) // 2
+    return (ambiguos / pares if pares else 0.0), instaveis
+
+@instrumentar()
+def varrer_estabilidade(X, valores_k=VALORES_K, n_sementes=N_SEMENTES, metodo="kmeans", max_workers=None,
+                        semente_referencia=SEMENTE_REFERENCIA, **opcoes):
+    """
+    Agrupa as linhas de X (locais x anos) para cada k de `valores_k` com
+    `n_sementes` sementes (a partir de `semente_referencia`).
+
+    Retorna (resumo, instaveis, rotulos): `resumo` é um DataFrame com uma linha
+    por k (silhueta média e desvio, PAC, concordância média das demais sementes
+    com a de referência, pontuação e o k recomendado); `instaveis` e `rotulos`
+    mapeiam cada k para a máscara dos locais com algum par de consenso ambíguo
+    e para os rótulos de cada semente (sementes x locais).
+    """
+    X = np.ascontiguousarray(X, dtype=np.float64)
+    valores_k = [k for k in valores_k if 2 <= k < X.shape[0]]
+    if not valores_k:
+        raise ValueError(f"Nenhum k válido para {X.shape[0]} locais (é preciso 2 <= k < número de locais).")
+    sementes = semente_referencia + np.arange(n_sementes)
+    tarefas = [(k, int(semente)) for k in valores_k for semente in sementes]
+
+    max_workers = min(max_workers or os.cpu_count() or 1, len(tarefas))
+    if max_workers <= 1:
+        espaco = _espaco(X, metodo)
+        resultados = [_agrupar(X, espaco, k, semente, metodo, opcoes) for k, semente in tarefas]
+    else:
+        memoria = shared_memory.SharedMemory(create=True, size=X.nbytes)
+        try:
+            np.ndarray(X.shape, dtype=X.dtype, buffer=memoria.buf)[:] = X
+            with ProcessPoolExecutor(max_workers=max_workers, initializer=_iniciar_processo,
+                                     initargs=(memoria.name, X.shape, metodo)) as executor:
+                k_tarefas, sementes_tarefas = zip(*tarefas)
+                resultados = list(executor.map(_tarefa, k_tarefas, sementes_tarefas, [metodo] * len(tarefas),
+                                               [opcoes] * len(tarefas),
+                                               chunksize=max(1, len(tarefas) // (4 * max_workers))))
+        finally:
+            memoria.close()
+            memoria.unlink()
+
+    from sklearn.metrics import adjusted_rand_score
+
+    linhas, instaveis, rotulos_por_k = [], {}, {}
+    for i, k in enumerate(valores_k):
+        bloco = resultados[i * n_sementes:(i + 1) * n_sementes]
+        rotulos = np.stack([r for r, _ in bloco])
+        silhuetas = np.array([s for _, s in bloco])
+        proporcao_ambigua, instaveis[k] = resumir_consenso(rotulos)
+        rotulos_por_k[k] = rotulos
+        linhas.append({
+            "k": k,
+            "Silhueta média": np.nanmean(silhuetas) if not np.isnan(silhuetas).all() else np.nan,
+            "Silhueta (desvio)": np.nanstd(silhuetas) if not np.isnan(silhuetas).all() else np.nan,
+            "PAC": proporcao_ambigua,
+            # A semente de referência (rotulos[0]) não entra na média de concordância com ela mesma
+            f"ARI com a semente {semente_referencia}": (
+                np.mean([adjusted_rand_score(rotulos[0], r) for r in rotulos[1:]]) if n_sementes > 1 else np.nan),
+        })
+
+    resumo = pd.DataFrame(linhas)
+    resumo["Pontuação"] = resumo["Silhueta média"] * (1 - resumo["PAC"])
+    resumo["Recomendado"] = False
+    if resumo["Pontuação"].notna().any():
+        resumo.loc[resumo["Pontuação"].idxmax(), "Recomendado"] = True
+    return resumo, instaveis, rotulos_por_k
+
+def k_recomendado(resumo):
+    """k marcado como recomendado no resumo (None se nenhum)."""
+    recomendados = resumo.loc[resumo["Recomendado"], "k"]
+    return int(recomendados.iloc[0]) if len(recomendados) else None
+
+def locais_instaveis(instaveis, locais):
+    """Nomes dos locais marcados em `instaveis` (mudam de grupo conforme a semente)."""
+    return [str(local) for local in np.asarray(locais)[instaveis]]
+
+def salvar_rotulos(rotulos_por_k, locais, caminho):
+    """
+    Grava os rótulos de cada semente (k x sementes x locais) e os locais em um
+    arquivo .npz; a matriz de consenso de um k sai de `matriz_consenso`.
+    """
+    valores_k = sorted(rotulos_por_k)
+    os.makedirs(os.path.dirname(caminho) or ".", exist_ok=True)
+    np.savez_compressed(caminho, k=np.array(valores_k), locais=np.asarray(locais).astype(str),
+                        rotulos=np.stack([rotulos_por_k[k] for k in valores_k]))
@@ -0,0 +1,116 @@
+"""
+Motor vetorizado de extrapolação de séries anuais.
+
+Recebe uma matriz local x ano (com NaN nos anos sem observação) e estima os
+valores dos anos-alvo de todas as séries de uma vez, em operações NumPy sobre a
+matriz inteira, sem laço por local.
+
+Métodos disponíveis:
+- "linear": mesmo resultado de `scipy.interpolate.interp1d(kind="linear",
+  fill_value="extrapolate")` ajustado aos anos observados de cada série
+  (interpola entre os vizinhos ou prolonga o primeiro/último segmento).
+- "tendencia": reta de mínimos quadrados sobre todos os anos observados.
+- "inclinacao": parte do último valor observado com a inclinação de mínimos
+  quadrados dos últimos `k` anos observados.
+"""
+import numpy as np
+
+METODOS = ("linear", "tendencia", "inclinacao")
+
+def _indices_vizinhos(observado):
+    """Para cada célula, índice da última observação <= coluna e da primeira >= coluna (-1/T se não houver)."""
+    n_anos = observado.shape[1]
+    posicoes = np.arange(n_anos)
+    anterior = np.maximum.accumulate(np.where(observado, posicoes, -1), axis=1)
+    seguinte = np.minimum.accumulate(np.where(observado, posicoes, n_anos)[:, ::-1], axis=1)[:, ::-1]
+    return anterior, seguinte
+
+def _extrapolar_linear(valores, anos, colunas_alvo):
+    observado = ~np.isnan(valores)
+    n_locais, n_anos = valores.shape
+    linhas = np.arange(n_locais)[:, None]
+    anterior, seguinte = _indices_vizinhos(observado)
+
+    p = anterior[:, colunas_alvo]
+    n = seguinte[:, colunas_alvo]
+    # Observação anterior a `p` e posterior a `n`, usadas para prolongar o último/primeiro segmento
+    p2 = np.where(p >= 1, np.take_along_axis(anterior, np.clip(p - 1, 0, n_anos - 1), axis=1), -1)
+    n2 = np.where(n <= n_anos - 2, np.take_along_axis(seguinte, np.clip(n + 1, 0, n_anos - 1), axis=1), n_anos)
+
+    tem_p, tem_n = p >= 0, n < n_anos
+    entre = tem_p & tem_n & (p != n)
+    depois = tem_p & ~tem_n & (p2 >= 0)
+    antes = ~tem_p & tem_n & (n2 < n_anos)
+
+    a = np.select([entre, depois, antes], [p, p2, n], default=0)
+    b = np.select([entre, depois, antes], [n, p, n2], default=0)
+    xa, xb = anos[a], anos[b]
+    ya, yb = valores[linhas, a], valores[linhas, b]
+    with np.errstate(divide="ignore", invalid="ignore"):
+        estimativa = ya + (yb - ya) * (anos[colunas_alvo] - xa) / (xb - xa)
+
+    resultado = np.full(p.shape, np.nan)
+    resultado[entre | depois | antes] = estimativa[entre | depois | antes]
+    exato = tem_p & (p == colunas_alvo)
+    resultado[exato] = valores[:, colunas_alvo][exato]
+    # Assim como no laço original, séries com menos de dois pontos não são estimadas
+    resultado[observado.sum(axis=1) < 2] = np.nan
+    return resultado
+
+def _reta_minimos_quadrados(valores, anos, mascara):
+    """Coeficientes (intercepto, inclinação) por linha, usando só as células da máscara."""
+    x = np.broadcast_to(anos, valores.shape)
+    y = np.where(mascara, valores, 0.0)
+    x = np.where(mascara, x, 0.0)
+    n = mascara.sum(axis=1)
+    sx, sy = x.sum(axis=1), y.sum(axis=1)
+    sxx, sxy = (x * x).sum(axis=1), (x * y).sum(axis=1)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        inclinacao = (n * sxy - sx * sy) / (n * sxx - sx * sx)
+        intercepto = (sy - inclinacao * sx) / n
+    inclinacao[n < 2] = np.nan
+    return intercepto, inclinacao
+
+def _extrapolar_tendencia(valores, anos, colunas_alvo):
+    intercepto, inclinacao = _reta_minimos_quadrados(valores, anos, ~np.isnan(valores))
+    return intercepto[:, None] + inclinacao[:, None] * anos[colunas_alvo][None, :]
+
+def _extrapolar_inclinacao(valores, anos, colunas_alvo, k):
+    observado = ~np.isnan(valores)
+    # Ordem de cada observação contada a partir do fim: 1 = última observação
+    ordem_do_fim = np.cumsum(observado[:, ::-1], axis=1)[:, ::-1]
+    ultimos_k = observado & (ordem_do_fim <= k)
+    _, inclinacao = _reta_minimos_quadrados(valores, anos, ultimos_k)
+
+    ultima = np.where(observado.any(axis=1), observado.shape[1] - 1 - np.argmax(observado[:, ::-1], axis=1), 0)
+    linhas = np.arange(valores.shape[0])
+    x_ultimo, y_ultimo = anos[ultima], valores[linhas, ultima]
+    return y_ultimo[:, None] + inclinacao[:, None] * (anos[colunas_alvo][None, :] - x_ultimo[:, None])
+
+def extrapolar_matriz(valores, anos, anos_alvo, metodo="linear", k=3):
+    """
+    Estima os valores dos `anos_alvo` para todas as linhas de `valores`.
+
+    `valores` é uma matriz (locais x anos) com NaN nos anos não observados e
+    `anos` é o vetor ordenado de anos das colunas. Anos-alvo fora de `anos` são
+    acrescentados à grade. Retorna uma matriz (locais x anos_alvo); séries com
+    menos de dois pontos observados ficam com NaN.
+    """
+    if metodo not in METODOS:
+        raise ValueError(f"Método desconhecido: {metodo}. Opções: {METODOS}")
+    valores = np.asarray(valores, dtype=float)
+    anos = np.asarray(anos, dtype=float)
+    anos_alvo = np.asarray(anos_alvo, dtype=float)
+
+    grade = np.union1d(anos, anos_alvo)
+    if len(grade) != len(anos):
+        completa = np.full((valores.shape[0], len(grade)), np.nan)
+        completa[:, np.searchsorted(grade, anos)] = valores
+        valores, anos = completa, grade
+    colunas_alvo = np.searchsorted(anos, anos_alvo)
+
+    if metodo == "linear":
+        return _extrapolar_linear(valores, anos, colunas_alvo)
+    if metodo == "tendencia":
+        return _extrapolar_tendencia(valores, anos, colunas_alvo)
+    return _extrapolar_inclinacao(valores, anos, colunas_alvo, k)
@@ -1,7 +1,28 @@
+import hashlib
+import inspect
+import json
 import os
+import re
+import unicodedata
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
 import pandas as pd
-import matplotlib.pyplot as plt
-import seaborn as sns
+
+from armazenamento import caminho_intermediario, ler_tabela
+from painel import VARIAVEIS, Painel, colunas_de_metricas
+from instrumentacao import instrumentar
+
+COLUNAS_GRAFICOS = ["LOCAL", "Ano", "Razão População/Empresas", "Cluster"]
+
+# Hashes dos dados de cada figura na última renderização em lote
+ARQUIVO_HASHES = ".hash_graficos.json"
+
+# Acima desse número de locais, a legenda das tendências traz um item por cluster, e não por local
+LIMITE_LEGENDA_LOCAIS = 60
+
+# Gráficos de tendência de cada cluster (pequenos múltiplos)
+PADRAO_TENDENCIA_CLUSTER = re.compile(r"^tendencias_cluster_\d+\.png$")
 
 def criar_diretorio_saida(diretorio="resultados"):
     """
@@ -10,99 +31,297 @@ def criar_diretorio_saida(diretorio="resultados"):
     os.makedirs(diretorio, exist_ok=True)
     return diretorio
 
+@instrumentar()
 def carregar_dados(caminho_arquivo):
     """
-    Carrega os dados processados do arquivo CSV e realiza a limpeza inicial.
+    Carrega os dados processados (já tipados pelo esquema de armazenamento.py),
+    lendo apenas as colunas usadas nos gráficos (e as das métricas adicionais),
+    e realiza a limpeza inicial.
     """
     if not os.path.exists(caminho_arquivo):
         print(f"Erro: O arquivo '{caminho_arquivo}' não foi encontrado. Execute o processamento dos dados primeiro.")
         return None
 
-    df = pd.read_csv(caminho_arquivo)
+    from armazenamento import colunas_tabela
+
+    metricas = colunas_de_metricas(colunas_tabela(caminho_arquivo))
+    return preparar_dados(ler_tabela(caminho_arquivo, colunas=COLUNAS_GRAFICOS + metricas))
+
+@instrumentar()
+def preparar_dados(dados):
+    """
+    Realiza a limpeza inicial de dados processados já carregados em memória
+    (Painel ou tabela no formato de `merged_data`) e retorna um Painel.
+    """
+    if not isinstance(dados, Painel):
+        dados = Painel.de_dataframe(dados[COLUNAS_GRAFICOS + colunas_de_metricas(dados.columns)])
 
     # Remover "Brasil" para análise por estado
-    df = df[df["LOCAL"] != "Brasil"]
+    return dados.sem_locais("Brasil")
 
-    # Garantir que as colunas numéricas estão no formato correto
-    df["Ano"] = df["Ano"].astype(int)
-    df["Razão População/Empresas"] = df["Razão População/Empresas"].astype(float)
-    df["Cluster"] = df["Cluster"].astype(int)
+def nome_arquivo(painel, nome):
+    """
+    Nome do arquivo de uma figura ou lista: o próprio `nome` para a razão
+    População/Empresas e `nome` com o nome da métrica para as demais
+    (ex.: heatmap_saturacao_populacao_pessoal_ocupado.png).
+    """
+    if painel.nome_razao == VARIAVEIS["razao"]:
+        return nome
+    sem_acentos = unicodedata.normalize("NFKD", painel.nome_razao.removeprefix("Razão ")).encode("ascii", "ignore")
+    sufixo = re.sub(r"[^a-z0-9]+", "_", sem_acentos.decode("ascii").lower()).strip("_")
+    base, extensao = os.path.splitext(nome)
+    return f"{base}_{sufixo}{extensao}"
 
-    return df
+def paineis_das_metricas(painel):
+    """Painel de cada métrica agrupada (ver analize.clusterizar_metricas), só com os locais que têm cluster."""
+    paineis = {}
+    for nome in painel.clusters_metricas:
+        metrica = painel.metrica(nome)
+        agrupados = pd.notna(metrica.cluster)
+        metrica = metrica.filtrar_locais(agrupados)
+        metrica.cluster = np.asarray(metrica.cluster).astype(int)
+        paineis[nome] = metrica
+    return paineis
 
-def obter_estados_por_cluster(df):
+def obter_estados_por_cluster(painel):
     """
     Retorna um dicionário com a lista de estados por cluster.
     """
-    cluster_estados = {}
-    for cluster in df["Cluster"].unique():
-        estados_cluster = df[df["Cluster"] == cluster]["LOCAL"].unique().tolist()
-        cluster_estados[cluster] = estados_cluster
-    return cluster_estados
+    return painel.locais_por_cluster()
 
-def gerar_grafico_dispersao(df, diretorio_saida):
+def _finalizar(mostrar):
+    """Exibe a figura atual (modo interativo) ou apenas a fecha (modo em lote)."""
+    import matplotlib.pyplot as plt
+
+    if mostrar:
+        plt.show()
+    else:
+        plt.close()
+
+def gerar_grafico_dispersao(painel, diretorio_saida, mostrar=True):
     """
     Gera e salva um gráfico de dispersão dos clusters ao longo do tempo.
     """
+    import matplotlib.pyplot as plt
+    import seaborn as sns
+
+    # Pontos na ordem ano -> local, apenas onde a razão está definida
+    observados = ~np.isnan(painel.razao.T)
+    anos = np.broadcast_to(painel.anos[:, None], observados.shape)[observados]
+    clusters = np.broadcast_to(np.asarray(painel.cluster)[None, :], observados.shape)[observados]
+
     plt.figure(figsize=(12, 6))
-    sns.scatterplot(x=df["Ano"], y=df["Razão População/Empresas"],
-                    hue=df["Cluster"], palette="tab10", s=100)
+    sns.scatterplot(x=anos, y=painel.razao.T[observados], hue=clusters, palette="tab10", s=100)
 
     plt.xlabel("Ano")
-    plt.ylabel("Razão População/Empresas")
-    plt.title("Clusters de Estados por Razão População/Empresas")
+    plt.ylabel(painel.nome_razao)
+    plt.title(f"Clusters de Estados por {painel.nome_razao}")
     plt.legend(title="Cluster", bbox_to_anchor=(1.05, 1), loc="upper left")
     plt.grid(True)
 
-    caminho_grafico = os.path.join(diretorio_saida, "clusters_dispersao.png")
+    caminho_grafico = os.path.join(diretorio_saida, nome_arquivo(painel, "clusters_dispersao.png"))
     plt.savefig(caminho_grafico, bbox_inches="tight")
-    plt.show()
+    _finalizar(mostrar)
     return caminho_grafico
 
-def gerar_grafico_tendencia(df, cluster_estados, diretorio_saida):
+def _desenhar_series(ax, painel, cores):
+    """
+    Desenha as séries de todos os locais do painel como uma única LineCollection
+    (anos sem observação interrompem a linha).
+    """
+    from matplotlib.collections import LineCollection
+
+    anos = np.broadcast_to(painel.anos[None, :], painel.razao.shape)
+    segmentos = np.stack([anos, painel.razao], axis=-1)
+    ax.add_collection(LineCollection(segmentos, colors=cores, linestyles="--", linewidths=1.5))
+    ax.autoscale_view()
+
+def gerar_grafico_tendencia(painel, cluster_estados, diretorio_saida, mostrar=True):
     """
     Gera e salva um gráfico de linhas mostrando a tendência temporal por cluster.
+
+    Cada estado tem sua cor e aparece na legenda como "estado (Cluster c)"; com
+    mais de LIMITE_LEGENDA_LOCAIS locais, as linhas são coloridas pelo cluster e
+    a legenda traz um item por cluster.
     """
-    plt.figure(figsize=(14, 7))
-    for cluster, estados in cluster_estados.items():
-        for estado in estados:
-            subset = df[df["LOCAL"] == estado]
-            plt.plot(subset["Ano"], subset["Razão População/Empresas"], label=f"{estado} (Cluster {cluster})", linestyle="--")
+    import matplotlib.pyplot as plt
+    from matplotlib.lines import Line2D
+
+    if len(painel) <= LIMITE_LEGENDA_LOCAIS:
+        ciclo = plt.rcParams["axes.prop_cycle"].by_key()["color"]
+        rotulos = [(estado, f"{estado} (Cluster {cluster})")
+                   for cluster, estados in cluster_estados.items() for estado in estados]
+        cor = {estado: ciclo[i % len(ciclo)] for i, (estado, _) in enumerate(rotulos)}
+        cores = [cor[estado] for estado in painel.locais]
+        legenda = [Line2D([], [], color=cor[estado], linestyle="--", label=rotulo) for estado, rotulo in rotulos]
+    else:
+        paleta = plt.get_cmap("tab10")
+        cor = {cluster: paleta(i % 10) for i, cluster in enumerate(cluster_estados)}
+        cores = [cor[cluster] for cluster in painel.cluster]
+        legenda = [Line2D([], [], color=cor[cluster], linestyle="--",
+                          label=f"Cluster {cluster} ({len(estados)} locais)")
+                   for cluster, estados in cluster_estados.items()]
+
+    fig, ax = plt.subplots(figsize=(14, 7))
+    _desenhar_series(ax, painel, cores)
 
     plt.xlabel("Ano")
-    plt.ylabel("Razão População/Empresas")
+    plt.ylabel(painel.nome_razao)
     plt.title("Tendências Temporais por Cluster")
+    plt.legend(handles=legenda, loc="upper right", fontsize="small")
+    plt.grid(True)
+
+    caminho_grafico = os.path.join(diretorio_saida, nome_arquivo(painel, "tendencias_temporais.png"))
+    plt.savefig(caminho_grafico, bbox_inches="tight")
+    _finalizar(mostrar)
+    return caminho_grafico
+
+def gerar_grafico_tendencia_cluster(painel, cluster, diretorio_saida, mostrar=True):
+    """
+    Gera e salva o gráfico de tendência dos locais de um cluster (um dos
+    "pequenos múltiplos" do modo em lote), com a mediana do cluster em destaque.
+    """
+    import matplotlib.pyplot as plt
+
+    fig, ax = plt.subplots(figsize=(8, 4))
+    _desenhar_series(ax, painel, "tab:gray")
+    with np.errstate(all="ignore"):
+        mediana = np.nanmedian(painel.razao, axis=0)
+    ax.plot(painel.anos, mediana, color="tab:red", linewidth=2.5, label="Mediana do cluster")
+
+    plt.xlabel("Ano")
+    plt.ylabel(painel.nome_razao)
+    plt.title(f"Cluster {cluster}: {len(painel)} locais")
     plt.legend(loc="upper right", fontsize="small")
     plt.grid(True)
 
-    caminho_grafico = os.path.join(diretorio_saida, "tendencias_temporais.png")
+    caminho_grafico = os.path.join(diretorio_saida, nome_arquivo(painel, f"tendencias_cluster_{cluster}.png"))
     plt.savefig(caminho_grafico, bbox_inches="tight")
-    plt.show()
+    _finalizar(mostrar)
     return caminho_grafico
 
-def gerar_heatmap_saturacao(df, diretorio_saida):
+def gerar_heatmap_saturacao(painel, diretorio_saida, mostrar=True):
     """
     Gera e salva um heatmap para visualizar a saturação de mercado por estado ao longo do tempo.
     """
-    pivot_data = df.pivot(index="LOCAL", columns="Ano", values="Razão População/Empresas")
+    import matplotlib.pyplot as plt
+    import seaborn as sns
+
+    # A matriz do painel já está no formato local x ano; o DataFrame só dá nome aos eixos
+    matriz = pd.DataFrame(painel.razao, index=painel.locais, columns=painel.anos)
 
     plt.figure(figsize=(12, 8))
-    sns.heatmap(pivot_data, cmap="coolwarm", linewidths=0.5, annot=False, cbar_kws={'label': 'Razão População/Empresas'})
+    sns.heatmap(matriz, cmap="coolwarm", linewidths=0.5, annot=False, cbar_kws={'label': painel.nome_razao})
 
     plt.xlabel("Ano")
     plt.ylabel("Estados")
     plt.title("Heatmap de Saturação por Estado")
 
-    caminho_grafico = os.path.join(diretorio_saida, "heatmap_saturacao.png")
+    caminho_grafico = os.path.join(diretorio_saida, nome_arquivo(painel, "heatmap_saturacao.png"))
     plt.savefig(caminho_grafico, bbox_inches="tight")
-    plt.show()
+    _finalizar(mostrar)
     return caminho_grafico
 
-def salvar_lista_clusters(cluster_estados, diretorio_saida):
+def hash_dados(funcao, argumentos):
+    """SHA-256 dos dados de entrada de uma figura e do código do módulo que a desenha."""
+    sha = hashlib.sha256(inspect.getsource(inspect.getmodule(funcao)).encode("utf-8"))
+    for argumento in argumentos:
+        if isinstance(argumento, Painel):
+            sha.update("\x1f".join(map(str, [argumento.nome_razao, *argumento.locais])).encode("utf-8"))
+            for matriz in (argumento.anos, argumento.razao, np.asarray(argumento.cluster)):
+                sha.update(np.ascontiguousarray(matriz).tobytes())
+        else:
+            sha.update(repr(argumento).encode("utf-8"))
+    return sha.hexdigest()
+
+def _renderizar(funcao, argumentos):
+    """Executa uma tarefa de renderização com o backend não interativo (no pool de processos ou no próprio)."""
+    import matplotlib
+    matplotlib.use("Agg")
+    return funcao(*argumentos, mostrar=False)
+
+def tarefas_de_renderizacao(painel, cluster_estados, diretorio_saida, pequenos_multiplos=True):
+    """
+    Lista de (caminho, função, argumentos) das figuras independentes a renderizar.
+    Locais sem cluster (NaN, séries que não puderam ser agrupadas) ficam de fora
+    das figuras, que são todas coloridas ou separadas pelo cluster.
+    """
+    if painel.cluster is not None:
+        agrupados = ~np.isnan(np.asarray(painel.cluster, dtype=float))
+        if not agrupados.all():
+            painel = painel.filtrar_locais(agrupados)
+        # Clusters como inteiros nos nomes dos arquivos e nas legendas (0, e não 0.0)
+        cluster_estados = {int(cluster): estados for cluster, estados in cluster_estados.items()
+                           if cluster == cluster}
+    tarefas = [
+        ("clusters_dispersao.png", gerar_grafico_dispersao, (painel, diretorio_saida)),
+        ("tendencias_temporais.png", gerar_grafico_tendencia, (painel, cluster_estados, diretorio_saida)),
+        ("heatmap_saturacao.png", gerar_heatmap_saturacao, (painel, diretorio_saida)),
+    ]
+    if pequenos_multiplos:
+        tarefas += [(f"tendencias_cluster_{cluster}.png", gerar_grafico_tendencia_cluster,
+                     (painel.do_cluster(cluster), cluster, diretorio_saida)) for cluster in cluster_estados]
+    return [(os.path.join(diretorio_saida, nome_arquivo(painel, nome)), funcao, argumentos)
+            for nome, funcao, argumentos in tarefas]
+
+@instrumentar()
+def renderizar_em_lote(painel, cluster_estados, diretorio_saida, pequenos_multiplos=True, max_workers=None):
+    """
+    Renderiza as figuras sem exibi-las, em paralelo em um pool de processos
+    (backend Agg), incluindo um gráfico de tendência por cluster; os de clusters
+    que não existem mais são apagados. As métricas adicionais agrupadas do
+    painel ganham seus próprios gráficos de dispersão, tendência e heatmap.
+
+    Figuras cujo arquivo já existe e cujos dados de entrada (e código) têm o
+    mesmo hash da última renderização são puladas. Retorna {caminho: True se
+    renderizada, False se pulada}.
+    """
+    caminho_hashes = os.path.join(diretorio_saida, ARQUIVO_HASHES)
+    hashes = {}
+    if os.path.exists(caminho_hashes):
+        with open(caminho_hashes, encoding="utf-8") as f:
+            hashes = json.load(f)
+
+    tarefas = tarefas_de_renderizacao(painel, cluster_estados, diretorio_saida, pequenos_multiplos)
+    for metrica in paineis_das_metricas(painel).values():
+        tarefas += tarefas_de_renderizacao(metrica, metrica.locais_por_cluster(), diretorio_saida,
+                                           pequenos_multiplos=False)
+
+    # Gráficos por cluster de uma execução anterior (ex.: com outro número de clusters)
+    atuais = {caminho for caminho, _, _ in tarefas}
+    for nome in os.listdir(diretorio_saida):
+        caminho = os.path.join(diretorio_saida, nome)
+        if PADRAO_TENDENCIA_CLUSTER.match(nome) and caminho not in atuais:
+            os.remove(caminho)
+            hashes.pop(caminho, None)
+
+    pendentes, resultado = [], {}
+    for caminho, funcao, argumentos in tarefas:
+        # O último argumento é o diretório de saída, que não influencia o conteúdo
+        impressao = hash_dados(funcao, argumentos[:-1])
+        resultado[caminho] = not (os.path.exists(caminho) and hashes.get(caminho) == impressao)
+        if resultado[caminho]:
+            pendentes.append((funcao, argumentos))
+            hashes[caminho] = impressao
+
+    max_workers = min(max_workers or os.cpu_count() or 1, len(pendentes))
+    if max_workers <= 1:
+        for funcao, argumentos in pendentes:
+            _renderizar(funcao, argumentos)
+    else:
+        with ProcessPoolExecutor(max_workers=max_workers) as executor:
+            list(executor.map(_renderizar, *zip(*pendentes)))
+
+    with open(caminho_hashes, "w", encoding="utf-8") as f:
+        json.dump(hashes, f, indent=2)
+    return resultado
+
+@instrumentar()
+def salvar_lista_clusters(cluster_estados, diretorio_saida, nome="clusters_estados.txt"):
     """
     Salva a lista de estados por cluster em um arquivo de texto.
     """
-    caminho_arquivo = os.path.join(diretorio_saida, "clusters_estados.txt")
+    caminho_arquivo = os.path.join(diretorio_saida, nome)
     with open(caminho_arquivo, "w") as f:
         for cluster, estados in cluster_estados.items():
             f.write(f"Cluster {cluster}:\n")
@@ -117,7 +336,7 @@ def main():
     diretorio_saida = criar_diretorio_saida()
 
     # Carregar os dados processados
-    caminho_arquivo = "data/merged_data.csv"
+    caminho_arquivo = caminho_intermediario("merged_data")
     dados = carregar_dados(caminho_arquivo)
     
     if dados is None:
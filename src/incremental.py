@@ -0,0 +1,237 @@
+"""
+Atualização incremental do painel da análise com novos anos.
+
+Quando a SIDRA publica um novo ano, em vez de refazer todas as etapas:
+- baixa da SIDRA apenas os anos novos e obtém a população desses anos do índice
+  acumulado por idade (`data/indice_idades.npz`), sem reler a planilha;
+- grava no painel salvo (`merged_data`) só as células local x ano afetadas,
+  incluindo os anos que ainda só têm projeção de população;
+- estima os anos novos dos locais sem dados com o modelo de previsão já escolhido
+  para cada local no último backtest (`erros_previsao`), sem refazê-lo. Os
+  modelos são ajustados apenas às razões observadas: as estimativas gravadas
+  anteriormente (células com razão, mas sem número de empresas) ficam de fora;
+- reagrupa os locais partindo dos centros salvos pela última clusterização
+  (`data/centroides.npz`), com uma única inicialização do K-Means. A
+  clusterização completa só é refeita quando a fração de locais que mudam de
+  grupo passa de `LIMIAR_DERIVA` (ou quando não há centros compatíveis).
+"""
+import os
+
+import numpy as np
+import pandas as pd
+
+from armazenamento import aplicar_esquema, caminho_intermediario, ler_tabela
+from consulta_sidra import compactar_periodos, decompor_url, montar_url
+from instrumentacao import instrumentar
+from painel import Painel
+
+# Fração máxima de locais que podem mudar de cluster sem uma reclusterização completa
+LIMIAR_DERIVA = 0.1
+
+def url_para_anos(url, anos):
+    """URL da consulta SIDRA restrita ao período dos `anos` indicados."""
+    base, parametros = decompor_url(url)
+    periodo = compactar_periodos(sorted(int(ano) for ano in anos))
+    return montar_url(base, [(chave, periodo if chave == "p" else valor) for chave, valor in parametros])
+
+def preparar_empresas(df_sidra):
+    """Empresas ativas por local e ano a partir da tabela da SIDRA, como na etapa de tratamento."""
+    from analize import preparar_dados_empresas
+    from tratamento import Plano
+
+    plano = (Plano(aplicar_esquema(df_sidra))
+             .filtrar("Variável", "Número de empresas ativas")
+             .renomear("Variável (Código)", "Número de empresas ativas")
+             .remover(["Variável"]))
+    return preparar_dados_empresas(plano.executar())
+
+@instrumentar()
+def baixar_empresas(url, anos):
+    """
+    Baixa da SIDRA apenas os `anos` indicados e retorna as empresas ativas por
+    local e ano (vazio se nenhum deles foi publicado ainda).
+    """
+    from puxar_sidra import ajustar_dataframe, obter_dados_sidra
+
+    dados = obter_dados_sidra(url_para_anos(url, anos))
+    if not dados:
+        print(f"A SIDRA não retornou dados para {list(anos)}; esses anos serão estimados.")
+        return pd.DataFrame({"LOCAL": pd.Series(dtype=object), "Ano": pd.Series(dtype=int),
+                             "Número de empresas ativas": pd.Series(dtype=float)})
+    return preparar_empresas(ajustar_dataframe(dados))
+
+@instrumentar()
+def ler_populacao(excel_path, anos, faixa_etaria=(38, 58)):
+    """
+    População de cada local (linhas) nos `anos` (colunas), somando todas as linhas
+    de sexo como na análise. Vem do índice acumulado por idade (ver
+    indice_idades.py), que só lê a planilha na primeira vez.
+    """
+    from indice_idades import obter_indice, populacao_faixa
+
+    indice = obter_indice(excel_path)
+    colunas = pd.Index(indice["anos"]).get_indexer(anos)
+    if (colunas < 0).any():
+        raise ValueError(f"Anos {list(anos)} ausentes das projeções de população.")
+    valores = populacao_faixa(indice, *faixa_etaria)[:, colunas]
+    return pd.DataFrame(valores, index=pd.Index(indice["locais"], name="LOCAL"), columns=[int(ano) for ano in anos])
+
+def combinar_anos(painel, populacao, empresas, anos):
+    """
+    Painel dos `anos` para os locais do painel com projeção de população: a
+    população de todos os anos pedidos, mesmo os que a SIDRA ainda não publicou,
+    e as empresas onde houver observação. Diferente de `analize.combinar_dados`,
+    não descarta os anos sem empresas.
+    """
+    locais = painel.locais[pd.Index(populacao.index.astype(str)).get_indexer(painel.locais.astype(str)) >= 0]
+    ignorados = sorted(set(empresas["LOCAL"].astype(str)) - set(painel.locais.astype(str)))
+    if ignorados:
+        print(f"Locais ausentes do painel ignorados: {ignorados}")
+    valores_populacao = populacao.set_axis(populacao.index.astype(str)).reindex(
+        index=locais.astype(str), columns=anos).to_numpy(dtype=float)
+
+    valores_empresas = np.full(valores_populacao.shape, np.nan)
+    linhas = pd.Index(locais.astype(str)).get_indexer(empresas["LOCAL"].astype(str))
+    colunas = pd.Index(anos).get_indexer(empresas["Ano"].to_numpy(dtype=int))
+    validos = (linhas >= 0) & (colunas >= 0)
+    valores_empresas[linhas[validos], colunas[validos]] = (
+        empresas["Número de empresas ativas"].to_numpy(dtype=float)[validos])
+    return Painel(locais, anos, valores_populacao, valores_empresas)
+
+def sem_estimativas(painel, anos_mantidos=()):
+    """
+    Retorna (painel, máscara): o painel em que as razões estimadas (células com
+    razão, mas sem número de empresas observado), fora dos `anos_mantidos`, viram
+    NaN, e a máscara dessas células.
+    """
+    estimadas = ~np.isnan(painel.razao) & np.isnan(painel.empresas)
+    estimadas[:, np.isin(painel.anos, anos_mantidos)] = False
+    razao = np.where(estimadas, np.nan, painel.razao)
+    return Painel(painel.locais, painel.anos, painel.populacao, painel.empresas, razao, painel.cluster,
+                  painel.metricas, painel.clusters_metricas), estimadas
+
+@instrumentar()
+def atualizar_celulas(painel, novos):
+    """
+    Retorna (painel, células atualizadas): a grade de anos é ampliada com os anos
+    de `novos` e só as células dos locais já existentes são alteradas. A população
+    é sempre atualizada; empresas e razão, apenas onde há observação nova.
+    """
+    resultado = painel.com_anos(novos.anos)
+    linhas = pd.Index(resultado.locais).get_indexer(novos.locais)
+    colunas = np.array([resultado.indice_ano[ano] for ano in novos.anos], dtype=int)
+    presentes = linhas >= 0
+    if not presentes.all():
+        print(f"Locais ausentes do painel ignorados: {list(novos.locais[~presentes])}")
+
+    populacao, empresas, razao = (resultado.populacao.copy(), resultado.empresas.copy(), resultado.razao.copy())
+    linhas, origem = linhas[presentes], np.flatnonzero(presentes)
+    populacao[np.ix_(linhas, colunas)] = novos.populacao[origem]
+    observados = ~np.isnan(novos.razao[origem])
+    alvo_linhas, alvo_colunas = np.nonzero(observados)
+    empresas[linhas[alvo_linhas], colunas[alvo_colunas]] = novos.empresas[origem][observados]
+    razao[linhas[alvo_linhas], colunas[alvo_colunas]] = novos.razao[origem][observados]
+    atualizado = Painel(resultado.locais, resultado.anos, populacao, empresas, razao, resultado.cluster,
+                        resultado.metricas, resultado.clusters_metricas)
+    return atualizado, int(observados.sum())
+
+@instrumentar()
+def reclusterizar(painel, metodo="kmeans", limiar_deriva=LIMIAR_DERIVA, centros_salvos=None, num_clusters=4):
+    """
+    Reagrupa os locais partindo dos centros salvos e dos clusters atuais do painel.
+
+    Retorna (painel, deriva, completa): `deriva` é a fração de locais que mudaram
+    de cluster no reagrupamento a partir dos centros (None se não foi possível) e
+    `completa` indica se a clusterização completa foi refeita.
+    """
+    from analize import aplicar_clusterizacao, matriz_clusterizacao
+    from clusterizacao import agrupar_a_partir_de, centroides
+
+    anteriores = np.asarray(painel.cluster, dtype=float) if painel.cluster is not None else None
+    motivo = None
+    if metodo == "dtw":
+        motivo = "o método dtw não parte de centros"
+    elif centros_salvos is None or anteriores is None:
+        motivo = "sem centros salvos"
+    elif centros_salvos["metodo"] != metodo:
+        motivo = f"centros salvos com o método {centros_salvos['metodo']}"
+    elif not np.isin(centros_salvos["anos"], painel.anos).all():
+        motivo = "anos dos centros salvos ausentes do painel"
+
+    deriva = None
+    if motivo is None:
+        X, validos = matriz_clusterizacao(painel, metodo)
+        centros = centros_salvos["centroides"]
+        k = len(centros)
+        conhecidos = validos & ~np.isnan(anteriores)
+        rotulos_anteriores = anteriores[conhecidos].astype(int)
+        if metodo == "kmeans":
+            # Anos já agrupados: centros salvos; anos novos: média dos membros de cada cluster
+            iniciais = np.empty((k, len(painel.anos)))
+            colunas_salvas = painel.colunas_anos(centros_salvos["anos"])
+            colunas_novas = np.setdiff1d(np.arange(len(painel.anos)), colunas_salvas)
+            iniciais[:, colunas_salvas] = centros
+            iniciais[:, colunas_novas] = centroides(X[conhecidos][:, colunas_novas], rotulos_anteriores, k)
+        else:
+            # Um ano novo muda a normalização de toda a série: parte da média dos membros atuais
+            iniciais = centroides(X[conhecidos], rotulos_anteriores, k, metodo)
+        rotulos, _ = agrupar_a_partir_de(X[validos], iniciais, metodo)
+
+        deriva = float(np.mean(rotulos[conhecidos[validos]] != rotulos_anteriores)) if conhecidos.any() else 1.0
+        print(f"Reagrupamento a partir dos centros salvos: {deriva:.1%} dos locais mudaram de cluster.")
+        if deriva <= limiar_deriva:
+            clusters = np.full(len(painel), np.nan)
+            clusters[validos] = rotulos
+            painel.cluster = clusters.astype(int) if validos.all() else clusters
+            return painel, deriva, False
+        motivo = f"deriva acima do limiar de {limiar_deriva:.0%}"
+        num_clusters = k
+
+    print(f"Clusterização completa refeita ({motivo}).")
+    return aplicar_clusterizacao(painel, num_clusters=num_clusters, metodo=metodo), deriva, True
+
+@instrumentar()
+def atualizar_painel(anos, url, excel_path, painel=None, empresas=None, populacao=None,
+                     metodo_previsao="automatico", metodo_clusterizacao="kmeans",
+                     limiar_deriva=LIMIAR_DERIVA, salvar=True):
+    """
+    Acrescenta os `anos` ao painel salvo da análise e retorna o painel atualizado.
+
+    `painel`, `empresas` (LOCAL, Ano, Número de empresas ativas) e `populacao`
+    (locais x anos) são lidos ou baixados quando não informados. Com `salvar`, o
+    painel e os novos centros são gravados em `data/`.
+    """
+    from analize import carregar_centroides, interpolar_dados, salvar_centroides, salvar_dados
+
+    anos = sorted(int(ano) for ano in anos)
+    if painel is None:
+        painel = Painel.de_dataframe(ler_tabela(caminho_intermediario("merged_data")))
+    if empresas is None:
+        empresas = baixar_empresas(url, anos)
+    if populacao is None:
+        populacao = ler_populacao(excel_path, anos)
+
+    # Células afetadas pelos anos novos (também os que só têm população)
+    novos = combinar_anos(painel, populacao, empresas[empresas["Ano"].isin(anos)], anos)
+    painel, celulas = atualizar_celulas(painel, novos)
+    print(f"{celulas} células local x ano atualizadas com dados de {anos}.")
+
+    # Anos novos sem dados: previsão com os modelos escolhidos no último backtest, ajustados
+    # só às razões observadas; as estimativas anteriores são mantidas como estavam
+    caminho_erros = caminho_intermediario("erros_previsao")
+    modelos = ler_tabela(caminho_erros) if os.path.exists(caminho_erros) else None
+    observado, estimadas = sem_estimativas(painel, anos)
+    faltantes = int(np.isnan(observado.razao[:, observado.colunas_anos(anos)]).sum())
+    estimado = interpolar_dados(observado, anos_alvo=anos, metodo=metodo_previsao, modelos_por_local=modelos)
+    razao = np.where(estimadas, painel.razao, estimado.razao)
+    painel = Painel(estimado.locais, estimado.anos, estimado.populacao, estimado.empresas, razao, estimado.cluster,
+                    estimado.metricas, estimado.clusters_metricas)
+    print(f"{faltantes} células sem dados estimadas pelo método '{metodo_previsao}'.")
+
+    # Clusters a partir dos centros salvos
+    painel, _, _ = reclusterizar(painel, metodo_clusterizacao, limiar_deriva, carregar_centroides())
+
+    if salvar:
+        salvar_dados(painel)
+        salvar_centroides(painel, metodo_clusterizacao)
+    return painel
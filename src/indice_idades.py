@@ -0,0 +1,188 @@
+"""
+Índice de população acumulada por idade e varredura de cenários de faixa etária.
+
+O índice guarda, para cada local, sexo e ano, a soma acumulada da população
+por idade (0, 0-1, 0-2, ..., 0-90+). A população de qualquer faixa etária
+[a, b] é então `acumulado[..., b + 1] - acumulado[..., a]`: uma subtração por
+célula, sem reler a planilha nem refiltrar a tabela. O índice é construído uma
+vez a partir da planilha de projeções e gravado em `data/indice_idades.npz`.
+
+A varredura calcula, para centenas de faixas etárias e pares de percentis, quais
+locais ficam saturados (razão População/Empresas acima do percentil alto) ou
+com oportunidades (abaixo do percentil baixo), como em
+`analize.identificar_oportunidades_e_saturacao`, e conta em quantos cenários
+cada local aparece em cada grupo. Os blocos de faixas são avaliados em paralelo
+por um pool de processos.
+"""
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from instrumentacao import instrumentar
+
+CAMINHO_INDICE = os.path.join("data", "indice_idades.npz")
+
+# Anos da planilha de projeções guardados no índice
+ANOS_INDICE = (2000, 2070)
+
+# Faixas avaliadas por padrão: início de 18 a 70 anos e largura mínima de 10 anos, de 2 em 2
+FAIXAS_PADRAO = [(inicio, fim) for inicio in range(18, 71, 2) for fim in range(inicio + 10, 91, 2)]
+PERCENTIS_PADRAO = [(p, 100 - p) for p in (10, 15, 20, 25, 30)]
+
+# Faixas avaliadas por tarefa do pool de processos
+FAIXAS_POR_BLOCO = 32
+
+@instrumentar()
+def construir_indice(df, anos=None):
+    """
+    Constrói o índice a partir da tabela de projeções (colunas IDADE, SEXO,
+    LOCAL e uma coluna por ano, todas as idades). Retorna um dicionário com
+    `locais`, `sexos`, `anos` e `acumulado` (locais x sexos x anos x idades+1).
+    """
+    anos = anos or [coluna for coluna in df.columns if str(coluna).isdigit()]
+    idades = pd.to_numeric(df["IDADE"]).to_numpy(dtype=int)
+    codigos_local, locais = pd.factorize(df["LOCAL"].astype(str), sort=True)
+    codigos_sexo, sexos = pd.factorize(df["SEXO"].astype(str), sort=True)
+
+    populacao = np.zeros((len(locais), len(sexos), len(anos), idades.max() + 1))
+    valores = df[anos].to_numpy(dtype=float)
+    # Linhas repetidas (mesmo local, sexo e idade) são somadas, como no restante da análise
+    np.add.at(populacao, (codigos_local, codigos_sexo, slice(None), idades), np.nan_to_num(valores))
+
+    acumulado = np.zeros(populacao.shape[:3] + (populacao.shape[3] + 1,))
+    np.cumsum(populacao, axis=3, out=acumulado[..., 1:])
+    return {
+        "locais": np.asarray(locais, dtype=object),
+        "sexos": np.asarray(sexos, dtype=object),
+        "anos": np.asarray([int(ano) for ano in anos]),
+        "acumulado": acumulado,
+    }
+
+def salvar_indice(indice, caminho=CAMINHO_INDICE):
+    """Grava o índice em um arquivo .npz (sem compressão, para leitura rápida)."""
+    os.makedirs(os.path.dirname(caminho) or ".", exist_ok=True)
+    np.savez(caminho, locais=indice["locais"].astype(str), sexos=indice["sexos"].astype(str),
+             anos=indice["anos"], acumulado=indice["acumulado"])
+    return caminho
+
+def carregar_indice(caminho=CAMINHO_INDICE):
+    """Lê o índice gravado por `salvar_indice`."""
+    with np.load(caminho) as arquivo:
+        return {
+            "locais": arquivo["locais"].astype(object),
+            "sexos": arquivo["sexos"].astype(object),
+            "anos": arquivo["anos"],
+            "acumulado": arquivo["acumulado"],
+        }
+
+def obter_indice(excel_path, caminho=CAMINHO_INDICE, anos=ANOS_INDICE):
+    """
+    Retorna o índice gravado em `caminho`, reconstruindo-o a partir da planilha
+    apenas se ele não existir, for mais antigo que a planilha ou não tiver todos
+    os `anos`.
+    """
+    if os.path.exists(caminho) and os.path.getmtime(caminho) >= os.path.getmtime(excel_path):
+        indice = carregar_indice(caminho)
+        if np.isin(np.arange(anos[0], anos[1] + 1), indice["anos"]).all():
+            return indice
+
+    from populacao_dados import ler_projecoes_filtradas
+
+    print("Construindo o índice de população por idade...")
+    df = ler_projecoes_filtradas(excel_path, faixa_etaria=(0, 200), anos=anos)
+    indice = construir_indice(df, [str(ano) for ano in range(anos[0], anos[1] + 1)])
+    salvar_indice(indice, caminho)
+    return indice
+
+def populacao_faixa(indice, idade_min, idade_max, sexos=None):
+    """
+    População de cada local e ano (matriz locais x anos) na faixa [idade_min,
+    idade_max], somando os `sexos` indicados (todos, por padrão).
+    """
+    acumulado = indice["acumulado"]
+    if sexos is not None:
+        acumulado = acumulado[:, np.isin(indice["sexos"], sexos)]
+    fim = min(idade_max + 1, acumulado.shape[3] - 1)
+    return (acumulado[..., fim] - acumulado[..., idade_min]).sum(axis=1)
+
+def _avaliar_bloco(acumulado, empresas, colunas_alvo, faixas, percentis):
+    """
+    Para um bloco de faixas, retorna duas matrizes (locais x cenários) indicando
+    se cada local está saturado / com oportunidades em cada par (faixa, percentis).
+    """
+    inicios = np.array([inicio for inicio, _ in faixas])
+    fins = np.minimum(np.array([fim for _, fim in faixas]) + 1, acumulado.shape[2] - 1)
+    # locais x anos-alvo x faixas, em uma única operação
+    populacao = acumulado[:, colunas_alvo][..., fins] - acumulado[:, colunas_alvo][..., inicios]
+    with np.errstate(divide="ignore", invalid="ignore"):
+        razao = populacao / empresas[:, :, None]
+        media = np.nanmean(razao, axis=1)
+
+    baixos = np.array([baixo for baixo, _ in percentis])
+    altos = np.array([alto for _, alto in percentis])
+    limites_baixos = np.nanpercentile(media, baixos, axis=0)  # percentis x faixas
+    limites_altos = np.nanpercentile(media, altos, axis=0)
+    saturado = media[:, :, None] > limites_altos.T[None, :, :]
+    oportunidade = media[:, :, None] < limites_baixos.T[None, :, :]
+    n_locais = media.shape[0]
+    return saturado.reshape(n_locais, -1), oportunidade.reshape(n_locais, -1)
+
+@instrumentar()
+def varrer_cenarios(indice, painel, faixas=FAIXAS_PADRAO, percentis=PERCENTIS_PADRAO, anos_alvo=(2021, 2022),
+                    faixa_base=(38, 58), max_workers=None, limiar=0.9):
+    """
+    Avalia todos os cenários (faixa etária x par de percentis) sobre os locais
+    comuns ao índice e ao painel, usando o número de empresas do painel nos
+    `anos_alvo`. Onde o número de empresas não foi observado, ele é deduzido da
+    razão estimada pela análise e da população da `faixa_base` (a faixa usada no
+    painel).
+
+    Retorna um DataFrame por local com a fração de cenários em que ele aparece
+    como saturado e como oportunidade, e a classificação "Sempre saturado" /
+    "Sempre oportunidade" (em pelo menos `limiar` dos cenários), "Saturado em
+    alguns cenários", "Oportunidade em alguns cenários" ou "Neutro".
+    """
+    locais = np.intersect1d(indice["locais"].astype(str), painel.locais.astype(str))
+    linhas_indice = pd.Index(indice["locais"].astype(str)).get_indexer(locais)
+    linhas_painel = pd.Index(painel.locais.astype(str)).get_indexer(locais)
+    colunas_indice = pd.Index(indice["anos"]).get_indexer(list(anos_alvo))
+    colunas_painel = pd.Index(painel.anos).get_indexer(list(anos_alvo))
+    if (colunas_indice < 0).any():
+        raise ValueError(f"Anos {list(anos_alvo)} ausentes do índice de idades.")
+
+    # A varredura soma todos os sexos, como a população usada na análise
+    acumulado = indice["acumulado"][linhas_indice].sum(axis=1)
+    empresas = np.full((len(locais), len(anos_alvo)), np.nan)
+    razao = np.full((len(locais), len(anos_alvo)), np.nan)
+    presentes = colunas_painel >= 0
+    empresas[:, presentes] = painel.empresas[linhas_painel][:, colunas_painel[presentes]]
+    razao[:, presentes] = painel.razao[linhas_painel][:, colunas_painel[presentes]]
+    fim_base = min(faixa_base[1] + 1, acumulado.shape[2] - 1)
+    populacao_base = acumulado[:, colunas_indice, fim_base] - acumulado[:, colunas_indice, faixa_base[0]]
+    with np.errstate(divide="ignore", invalid="ignore"):
+        empresas = np.where(np.isnan(empresas), populacao_base / razao, empresas)
+
+    blocos = [faixas[i:i + FAIXAS_POR_BLOCO] for i in range(0, len(faixas), FAIXAS_POR_BLOCO)]
+    argumentos = [(acumulado, empresas, colunas_indice, bloco, percentis) for bloco in blocos]
+    max_workers = min(max_workers or os.cpu_count() or 1, len(blocos))
+    if max_workers <= 1:
+        resultados = [_avaliar_bloco(*args) for args in argumentos]
+    else:
+        with ProcessPoolExecutor(max_workers=max_workers) as executor:
+            resultados = list(executor.map(_avaliar_bloco, *zip(*argumentos)))
+
+    saturado = np.concatenate([resultado[0] for resultado in resultados], axis=1).mean(axis=1)
+    oportunidade = np.concatenate([resultado[1] for resultado in resultados], axis=1).mean(axis=1)
+    classificacao = np.select(
+        [saturado >= limiar, oportunidade >= limiar, saturado > 0, oportunidade > 0],
+        ["Sempre saturado", "Sempre oportunidade", "Saturado em alguns cenários", "Oportunidade em alguns cenários"],
+        default="Neutro")
+    return pd.DataFrame({
+        "LOCAL": locais,
+        "Cenários saturado (%)": np.round(100 * saturado, 1),
+        "Cenários oportunidade (%)": np.round(100 * oportunidade, 1),
+        "Classificação": classificacao,
+    }).sort_values(["Cenários saturado (%)", "Cenários oportunidade (%)"], ascending=[False, True],
+                   ignore_index=True)
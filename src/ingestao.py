@@ -0,0 +1,80 @@
+"""
+Ingestão simultânea das fontes de dados (SIDRA e projeções do IBGE).
+
+As duas fontes são independentes: cada uma é baixada e processada (leitura,
+filtro e gravação do arquivo intermediário) em sua própria thread, de modo que o
+processamento de uma começa assim que o seu download termina, enquanto a outra
+ainda está sendo baixada. O tempo total fica próximo ao da fonte mais lenta.
+
+Os erros são isolados por fonte: a falha de uma não interrompe a outra, que é
+processada e gravada normalmente; só depois que todas terminam a falha é
+relatada, com `ErroIngestao`.
+"""
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from instrumentacao import contexto, instrumentar, no_contexto
+
+class ErroIngestao(RuntimeError):
+    """Uma ou mais fontes falharam; `erros` mapeia o nome da fonte para a exceção."""
+
+    def __init__(self, erros):
+        self.erros = erros
+        super().__init__("Falha na ingestão de: " + ", ".join(
+            f"{fonte} ({type(erro).__name__}: {erro})" for fonte, erro in erros.items()))
+
+def ingerir(fontes, max_workers=None):
+    """
+    Executa as tarefas de `fontes` (nome -> função sem argumentos) em paralelo.
+
+    Retorna um dicionário nome -> {"dados", "erro", "segundos"} com o resultado
+    de cada fonte, na ordem de `fontes`; exceções não são propagadas.
+    """
+    chamadas = contexto()
+
+    def executar(funcao):
+        inicio = time.perf_counter()
+        try:
+            return {"dados": no_contexto(chamadas, funcao)(), "erro": None,
+                    "segundos": time.perf_counter() - inicio}
+        except Exception as erro:
+            return {"dados": None, "erro": erro, "segundos": time.perf_counter() - inicio}
+
+    resultados = {}
+    with ThreadPoolExecutor(max_workers=max_workers or len(fontes)) as executor:
+        futuros = {executor.submit(executar, funcao): nome for nome, funcao in fontes.items()}
+        for futuro in as_completed(futuros):
+            nome = futuros[futuro]
+            resultados[nome] = resultado = futuro.result()
+            situacao = "concluída" if resultado["erro"] is None else f"falhou ({resultado['erro']})"
+            print(f"Fonte '{nome}' {situacao} em {resultado['segundos']:.1f} s.")
+    return {nome: resultados[nome] for nome in fontes}
+
+@instrumentar()
+def ingerir_fontes(sidra_url, ibge_url, excel_path, output_dir="data", caminho_populacao=None, salvar=True):
+    """
+    Baixa e processa a SIDRA e as projeções do IBGE ao mesmo tempo.
+
+    Retorna (dados da SIDRA, população filtrada), como `baixar_e_processar_dados`.
+    Se alguma fonte falhar, as demais são concluídas (e gravadas) antes de
+    `ErroIngestao` ser levantado.
+    """
+    from puxar_sidra import processar_dados_sidra
+    from populacao_dados import baixar_arquivo_ibge, processar_projecoes
+
+    def sidra():
+        dados = processar_dados_sidra(sidra_url, output_dir, salvar=salvar)
+        # processar_dados_sidra só imprime os erros de requisição e retorna None
+        if dados is None or dados.empty:
+            raise ValueError(f"A SIDRA não retornou dados válidos para {sidra_url}.")
+        return dados
+
+    def populacao():
+        baixar_arquivo_ibge(ibge_url, excel_path)
+        return processar_projecoes(excel_path, caminho_populacao if salvar else None)
+
+    resultados = ingerir({"sidra": sidra, "ibge": populacao})
+    erros = {nome: resultado["erro"] for nome, resultado in resultados.items() if resultado["erro"] is not None}
+    if erros:
+        raise ErroIngestao(erros) from next(iter(erros.values()))
+    return resultados["sidra"]["dados"], resultados["ibge"]["dados"]
@@ -0,0 +1,202 @@
+"""
+Instrumentação das etapas do pipeline e das funções que elas chamam.
+
+Enquanto a instrumentação estiver ligada (`definir_instrumentacao`), funções
+decoradas com `@instrumentar` registram, a cada chamada, o tempo de relógio, o
+tempo de CPU e o número de linhas de entrada e de saída (DataFrames, painéis e
+listas de registros). As chamadas aninhadas ficam ligadas à chamada que as
+originou, e o conjunto é gravado como um relatório JSON da execução; gravar o
+relatório descarta as medições.
+
+A memória (tracemalloc) só é medida quando pedida explicitamente, porque deixa
+a execução bem mais lenta. O tracemalloc é global ao processo e o pico dele
+nunca é zerado: cada chamada da thread principal registra a variação da
+memória alocada (`memoria_mb`) e o pico do processo até o fim dela
+(`pico_mb`). O que as outras threads (como as fontes da ingestão) alocam entra
+nas medições da chamada da thread principal que as originou.
+
+Com `definir_perfil(nome)`, a chamada instrumentada com esse nome (por exemplo,
+a etapa "analisar") também roda sob o cProfile; as estatísticas são gravadas
+em `resultados/perfil_<nome>.prof` e as funções mais custosas são exibidas.
+"""
+import functools
+import json
+import os
+import platform
+import sys
+import threading
+import time
+import tracemalloc
+from datetime import datetime, timezone
+
+CAMINHO_RELATORIO = os.path.join("resultados", "relatorio_execucao.json")
+
+_ativo = False
+_memoria = False
+_perfil = None
+_registros = []
+_pilha = threading.local()
+_inicio_execucao = datetime.now(timezone.utc)
+
+def definir_instrumentacao(ativo=True, memoria=False):
+    """Liga ou desliga a instrumentação e, separadamente, a medição de memória (tracemalloc)."""
+    global _ativo, _memoria
+    _ativo, _memoria = ativo, ativo and memoria
+    if _memoria and not tracemalloc.is_tracing():
+        tracemalloc.start()
+    elif not _memoria and tracemalloc.is_tracing():
+        tracemalloc.stop()
+
+def definir_perfil(nome):
+    """Define a chamada instrumentada (pelo nome) que será executada sob o cProfile."""
+    global _perfil
+    _perfil = nome
+
+def limpar_registros():
+    """Descarta as medições acumuladas."""
+    _registros.clear()
+
+def contar_linhas(objeto):
+    """Número de linhas de uma tabela (DataFrame, Painel, lista de registros ou tupla delas); None se não for tabela."""
+    if isinstance(objeto, tuple):
+        contagens = [contar_linhas(item) for item in objeto]
+        contagens = [contagem for contagem in contagens if contagem is not None]
+        return sum(contagens) if contagens else None
+    if hasattr(objeto, "razao") and hasattr(objeto, "locais"):
+        # Painel: células com razão definida, como no formato longo
+        return int((objeto.razao == objeto.razao).sum())
+    if hasattr(objeto, "shape") and hasattr(objeto, "columns"):
+        return int(objeto.shape[0])
+    if isinstance(objeto, list) and objeto and isinstance(objeto[0], dict):
+        return len(objeto)
+    return None
+
+def contexto():
+    """Chamadas instrumentadas em andamento na thread atual (para `no_contexto`)."""
+    return list(getattr(_pilha, "chamadas", None) or [])
+
+def no_contexto(chamadas, funcao):
+    """
+    Envolve `funcao` para que, executada em outra thread, suas medições fiquem
+    aninhadas sob as `chamadas` obtidas com `contexto()` na thread de origem.
+    """
+    @functools.wraps(funcao)
+    def executar(*args, **kwargs):
+        anterior = getattr(_pilha, "chamadas", None)
+        _pilha.chamadas = list(chamadas)
+        try:
+            return funcao(*args, **kwargs)
+        finally:
+            _pilha.chamadas = anterior
+    return executar
+
+def _executar_com_perfil(nome, funcao, args, kwargs):
+    import cProfile
+    import pstats
+
+    perfil = cProfile.Profile()
+    try:
+        return perfil.runcall(funcao, *args, **kwargs)
+    finally:
+        os.makedirs("resultados", exist_ok=True)
+        caminho = os.path.join("resultados", f"perfil_{nome}.prof")
+        perfil.dump_stats(caminho)
+        print(f"\nPerfil de '{nome}' salvo em {caminho}. Funções com maior tempo acumulado:")
+        pstats.Stats(perfil).sort_stats("cumulative").print_stats(20)
+
+def instrumentar(nome=None):
+    """
+    Decorador que mede cada chamada da função. `nome` identifica a medição no
+    relatório (padrão: `modulo.funcao`).
+    """
+    def decorador(funcao):
+        rotulo = nome or f"{funcao.__module__}.{funcao.__name__}"
+
+        @functools.wraps(funcao)
+        def medida(*args, **kwargs):
+            if not _ativo:
+                return funcao(*args, **kwargs)
+
+            pilha = getattr(_pilha, "chamadas", None)
+            if pilha is None:
+                pilha = _pilha.chamadas = []
+            medindo_memoria = _memoria and threading.current_thread() is threading.main_thread()
+            if medindo_memoria:
+                atual = tracemalloc.get_traced_memory()[0]
+
+            registro = {
+                "nome": rotulo,
+                "pai": pilha[-1] if pilha else None,
+                "nivel": len(pilha),
+                "inicio": time.time(),
+                "linhas_entrada": contar_linhas(tuple(args) + tuple(kwargs.values())),
+            }
+            _registros.append(registro)
+            pilha.append(len(_registros) - 1)
+
+            relogio, cpu = time.perf_counter(), time.process_time()
+            erro = None
+            try:
+                if _perfil == rotulo:
+                    resultado = _executar_com_perfil(rotulo, funcao, args, kwargs)
+                else:
+                    resultado = funcao(*args, **kwargs)
+                return resultado
+            except BaseException as excecao:
+                erro = f"{type(excecao).__name__}: {excecao}"
+                resultado = None
+                raise
+            finally:
+                registro["segundos"] = round(time.perf_counter() - relogio, 6)
+                registro["segundos_cpu"] = round(time.process_time() - cpu, 6)
+                pilha.pop()
+                if medindo_memoria and tracemalloc.is_tracing():
+                    depois, pico = tracemalloc.get_traced_memory()
+                    registro["memoria_mb"] = round((depois - atual) / 1024 ** 2, 3)
+                    registro["pico_mb"] = round(pico / 1024 ** 2, 3)
+                registro["linhas_saida"] = contar_linhas(resultado)
+                if erro:
+                    registro["erro"] = erro
+        return medida
+    return decorador
+
+def relatorio():
+    """Relatório da execução: ambiente, comando e as medições na ordem em que começaram."""
+    return {
+        "inicio": _inicio_execucao.isoformat(timespec="seconds"),
+        "fim": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "comando": sys.argv,
+        "python": platform.python_version(),
+        "plataforma": platform.platform(),
+        "medicoes": [dict(registro, inicio=datetime.fromtimestamp(registro["inicio"], timezone.utc)
+                          .isoformat(timespec="milliseconds")) for registro in _registros],
+    }
+
+def salvar_relatorio(caminho=CAMINHO_RELATORIO):
+    """Grava o relatório da execução em JSON, descarta as medições e retorna o caminho."""
+    os.makedirs(os.path.dirname(caminho) or ".", exist_ok=True)
+    with open(caminho, "w", encoding="utf-8") as f:
+        json.dump(relatorio(), f, ensure_ascii=False, indent=2)
+    limpar_registros()
+    return caminho
+
+def exibir_resumo(nivel_maximo=1):
+    """Exibe uma tabela com as medições até o nível de aninhamento indicado."""
+    # Em árvore: cada chamada seguida das que ela originou (mesmo se feitas em outras threads)
+    filhos = {}
+    for indice, registro in enumerate(_registros):
+        filhos.setdefault(registro["pai"], []).append(indice)
+    medicoes, pendentes = [], list(reversed(filhos.get(None, [])))
+    while pendentes:
+        indice = pendentes.pop()
+        if _registros[indice]["nivel"] <= nivel_maximo:
+            medicoes.append(_registros[indice])
+            pendentes.extend(reversed(filhos.get(indice, [])))
+    if not medicoes:
+        return
+    print(f"\n{'Etapa / função':<52}{'tempo (s)':>10}{'CPU (s)':>9}{'memória (MB)':>14}{'linhas':>17}")
+    for registro in medicoes:
+        linhas = f"{registro['linhas_entrada'] or '-'} -> {registro['linhas_saida'] or '-'}"
+        memoria = registro.get("memoria_mb")
+        print(f"{'  ' * registro['nivel'] + registro['nome']:<52}{registro['segundos']:>10.3f}"
+              f"{registro['segundos_cpu']:>9.3f}{'-' if memoria is None else f'{memoria:+.1f}':>14}{linhas:>17}")
@@ -1,83 +1,174 @@
-from puxar_sidra import processar_dados_sidra
-from populacao_dados import baixar_arquivo_ibge, salvar_csv, filtrar_csv
-from tratamento import (
-    load_csv_files, get_unique_values, print_unique_values, filter_dataframe, 
-    save_dataframe, rename_column, drop_columns
-)
-from analize import (
-    carregar_dados_populacao, carregar_dados_empresas, combinar_dados, 
-    interpolar_dados, aplicar_clusterizacao, identificar_oportunidades_e_saturacao, salvar_dados
-)
-from graficos import (
-    criar_diretorio_saida, carregar_dados, obter_estados_por_cluster, 
-    gerar_grafico_dispersao, gerar_grafico_tendencia, gerar_heatmap_saturacao, salvar_lista_clusters
-)
+import argparse
 import os
-import pandas as pd
-
-def baixar_e_processar_dados():
-    """Baixa e processa os dados da SIDRA e do IBGE."""
-    output_dir = 'data'
-    sidra_url = "https://apisidra.ibge.gov.br/values/t/1757/p/2007-2022/n1/1/n3/all/v/allxp"
-    
-    # Puxar dados da SIDRA
-    processar_dados_sidra(sidra_url, output_dir)
-
-    # Baixar projeção populacional do IBGE
-    ibge_url = "https://ftp.ibge.gov.br/Projecao_da_Populacao/Projecao_da_Populacao_2024/projecoes_2024_tab1_idade_simples.xlsx"
-    excel_file_path = "data/projecoes_2024_tab1_idade_simples.xlsx"
-    csv_input_path = "data/populacao.csv"
-    csv_output_path = "data/populacao_filtrada.csv"
-
-    baixar_arquivo_ibge(ibge_url, excel_file_path)
-    salvar_csv(excel_file_path, csv_input_path)
-    filtrar_csv(csv_input_path, csv_output_path)
-
-def tratar_dados():
-    """Carrega, trata e salva os dados da população e empresas ativas."""
-    file_paths = ["data/dados_2007_2020.csv", "data/dados_2021_2022.csv"]
-    
-    # Carregar e combinar arquivos CSV
-    df_combined = load_csv_files(file_paths)
-
-    # Exibir valores únicos por coluna
-    unique_values = get_unique_values(df_combined)
-    print_unique_values(unique_values)
-
-    # Filtrar dados de empresas ativas
-    df_filtered = filter_dataframe(df_combined, "Variável", "Número de empresas ativas")
-    save_dataframe(df_filtered, "data/dados_filtrados_numero_empresas_ativas.csv")
-
-    # Renomear colunas e remover desnecessárias
-    df_filtered = rename_column(df_filtered, "Variável (Código)", "Número de empresas ativas")
-    df_filtered = drop_columns(df_filtered, ["Variável"])
-    save_dataframe(df_filtered, "data/dados_filtrados_numero_empresas_ativas.csv")
-
-    # Carregar dados populacionais e exibir valores únicos
-    df_populacao = pd.read_csv("data/populacao_filtrada.csv")
-    unique_values_populacao = get_unique_values(df_populacao)
-    print_unique_values(unique_values_populacao)
+
+from instrumentacao import instrumentar
+
+# Os módulos de cada etapa (e suas dependências pesadas, como pandas, scikit-learn,
+# scipy e matplotlib) só são importados quando a etapa é executada.
+
+SIDRA_URL = "https://apisidra.ibge.gov.br/values/t/1757/p/2007-2022/n1/1/n3/all/v/allxp"
+IBGE_URL = "https://ftp.ibge.gov.br/Projecao_da_Populacao/Projecao_da_Populacao_2024/projecoes_2024_tab1_idade_simples.xlsx"
+EXCEL_PROJECOES = os.path.join("data", "projecoes_2024_tab1_idade_simples.xlsx")
+
+# Intervalo mínimo (em segundos) entre duas revalidações das fontes no servidor
+# para decidir se a etapa de download precisa ser refeita (ver versao_das_fontes)
+REVALIDAR_FONTES_APOS = 3600
+
+# Método de clusterização da etapa de análise ("kmeans", "minibatch" ou "dtw")
+METODO_CLUSTERIZACAO = os.environ.get("IMOBI_CLUSTERIZACAO", "kmeans")
+
+# Método de estimativa de 2021 e 2022: "automatico" escolhe, por local, o modelo
+# de previsão com menor erro no backtest (ver previsao.py)
+METODO_PREVISAO = os.environ.get("IMOBI_PREVISAO", "automatico")
+
+# Lista todos os valores únicos de cada coluna na etapa de tratamento (além do perfil resumido)
+LISTAR_VALORES_UNICOS = False
+
+# Exibe os gráficos em janelas, um a um, em vez de renderizá-los em lote
+GRAFICOS_INTERATIVOS = False
+
+@instrumentar("baixar")
+def baixar_e_processar_dados(salvar=True):
+    """
+    Baixa e processa os dados da SIDRA e do IBGE.
+
+    Retorna (dados da SIDRA, população filtrada). Com `salvar=False`, os dados não
+    são gravados em `data/` e seguem apenas em memória para a próxima etapa.
+    """
+    from armazenamento import aplicar_esquema, caminho_intermediario
+    from ingestao import ingerir_fontes
+
+    # Puxar dados da SIDRA e baixar a projeção populacional do IBGE ao mesmo tempo
+    # (cada fonte é processada assim que o seu download termina; ver ingestao.py)
+    df_sidra, df_populacao = ingerir_fontes(SIDRA_URL, IBGE_URL, EXCEL_PROJECOES, output_dir="data",
+                                            caminho_populacao=caminho_intermediario("populacao_filtrada"),
+                                            salvar=salvar)
+
+    # Mesmos tipos que as etapas seguintes obteriam ao ler os arquivos intermediários
+    if df_sidra is not None:
+        df_sidra = aplicar_esquema(df_sidra)
+    return df_sidra, aplicar_esquema(df_populacao)
+
+def versao_das_fontes(verificar=True):
+    """
+    SHA-256 do conteúdo atual de cada URL da SIDRA (partições) e do IBGE. As
+    URLs são revalidadas com requisições condicionais (ETag/Last-Modified) no
+    máximo a cada REVALIDAR_FONTES_APOS segundos, de modo que a etapa de
+    download é refeita quando uma fonte muda, mesmo sem --forcar. Com
+    `verificar=False` (dry-run), vale a versão em cache, sem acessar a rede.
+    """
+    from cache_http import versoes_remotas
+    from consulta_sidra import planejar_consulta
+
+    return versoes_remotas(planejar_consulta(SIDRA_URL) + [IBGE_URL], max_idade=REVALIDAR_FONTES_APOS,
+                           verificar=verificar)
+
+@instrumentar("tratar")
+def tratar_dados(df_combined=None, df_populacao=None, salvar=True):
+    """
+    Carrega, trata e salva os dados da população e empresas ativas.
+
+    Os DataFrames não informados são lidos dos arquivos intermediários. Retorna
+    (empresas ativas, população); com `salvar=False`, nada é gravado em disco.
+    """
+    from armazenamento import caminho_intermediario, ler_tabela
+    from tratamento import (
+        Plano, load_csv_files, profile_dataframe, print_profile, get_unique_values, print_unique_values,
+        filter_dataframe, save_dataframe, rename_column, drop_columns
+    )
+
+    # Plano preguiçoso sobre os arquivos intermediários (ou sobre os dados recebidos):
+    # nada é lido até que cada resultado seja materializado
+    if df_combined is None:
+        file_paths = [caminho_intermediario("dados_2007_2020"), caminho_intermediario("dados_2021_2022")]
+        combined = load_csv_files(file_paths, lazy=True)
+    else:
+        combined = Plano(df_combined)
+
+    # Exibir o perfil das colunas (e os valores únicos, se pedido)
+    print_profile(profile_dataframe(combined))
+    if LISTAR_VALORES_UNICOS:
+        print_unique_values(get_unique_values(combined.executar()))
+
+    # Filtrar dados de empresas ativas, renomear colunas e remover desnecessárias;
+    # o filtro e a seleção de colunas são aplicados na leitura
+    filtered = filter_dataframe(combined, "Variável", "Número de empresas ativas")
+    filtered = rename_column(filtered, "Variável (Código)", "Número de empresas ativas")
+    df_filtered = drop_columns(filtered, ["Variável"]).executar()
+    if salvar:
+        save_dataframe(df_filtered, caminho_intermediario("dados_filtrados_numero_empresas_ativas"))
+
+    # Carregar dados populacionais e exibir o perfil das colunas
+    if df_populacao is None:
+        df_populacao = ler_tabela(caminho_intermediario("populacao_filtrada"))
+    print_profile(profile_dataframe(df_populacao))
+    if LISTAR_VALORES_UNICOS:
+        print_unique_values(get_unique_values(df_populacao))
 
     # Remover coluna "SIGLA" se existir
-    if "SIGLA" in df_combined.columns:
-        df_combined = drop_columns(df_combined, ["SIGLA"])
+    if "SIGLA" in combined.colunas():
+        combined = drop_columns(combined, ["SIGLA"])
+    df_combined = combined.executar()
 
     # Salvar dados tratados
-    save_dataframe(df_combined, "data/dados_agrupados.csv")
+    if salvar:
+        save_dataframe(df_combined, caminho_intermediario("dados_agrupados"))
     print(df_combined.dtypes)
+    return df_filtered, df_populacao
+
+@instrumentar("analisar")
+def analisar_dados(df_populacao=None, df_empresas=None, salvar=True, df_variaveis=None, retornar_erros=False):
+    """
+    Realiza a análise dos dados e aplica clusterização.
+
+    Além da razão População/Empresas, calcula as razões de `RAZOES_PADRAO` (ver razoes.py)
+    a partir de `df_variaveis` (tabela da SIDRA com todas as variáveis) e agrupa
+    os locais segundo cada uma. Os DataFrames não informados são lidos dos
+    arquivos intermediários. Retorna o painel clusterizado (ver painel.py) ou,
+    com `retornar_erros`, (painel, erros do backtest), em que os erros são None
+    se METODO_PREVISAO não for "automatico". Com `salvar=False`, o resultado não
+    é gravado em disco.
+    """
+    from armazenamento import caminho_intermediario
+    from analize import (
+        carregar_dados_populacao, carregar_dados_empresas, preparar_dados_populacao, preparar_dados_empresas,
+        combinar_dados, avaliar_previsoes, interpolar_dados, aplicar_clusterizacao,
+        identificar_oportunidades_e_saturacao, salvar_dados, salvar_centroides, clusterizar_metricas
+    )
+    from razoes import RAZOES_PADRAO, calcular_razoes, carregar_variaveis
+    from cubo_geografico import CuboGeografico
 
-def analisar_dados():
-    """Realiza a análise dos dados e aplica clusterização."""
     # Carregar dados
-    dados_populacao = carregar_dados_populacao("data/populacao_filtrada.csv")
-    dados_empresas = carregar_dados_empresas("data/dados_filtrados_numero_empresas_ativas.csv")
+    if df_populacao is None:
+        dados_populacao = carregar_dados_populacao(caminho_intermediario("populacao_filtrada"))
+    else:
+        dados_populacao = preparar_dados_populacao(df_populacao)
+    if df_empresas is None:
+        dados_empresas = carregar_dados_empresas(caminho_intermediario("dados_filtrados_numero_empresas_ativas"))
+    else:
+        dados_empresas = preparar_dados_empresas(df_empresas)
 
     # Combinar e processar dados
     dados_combinados = combinar_dados(dados_populacao, dados_empresas)
-    dados_interpolados = interpolar_dados(dados_combinados)
+    # O backtest só é usado pelo método automático (escolha do modelo de cada local)
+    erros_previsao = avaliar_previsoes(dados_combinados) if METODO_PREVISAO == "automatico" else None
+    dados_interpolados = interpolar_dados(dados_combinados, metodo=METODO_PREVISAO, modelos_por_local=erros_previsao)
+
+    # Exibir a acurácia dos modelos de previsão (erro absoluto médio no backtest)
+    if erros_previsao is not None:
+        print("\nErro médio dos modelos de previsão no backtest:")
+        print(erros_previsao.drop(columns=["LOCAL", "Modelo"]).mean().round(4).to_string())
+        print("Modelos escolhidos:", erros_previsao["Modelo"].value_counts().to_dict())
 
-    # Aplicar clusterização
-    dados_clusterizados = aplicar_clusterizacao(dados_interpolados)
+    # Demais razões, calculadas de uma vez a partir das variáveis da SIDRA
+    if RAZOES_PADRAO:
+        if df_variaveis is None:
+            df_variaveis = carregar_variaveis(caminho_intermediario("dados_agrupados"))
+        dados_interpolados = calcular_razoes(dados_interpolados, df_variaveis, RAZOES_PADRAO)
+
+    # Aplicar clusterização (razão principal e cada métrica)
+    dados_clusterizados = aplicar_clusterizacao(dados_interpolados, metodo=METODO_CLUSTERIZACAO)
+    dados_clusterizados = clusterizar_metricas(dados_clusterizados, metodo=METODO_CLUSTERIZACAO)
 
     # Identificar saturação e oportunidades
     estados_saturados, estados_oportunidades = identificar_oportunidades_e_saturacao(dados_clusterizados)
@@ -86,17 +177,45 @@ def analisar_dados():
     print("\nEstados Saturados (Alta razão População/Empresas):", estados_saturados)
     print("\nEstados com Oportunidades (Baixa razão População/Empresas):", estados_oportunidades)
 
+    # Totais por região, somados a partir das UFs
+    ultimo_ano = int(dados_clusterizados.anos[-1])
+    por_regiao = CuboGeografico.de_painel(dados_clusterizados).nivel("Região", ultimo_ano)
+    print(f"\nRazão População/Empresas por região ({ultimo_ano}):")
+    print(por_regiao.set_index("LOCAL")["Razão População/Empresas"].round(2).to_string())
+
     # Salvar os resultados
-    salvar_dados(dados_clusterizados)
+    if salvar:
+        salvar_dados(dados_clusterizados)
+        if erros_previsao is not None:
+            salvar_dados(erros_previsao, nome_arquivo=os.path.basename(caminho_intermediario("erros_previsao")))
+        salvar_centroides(dados_clusterizados, METODO_CLUSTERIZACAO)
+    return (dados_clusterizados, erros_previsao) if retornar_erros else dados_clusterizados
+
+@instrumentar("graficos")
+def gerar_graficos(dados=None):
+    """
+    Gera e salva os gráficos baseados nos dados processados.
+
+    Se `dados` (saída de `analisar_dados`) não for informado, lê o arquivo
+    intermediário. Por padrão, as figuras são renderizadas em lote, sem janelas,
+    em paralelo e pulando as que não mudaram; com GRAFICOS_INTERATIVOS, são
+    exibidas uma a uma.
+    """
+    from armazenamento import caminho_intermediario
+    from graficos import (
+        criar_diretorio_saida, carregar_dados, preparar_dados, obter_estados_por_cluster,
+        gerar_grafico_dispersao, gerar_grafico_tendencia, gerar_heatmap_saturacao, salvar_lista_clusters,
+        renderizar_em_lote, nome_arquivo, paineis_das_metricas
+    )
 
-def gerar_graficos():
-    """Gera e salva os gráficos baseados nos dados processados."""
     # Criar diretório de saída para gráficos
     diretorio_saida = criar_diretorio_saida()
 
     # Carregar os dados processados
-    caminho_arquivo = "data/merged_data.csv"
-    dados = carregar_dados(caminho_arquivo)
+    if dados is None:
+        dados = carregar_dados(caminho_intermediario("merged_data"))
+    else:
+        dados = preparar_dados(dados)
 
     if dados is None:
         return
@@ -105,33 +224,336 @@ def gerar_graficos():
     estados_por_cluster = obter_estados_por_cluster(dados)
 
     # Gerar e salvar gráficos
-    caminho_dispersao = gerar_grafico_dispersao(dados, diretorio_saida)
-    caminho_tendencia = gerar_grafico_tendencia(dados, estados_por_cluster, diretorio_saida)
-    caminho_heatmap = gerar_heatmap_saturacao(dados, diretorio_saida)
+    if GRAFICOS_INTERATIVOS:
+        renderizados = {
+            gerar_grafico_dispersao(dados, diretorio_saida): True,
+            gerar_grafico_tendencia(dados, estados_por_cluster, diretorio_saida): True,
+            gerar_heatmap_saturacao(dados, diretorio_saida): True,
+        }
+    else:
+        renderizados = renderizar_em_lote(dados, estados_por_cluster, diretorio_saida)
 
-    # Salvar lista de estados por cluster
+    # Salvar lista de estados por cluster (da razão principal e de cada métrica adicional)
     caminho_clusters = salvar_lista_clusters(estados_por_cluster, diretorio_saida)
+    for metrica in paineis_das_metricas(dados).values():
+        salvar_lista_clusters(metrica.locais_por_cluster(), diretorio_saida,
+                              nome_arquivo(metrica, "clusters_estados.txt"))
 
     # Exibir confirmação dos arquivos gerados
     print("\nGráficos salvos em:", diretorio_saida)
-    print(f"- {caminho_dispersao}")
-    print(f"- {caminho_tendencia}")
-    print(f"- {caminho_heatmap}")
+    for caminho, renderizado in renderizados.items():
+        print(f"- {caminho}" + ("" if renderizado else " (dados inalterados, mantido)"))
     print("\nLista de estados por cluster salva em:", caminho_clusters)
 
-def main():
-    """Função principal que executa todas as etapas do pipeline."""
-    print("\n=== Etapa 1: Baixando e processando dados ===")
-    baixar_e_processar_dados()
+@instrumentar("cenarios")
+def varrer_faixas_etarias(dados=None):
+    """
+    Avalia a saturação e as oportunidades em centenas de faixas etárias e pares de
+    percentis (ver indice_idades.py) e grava, por estado, a fração de cenários em
+    que ele fica saturado ou com oportunidades. Sem `dados`, o painel clusterizado
+    é lido do arquivo intermediário.
+    """
+    from armazenamento import caminho_intermediario, ler_tabela
+    from indice_idades import FAIXAS_PADRAO, PERCENTIS_PADRAO, obter_indice, varrer_cenarios
+    from painel import Painel
 
-    print("\n=== Etapa 2: Tratando dados ===")
-    tratar_dados()
+    if dados is None:
+        dados = Painel.de_dataframe(ler_tabela(caminho_intermediario("merged_data")))
+    indice = obter_indice(EXCEL_PROJECOES)
+    cenarios = varrer_cenarios(indice, dados.sem_locais("Brasil"))
+
+    print(f"\n{len(FAIXAS_PADRAO) * len(PERCENTIS_PADRAO)} cenários avaliados "
+          f"({len(FAIXAS_PADRAO)} faixas etárias x {len(PERCENTIS_PADRAO)} pares de percentis).")
+    for classificacao in ("Sempre saturado", "Sempre oportunidade"):
+        locais = cenarios.loc[cenarios["Classificação"] == classificacao, "LOCAL"].tolist()
+        print(f"{classificacao}: {locais}")
+
+    os.makedirs("resultados", exist_ok=True)
+    caminho = os.path.join("resultados", "cenarios_faixas_etarias.csv")
+    cenarios.to_csv(caminho, index=False)
+    print("Cenários por estado salvos em:", caminho)
+    return cenarios
+
+@instrumentar("estabilidade")
+def avaliar_estabilidade(dados=None):
+    """
+    Repete a clusterização da análise com vários valores de k e sementes (ver
+    estabilidade_clusters.py), grava o resumo por k e os rótulos de cada semente e
+    indica o k recomendado e os estados cujo grupo depende da semente. Sem
+    `dados`, o painel é lido do arquivo intermediário.
+    """
+    from analize import matriz_clusterizacao
+    from armazenamento import caminho_intermediario, ler_tabela
+    from estabilidade_clusters import k_recomendado, locais_instaveis, salvar_rotulos, varrer_estabilidade
+    from painel import Painel
+
+    if dados is None:
+        dados = Painel.de_dataframe(ler_tabela(caminho_intermediario("merged_data")))
+    X, validos = matriz_clusterizacao(dados, METODO_CLUSTERIZACAO)
+    locais = dados.locais[validos]
+    resumo, instaveis, rotulos = varrer_estabilidade(X[validos], metodo=METODO_CLUSTERIZACAO)
+
+    print(resumo.round(3).to_string(index=False))
+    print(f"\nk recomendado: {k_recomendado(resumo)} (a análise usa k=4).")
+    if 4 in instaveis:
+        print(f"Estados cujo cluster (k=4) depende da semente: {locais_instaveis(instaveis[4], locais)}")
+
+    os.makedirs("resultados", exist_ok=True)
+    caminho = os.path.join("resultados", "estabilidade_clusters.csv")
+    resumo.to_csv(caminho, index=False)
+    salvar_rotulos(rotulos, locais, os.path.join("resultados", "rotulos_estabilidade.npz"))
+    print("Estabilidade por k salva em:", caminho)
+    return resumo
+
+@instrumentar("incerteza")
+def avaliar_incerteza(dados=None, erros_previsao=None):
+    """
+    Estima por bootstrap a probabilidade de cada estado ser classificado como
+    saturado ou com oportunidades (ver reamostragem.py) e grava o resultado. Sem
+    `dados` e `erros_previsao`, eles são lidos dos arquivos intermediários.
+    """
+    from armazenamento import caminho_intermediario, ler_tabela
+    from painel import Painel
+    from reamostragem import N_REPLICAS, probabilidades_classificacao
+
+    if dados is None:
+        dados = Painel.de_dataframe(ler_tabela(caminho_intermediario("merged_data")))
+    if (erros_previsao is None and METODO_PREVISAO == "automatico"
+            and os.path.exists(caminho_intermediario("erros_previsao"))):
+        erros_previsao = ler_tabela(caminho_intermediario("erros_previsao"))
+    incerteza = probabilidades_classificacao(dados.sem_locais("Brasil"), metodo=METODO_PREVISAO,
+                                             modelos_por_local=erros_previsao)
+
+    print(f"\nProbabilidade de cada classificação em {N_REPLICAS} réplicas bootstrap:")
+    print(incerteza.round(3).to_string(index=False))
+
+    os.makedirs("resultados", exist_ok=True)
+    caminho = os.path.join("resultados", "incerteza_classificacao.csv")
+    incerteza.to_csv(caminho, index=False)
+    print("Probabilidades por estado salvas em:", caminho)
+    return incerteza
+
+@instrumentar("anexar")
+def anexar_anos(anos):
+    """
+    Acrescenta novos anos ao resultado da análise sem refazer as etapas: baixa só
+    esses anos da SIDRA, atualiza as células afetadas, estima os anos novos sem
+    dados e reagrupa a partir dos centros salvos (ver incremental.py).
+    """
+    from incremental import atualizar_painel
 
-    print("\n=== Etapa 3: Analisando dados ===")
-    analisar_dados()
+    return atualizar_painel(anos, SIDRA_URL, EXCEL_PROJECOES, metodo_previsao=METODO_PREVISAO,
+                            metodo_clusterizacao=METODO_CLUSTERIZACAO)
 
-    print("\n=== Etapa 4: Gerando gráficos ===")
-    gerar_graficos()
+def executar_em_memoria(etapas=None, salvar=False):
+    """
+    Executa as etapas em sequência passando os DataFrames diretamente de uma para
+    a outra, sem gravar e reler os arquivos intermediários.
+
+    Etapas ausentes de `etapas` não são executadas, e as seguintes leem do disco
+    o que precisarem. Com `salvar=True`, os arquivos intermediários também são
+    gravados (apenas como checkpoint). Este modo não consulta nem atualiza o estado
+    incremental do pipeline.
+    """
+    etapas = etapas or ["baixar", "tratar", "analisar", "graficos", "cenarios", "estabilidade", "incerteza"]
+    df_sidra = df_populacao = df_empresas = dados = erros_previsao = None
+
+    if "baixar" in etapas:
+        print("\n=== Etapa 1: Baixando e processando dados (em memória) ===")
+        df_sidra, df_populacao = baixar_e_processar_dados(salvar=salvar)
+    if "tratar" in etapas:
+        print("\n=== Etapa 2: Tratando dados (em memória) ===")
+        df_empresas, df_populacao = tratar_dados(df_sidra, df_populacao, salvar=salvar)
+    if "analisar" in etapas:
+        print("\n=== Etapa 3: Analisando dados (em memória) ===")
+        dados, erros_previsao = analisar_dados(df_populacao, df_empresas, salvar=salvar, df_variaveis=df_sidra,
+                                               retornar_erros=True)
+    if "graficos" in etapas:
+        print("\n=== Etapa 4: Gerando gráficos (em memória) ===")
+        gerar_graficos(dados)
+    if "cenarios" in etapas:
+        print("\n=== Etapa 5: Avaliando cenários de faixa etária (em memória) ===")
+        varrer_faixas_etarias(dados)
+    if "estabilidade" in etapas:
+        print("\n=== Etapa 6: Avaliando a estabilidade dos clusters (em memória) ===")
+        avaliar_estabilidade(dados)
+    if "incerteza" in etapas:
+        print("\n=== Etapa 7: Estimando a incerteza da classificação (em memória) ===")
+        avaliar_incerteza(dados, erros_previsao)
+    return dados
+
+def declarar_etapas():
+    """
+    Declara as etapas do pipeline, na ordem de execução, com os arquivos que cada
+    uma lê e grava (ver pipeline.py). As dependências são deduzidas desses arquivos.
+    """
+    from armazenamento import caminho_intermediario, formato_atual
+    from razoes import RAZOES_PADRAO
+
+    populacao = caminho_intermediario("populacao_filtrada")
+    empresas = caminho_intermediario("dados_filtrados_numero_empresas_ativas")
+    dados_sidra = [caminho_intermediario("dados_2007_2020"), caminho_intermediario("dados_2021_2022")]
+    merged = caminho_intermediario("merged_data")
+    # Os erros do backtest só existem (e só são usados) com o método automático
+    erros_previsao = [caminho_intermediario("erros_previsao")] if METODO_PREVISAO == "automatico" else []
+    formato = {"formato": formato_atual()}
+
+    return [
+        {
+            "nome": "baixar",
+            "titulo": "Etapa 1: Baixando e processando dados",
+            "funcao": baixar_e_processar_dados,
+            "modulos": ["ingestao", "puxar_sidra", "consulta_sidra", "populacao_dados"],
+            "entradas": [],
+            "versao_remota": versao_das_fontes,
+            "saidas": dados_sidra + [populacao, EXCEL_PROJECOES],
+            "parametros": {"sidra_url": SIDRA_URL, "ibge_url": IBGE_URL, **formato},
+        },
+        {
+            "nome": "tratar",
+            "titulo": "Etapa 2: Tratando dados",
+            "funcao": tratar_dados,
+            "modulos": ["tratamento", "perfil_colunas"],
+            "entradas": dados_sidra + [populacao],
+            "saidas": [empresas, caminho_intermediario("dados_agrupados")],
+            "parametros": {"listar_valores_unicos": LISTAR_VALORES_UNICOS, **formato},
+        },
+        {
+            "nome": "analisar",
+            "titulo": "Etapa 3: Analisando dados",
+            "funcao": analisar_dados,
+            "modulos": ["analize", "painel", "extrapolacao", "previsao", "clusterizacao", "razoes",
+                        "cubo_geografico"],
+            "entradas": [populacao, empresas, caminho_intermediario("dados_agrupados")],
+            "saidas": [merged, os.path.join("data", "centroides.npz")] + erros_previsao,
+            "parametros": {"previsao": METODO_PREVISAO, "clusterizacao": METODO_CLUSTERIZACAO,
+                           "razoes": [list(razao) for razao in RAZOES_PADRAO], **formato},
+        },
+        {
+            "nome": "graficos",
+            "titulo": "Etapa 4: Gerando gráficos",
+            "funcao": gerar_graficos,
+            "modulos": ["graficos", "painel"],
+            "entradas": [merged],
+            "saidas": [os.path.join("resultados", nome) for nome in (
+                "clusters_dispersao.png", "tendencias_temporais.png",
+                "heatmap_saturacao.png", "clusters_estados.txt")],
+            "parametros": formato,
+        },
+        {
+            "nome": "cenarios",
+            "titulo": "Etapa 5: Avaliando cenários de faixa etária",
+            "funcao": varrer_faixas_etarias,
+            "modulos": ["indice_idades", "painel"],
+            "entradas": [EXCEL_PROJECOES, merged],
+            "saidas": [os.path.join("resultados", "cenarios_faixas_etarias.csv")],
+            "parametros": formato,
+        },
+        {
+            "nome": "estabilidade",
+            "titulo": "Etapa 6: Avaliando a estabilidade dos clusters",
+            "funcao": avaliar_estabilidade,
+            "modulos": ["estabilidade_clusters", "clusterizacao", "analize", "painel"],
+            "entradas": [merged],
+            "saidas": [os.path.join("resultados", nome) for nome in (
+                "estabilidade_clusters.csv", "rotulos_estabilidade.npz")],
+            "parametros": {"clusterizacao": METODO_CLUSTERIZACAO, **formato},
+        },
+        {
+            "nome": "incerteza",
+            "titulo": "Etapa 7: Estimando a incerteza da classificação",
+            "funcao": avaliar_incerteza,
+            "modulos": ["reamostragem", "extrapolacao", "previsao", "painel"],
+            "entradas": [merged] + erros_previsao,
+            "saidas": [os.path.join("resultados", "incerteza_classificacao.csv")],
+            "parametros": {"previsao": METODO_PREVISAO, **formato},
+        },
+    ]
+
+def main(etapas=None, somente=False, forcar=False, dry_run=False):
+    """
+    Função principal que executa as etapas do pipeline.
+
+    Se `etapas` for None, considera todas; caso contrário, considera as etapas
+    indicadas e as etapas das quais elas dependem (ou apenas as indicadas, com
+    `somente=True`). Uma lista vazia não executa nada. Etapas cujas entradas,
+    parâmetros e código não mudaram desde a última execução são puladas, a menos
+    que `forcar` seja True; com `dry_run`, apenas mostra o que seria executado.
+    """
+    if etapas is not None and not etapas:
+        return []
+
+    from pipeline import executar
+    return executar(declarar_etapas(), alvos=etapas, somente=somente, forcar=forcar, dry_run=dry_run)
 
 if __name__ == "__main__":
-    main()
+    parser = argparse.ArgumentParser(description="Pipeline de análise do mercado imobiliário.")
+    parser.add_argument("etapas", nargs="*",
+                        help="Etapas-alvo (baixar, tratar, analisar, graficos, cenarios, estabilidade, incerteza); as dependências são "
+                             "incluídas automaticamente. Padrão: todas.")
+    parser.add_argument("--somente", action="store_true",
+                        help="Executa apenas as etapas indicadas, sem as dependências.")
+    parser.add_argument("--forcar", action="store_true",
+                        help="Executa as etapas mesmo que estejam atualizadas.")
+    parser.add_argument("--dry-run", action="store_true",
+                        help="Apenas mostra quais etapas seriam executadas.")
+    parser.add_argument("--em-memoria", action="store_true",
+                        help="Passa os DataFrames entre as etapas em memória, sem arquivos intermediários.")
+    parser.add_argument("--checkpoint", action="store_true",
+                        help="Com --em-memoria, grava também os arquivos intermediários em data/.")
+    parser.add_argument("--offline", action="store_true",
+                        help="Não acessa a rede; usa apenas os downloads em cache.")
+    parser.add_argument("--formato", choices=["parquet", "feather", "csv"],
+                        help="Formato dos arquivos intermediários em data/ (padrão: parquet).")
+    parser.add_argument("--exportar-csv", action="store_true",
+                        help="Grava também uma cópia CSV de cada arquivo intermediário.")
+    parser.add_argument("--clusterizacao", choices=["kmeans", "minibatch", "dtw"],
+                        help="Método de clusterização da análise (padrão: kmeans).")
+    parser.add_argument("--previsao",
+                        choices=["automatico", "naive", "drift", "holt", "amortecido", "linear", "tendencia", "inclinacao"],
+                        help="Método de estimativa dos anos ausentes (padrão: automatico, escolhido por backtest).")
+    parser.add_argument("--listar-valores", action="store_true",
+                        help="Lista todos os valores únicos de cada coluna na etapa de tratamento.")
+    parser.add_argument("--anexar", type=int, nargs="+", metavar="ANO",
+                        help="Acrescenta os anos indicados ao resultado da análise, de forma incremental.")
+    parser.add_argument("--interativo", action="store_true",
+                        help="Exibe os gráficos em janelas em vez de renderizá-los em lote.")
+    parser.add_argument("--profile", "--perfil", dest="profile", choices=["baixar", "tratar", "analisar", "graficos", "cenarios", "estabilidade",
+                                              "incerteza"], metavar="ETAPA",
+                        help="Executa a etapa indicada sob o cProfile (resultados/perfil_<etapa>.prof) e mede "
+                             "também a memória (tracemalloc).")
+    parser.add_argument("--relatorio", default=os.path.join("resultados", "relatorio_execucao.json"),
+                        help="Arquivo JSON com as medições de tempo, CPU, memória e linhas da execução.")
+    args = parser.parse_args()
+
+    from instrumentacao import definir_instrumentacao, definir_perfil, exibir_resumo, salvar_relatorio
+    definir_instrumentacao(memoria=args.profile is not None)
+    definir_perfil(args.profile)
+
+    if args.listar_valores:
+        LISTAR_VALORES_UNICOS = True
+    if args.interativo:
+        GRAFICOS_INTERATIVOS = True
+    if args.previsao:
+        METODO_PREVISAO = args.previsao
+    if args.clusterizacao:
+        METODO_CLUSTERIZACAO = args.clusterizacao
+
+    if args.formato or args.exportar_csv:
+        from armazenamento import definir_formato, formato_atual
+        definir_formato(args.formato or formato_atual(), exportar_csv=args.exportar_csv)
+
+    if args.offline:
+        from cache_http import definir_modo_offline
+        definir_modo_offline(True)
+
+    try:
+        if args.anexar:
+            anexar_anos(args.anexar)
+        elif args.em_memoria:
+            executar_em_memoria(args.etapas or None, salvar=args.checkpoint)
+        else:
+            main(args.etapas or None, somente=args.somente, forcar=args.forcar, dry_run=args.dry_run)
+    finally:
+        exibir_resumo()
+        print(f"\nRelatório da execução salvo em: {salvar_relatorio(args.relatorio)}")
@@ -0,0 +1,178 @@
+"""
+Painel local x ano com os dados da análise.
+
+Guarda população, número de empresas e a razão População/Empresas como
+matrizes NumPy (locais x anos), com índices de local e de ano, além do cluster
+de cada local. Outras razões (ver razoes.py) ficam em `metricas`, com o
+cluster de cada local segundo cada uma delas. A série de um local ou o corte de
+um ano são obtidos em O(1), como visões das matrizes, sem `pivot`, `melt` ou
+filtros por máscara sobre a tabela inteira. A conversão para o formato longo
+(uma linha por local e ano) só acontece ao gravar o arquivo intermediário.
+"""
+import numpy as np
+import pandas as pd
+
+VARIAVEIS = {
+    "populacao": "População",
+    "empresas": "Número de empresas ativas",
+    "razao": "Razão População/Empresas",
+}
+
+def colunas_de_metricas(colunas):
+    """Colunas de métricas adicionais ("Razão ...") e dos seus clusters ("Cluster Razão ...") em `colunas`."""
+    return [coluna for coluna in colunas
+            if (str(coluna).startswith("Razão ") and coluna not in VARIAVEIS.values())
+            or str(coluna).startswith("Cluster Razão ")]
+
+class Painel:
+    """Matrizes locais x anos com índices de local e ano."""
+
+    def __init__(self, locais, anos, populacao=None, empresas=None, razao=None, cluster=None,
+                 metricas=None, clusters_metricas=None, nome_razao=VARIAVEIS["razao"]):
+        self.locais = np.asarray(locais, dtype=object)
+        self.anos = np.asarray(anos, dtype=int)
+        forma = (len(self.locais), len(self.anos))
+        self.populacao = np.full(forma, np.nan) if populacao is None else np.asarray(populacao, dtype=float)
+        self.empresas = np.full(forma, np.nan) if empresas is None else np.asarray(empresas, dtype=float)
+        if razao is None:
+            with np.errstate(divide="ignore", invalid="ignore"):
+                razao = self.populacao / self.empresas
+        self.razao = np.asarray(razao, dtype=float)
+        self.cluster = cluster
+        # Razões adicionais (nome -> matriz locais x anos) e o cluster de cada local em cada uma
+        self.metricas = {nome: np.asarray(matriz, dtype=float) for nome, matriz in (metricas or {}).items()}
+        self.clusters_metricas = dict(clusters_metricas or {})
+        self.nome_razao = nome_razao
+        self.indice_local = {local: i for i, local in enumerate(self.locais)}
+        self.indice_ano = {ano: j for j, ano in enumerate(self.anos)}
+
+    def __len__(self):
+        return len(self.locais)
+
+    def __repr__(self):
+        return f"Painel({len(self.locais)} locais x {len(self.anos)} anos: {self.anos.min()}-{self.anos.max()})"
+
+    def matriz(self, variavel="razao"):
+        """Matriz locais x anos da variável ("populacao", "empresas", "razao" ou o nome de uma métrica)."""
+        if variavel in self.metricas:
+            return self.metricas[variavel]
+        return getattr(self, variavel)
+
+    def metrica(self, nome):
+        """
+        Painel em que a razão é a métrica `nome` (com o cluster de cada local
+        segundo ela), para usar com as mesmas funções de clusterização e gráficos.
+        """
+        if nome == self.nome_razao:
+            return self
+        return Painel(self.locais, self.anos, self.populacao, self.empresas, self.metricas[nome],
+                      self.clusters_metricas.get(nome), nome_razao=nome)
+
+    def com_metricas(self, metricas):
+        """Novo painel com as `metricas` (nome -> matriz locais x anos) acrescentadas às atuais."""
+        return Painel(self.locais, self.anos, self.populacao, self.empresas, self.razao, self.cluster,
+                      {**self.metricas, **metricas}, self.clusters_metricas, self.nome_razao)
+
+    def serie(self, local, variavel="razao"):
+        """Série anual de um local (visão da linha da matriz)."""
+        return self.matriz(variavel)[self.indice_local[local]]
+
+    def corte(self, ano, variavel="razao"):
+        """Valores de todos os locais em um ano (visão da coluna da matriz)."""
+        return self.matriz(variavel)[:, self.indice_ano[ano]]
+
+    def colunas_anos(self, anos):
+        """Índices das colunas dos anos pedidos que existem no painel."""
+        return np.array([self.indice_ano[ano] for ano in anos if ano in self.indice_ano], dtype=int)
+
+    def com_anos(self, anos):
+        """Novo painel com a grade de anos ampliada para incluir `anos` (células novas ficam NaN)."""
+        grade = np.union1d(self.anos, np.asarray(anos, dtype=int))
+        if len(grade) == len(self.anos):
+            return self
+        colunas = np.searchsorted(grade, self.anos)
+        def ampliar(matriz):
+            completa = np.full((len(self.locais), len(grade)), np.nan)
+            completa[:, colunas] = matriz
+            return completa
+
+        matrizes = {variavel: ampliar(self.matriz(variavel)) for variavel in VARIAVEIS}
+        metricas = {nome: ampliar(matriz) for nome, matriz in self.metricas.items()}
+        return Painel(self.locais, grade, cluster=self.cluster, metricas=metricas,
+                      clusters_metricas=self.clusters_metricas, nome_razao=self.nome_razao, **matrizes)
+
+    def filtrar_locais(self, manter):
+        """Novo painel só com as linhas indicadas pela máscara booleana `manter` (as matrizes são fatiadas, não recalculadas)."""
+        cluster = None if self.cluster is None else np.asarray(self.cluster)[manter]
+        return Painel(self.locais[manter], self.anos, self.populacao[manter], self.empresas[manter],
+                      self.razao[manter], cluster,
+                      {nome: matriz[manter] for nome, matriz in self.metricas.items()},
+                      {nome: np.asarray(rotulos)[manter] for nome, rotulos in self.clusters_metricas.items()},
+                      self.nome_razao)
+
+    def sem_locais(self, *locais):
+        """Novo painel sem os locais indicados."""
+        return self.filtrar_locais(~np.isin(self.locais, locais))
+
+    def do_cluster(self, cluster):
+        """Novo painel apenas com os locais do cluster indicado."""
+        return self.filtrar_locais(np.asarray(self.cluster) == cluster)
+
+    def locais_por_cluster(self):
+        """Dicionário cluster -> lista de locais, na ordem em que os clusters aparecem."""
+        grupos = {}
+        for local, cluster in zip(self.locais, self.cluster):
+            grupos.setdefault(cluster, []).append(local)
+        return grupos
+
+    def para_dataframe(self):
+        """
+        Tabela longa (uma linha por local e ano com razão definida), ordenada por
+        ano e local, com as colunas do arquivo intermediário `merged_data`. Cada
+        métrica vira uma coluna com o seu nome, e o seu cluster, "Cluster <nome>".
+        """
+        colunas, linhas = np.nonzero(~np.isnan(self.razao).T)
+        dados = {
+            "Ano": self.anos[colunas],
+            "LOCAL": self.locais[linhas],
+            "População": self.populacao[linhas, colunas],
+            "Número de empresas ativas": self.empresas[linhas, colunas],
+            "Razão População/Empresas": self.razao[linhas, colunas],
+        }
+        if self.cluster is not None:
+            dados["Cluster"] = np.asarray(self.cluster)[linhas]
+        for nome, matriz in self.metricas.items():
+            dados[nome] = matriz[linhas, colunas]
+            if nome in self.clusters_metricas:
+                dados[f"Cluster {nome}"] = np.asarray(self.clusters_metricas[nome])[linhas]
+        return pd.DataFrame(dados)
+
+    @classmethod
+    def de_dataframe(cls, df):
+        """
+        Monta o painel a partir da tabela longa (formato de `merged_data`).
+        Colunas ausentes ficam com NaN; o cluster de cada local é o da sua primeira
+        linha. As demais colunas "Razão ..." são lidas como métricas.
+        """
+        locais, linhas = np.unique(np.asarray(df["LOCAL"], dtype=object), return_inverse=True)
+        anos, colunas = np.unique(np.asarray(df["Ano"], dtype=int), return_inverse=True)
+        matrizes = {}
+        for variavel, coluna in VARIAVEIS.items():
+            matriz = np.full((len(locais), len(anos)), np.nan)
+            if coluna in df:
+                matriz[linhas, colunas] = df[coluna].to_numpy(dtype=float)
+            matrizes[variavel] = matriz
+
+        metricas = {}
+        for coluna in colunas_de_metricas(df.columns):
+            if not str(coluna).startswith("Cluster "):
+                metricas[coluna] = np.full((len(locais), len(anos)), np.nan)
+                metricas[coluna][linhas, colunas] = df[coluna].to_numpy(dtype=float)
+
+        primeira = np.full(len(locais), len(df))
+        np.minimum.at(primeira, linhas, np.arange(len(df)))
+        cluster = df["Cluster"].to_numpy()[primeira] if "Cluster" in df else None
+        clusters_metricas = {nome: df[f"Cluster {nome}"].to_numpy()[primeira]
+                             for nome in metricas if f"Cluster {nome}" in df}
+        return cls(locais, anos, cluster=cluster, metricas=metricas, clusters_metricas=clusters_metricas,
+                   **matrizes)
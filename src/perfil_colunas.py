@@ -0,0 +1,164 @@
+"""
+Perfil das colunas de uma tabela em uma única passada, com memória limitada.
+
+Para cada coluna, calcula o número de linhas, de nulos e de valores distintos,
+o mínimo, o máximo e uma pequena amostra de valores. A tabela é percorrida em
+blocos de linhas; os distintos são contados de forma exata (por um conjunto de
+hashes de 64 bits) até `LIMITE_EXATO` valores e, acima disso, estimados por
+HyperLogLog, com 2^14 registradores (16 KB por coluna, erro padrão de ~0,8%).
+"""
+import numpy as np
+import pandas as pd
+
+# Número de distintos até o qual a contagem é exata
+LIMITE_EXATO = 10_000
+
+# Precisão do HyperLogLog: 2^PRECISAO registradores
+PRECISAO = 14
+
+TAMANHO_BLOCO = 100_000
+
+class HyperLogLog:
+    """Contador aproximado de distintos a partir de hashes de 64 bits."""
+
+    def __init__(self, precisao=PRECISAO):
+        self.precisao = precisao
+        self.registradores = np.zeros(1 << precisao, dtype=np.uint8)
+
+    def adicionar(self, hashes):
+        """Adiciona um vetor de hashes (uint64)."""
+        hashes = np.asarray(hashes, dtype=np.uint64)
+        bits_restantes = 64 - self.precisao
+        indices = (hashes >> np.uint64(bits_restantes)).astype(np.intp)
+        resto = hashes & np.uint64((1 << bits_restantes) - 1)
+        # Posição do primeiro bit 1 no resto (contando a partir do bit mais significativo)
+        posicao = (bits_restantes - _comprimento_em_bits(resto) + 1).astype(np.uint8)
+        np.maximum.at(self.registradores, indices, posicao)
+
+    def estimar(self):
+        """Número estimado de valores distintos adicionados."""
+        m = len(self.registradores)
+        alfa = 0.7213 / (1 + 1.079 / m)
+        estimativa = alfa * m * m / np.sum(np.ldexp(1.0, -self.registradores.astype(int)))
+        vazios = int(np.count_nonzero(self.registradores == 0))
+        if estimativa <= 2.5 * m and vazios:
+            # Correção para cardinalidades pequenas (contagem linear)
+            estimativa = m * np.log(m / vazios)
+        return int(round(estimativa))
+
+def _comprimento_em_bits(valores):
+    """Número de bits significativos de cada valor de um vetor uint64 (0 para 0)."""
+    valores = valores.copy()
+    comprimento = np.zeros(len(valores), dtype=np.int64)
+    for deslocamento in (32, 16, 8, 4, 2, 1):
+        maiores = (valores >> np.uint64(deslocamento)) != 0
+        comprimento += deslocamento * maiores
+        valores = np.where(maiores, valores >> np.uint64(deslocamento), valores)
+    return comprimento + (valores != 0)
+
+class _PerfilColuna:
+    """Estado acumulado do perfil de uma coluna ao longo dos blocos."""
+
+    def __init__(self, tamanho_amostra, limite_exato):
+        self.linhas = self.nulos = 0
+        self.minimo = self.maximo = None
+        self.amostra = []
+        self.hashes = set()
+        self.hll = None
+        self.tamanho_amostra = tamanho_amostra
+        self.limite_exato = limite_exato
+
+    def atualizar(self, serie):
+        self.linhas += len(serie)
+        validos = serie.dropna()
+        self.nulos += len(serie) - len(validos)
+        if validos.empty:
+            return
+
+        hashes = pd.util.hash_pandas_object(validos, index=False).to_numpy()
+        if self.hll is None:
+            self.hashes.update(np.unique(hashes).tolist())
+            if len(self.hashes) > self.limite_exato:
+                self.hll = HyperLogLog()
+                self.hll.adicionar(np.fromiter(self.hashes, dtype=np.uint64, count=len(self.hashes)))
+                self.hashes = set()
+        else:
+            self.hll.adicionar(hashes)
+
+        ordenaveis = validos
+        if isinstance(validos.dtype, pd.CategoricalDtype) and not validos.cat.ordered:
+            # Categorias sem ordem: mínimo e máximo entre as categorias presentes no bloco
+            ordenaveis = pd.Series(validos.cat.remove_unused_categories().cat.categories)
+        try:
+            minimo, maximo = ordenaveis.min(), ordenaveis.max()
+        except TypeError:
+            # Tipos misturados: sem mínimo e máximo
+            pass
+        else:
+            self.minimo = minimo if self.minimo is None else min(self.minimo, minimo)
+            self.maximo = maximo if self.maximo is None else max(self.maximo, maximo)
+
+        if len(self.amostra) < self.tamanho_amostra:
+            for valor in validos.drop_duplicates().head(self.tamanho_amostra).tolist():
+                if len(self.amostra) < self.tamanho_amostra and valor not in self.amostra:
+                    self.amostra.append(valor)
+
+    def resultado(self):
+        aproximado = self.hll is not None
+        return {
+            "linhas": self.linhas,
+            "nulos": self.nulos,
+            "distintos": self.hll.estimar() if aproximado else len(self.hashes),
+            "aproximado": aproximado,
+            "minimo": self.minimo,
+            "maximo": self.maximo,
+            "amostra": self.amostra,
+        }
+
+def perfilar_colunas(df, tamanho_amostra=5, limite_exato=LIMITE_EXATO, tamanho_bloco=TAMANHO_BLOCO):
+    """
+    Perfil de todas as colunas de `df` (DataFrame ou iterável de blocos de
+    DataFrame com as mesmas colunas), em uma única passada.
+
+    Retorna um DataFrame com uma linha por coluna: tipo, linhas, nulos,
+    distintos (com `aproximado=True` quando estimado por HyperLogLog), mínimo,
+    máximo e amostra de valores.
+    """
+    if isinstance(df, pd.DataFrame):
+        blocos = (df.iloc[inicio:inicio + tamanho_bloco] for inicio in range(0, max(len(df), 1), tamanho_bloco))
+    else:
+        blocos = iter(df)
+
+    perfis, tipos = {}, {}
+    for bloco in blocos:
+        for coluna in bloco.columns:
+            if coluna not in perfis:
+                perfis[coluna] = _PerfilColuna(tamanho_amostra, limite_exato)
+                tipos[coluna] = str(bloco[coluna].dtype)
+            perfis[coluna].atualizar(bloco[coluna])
+
+    linhas = [{"coluna": coluna, "tipo": tipos[coluna], **perfil.resultado()} for coluna, perfil in perfis.items()]
+    perfil = pd.DataFrame(linhas, columns=["coluna", "tipo", "linhas", "nulos", "distintos", "aproximado",
+                                           "minimo", "maximo", "amostra"])
+    # Mínimo e máximo mantêm o tipo de cada coluna (sem virar float ao serem reunidos)
+    for chave in ("minimo", "maximo"):
+        perfil[chave] = pd.Series([linha[chave] for linha in linhas], index=perfil.index, dtype=object)
+    return perfil
+
+def formatar_perfil(perfil, largura_valor=30):
+    """Texto compacto do perfil, com uma linha por coluna."""
+    def curto(valor):
+        texto = "" if valor is None or valor != valor else str(valor)
+        return texto if len(texto) <= largura_valor else texto[:largura_valor - 3] + "..."
+
+    tabela = pd.DataFrame({
+        "coluna": perfil["coluna"],
+        "tipo": perfil["tipo"],
+        "nulos": perfil["nulos"],
+        "distintos": [f"~{n}" if aproximado else str(n) for n, aproximado in zip(perfil["distintos"], perfil["aproximado"])],
+        "mínimo": perfil["minimo"].map(curto),
+        "máximo": perfil["maximo"].map(curto),
+        "amostra": perfil["amostra"].map(lambda valores: curto(", ".join(map(str, valores)))),
+    })
+    linhas = int(perfil["linhas"].max()) if len(perfil) else 0
+    return f"{linhas} linhas, {len(perfil)} colunas\n" + tabela.to_string(index=False)
@@ -0,0 +1,169 @@
+"""
+Execução incremental das etapas do pipeline.
+
+Cada etapa é declarada como um dicionário com:
+- "nome" e "titulo";
+- "funcao": função sem argumentos que executa a etapa;
+- "entradas" e "saidas": arquivos lidos e gravados;
+- "parametros": valores que influenciam o resultado (URLs, formato, ...);
+- "modulos": módulos de `src/` cujo código influencia o resultado;
+- "versao_remota" (opcional): função que retorna a versão atual das fontes
+  remotas lidas pela etapa (ex.: o SHA-256 do conteúdo de cada URL). Ela recebe
+  `verificar`: com False (no dry-run), não deve acessar a rede nem gravar nada,
+  e retorna a última versão conhecida.
+
+As dependências entre etapas são deduzidas dos arquivos: uma etapa depende da
+que produz cada uma de suas entradas. Antes de executar uma etapa, calcula-se
+uma impressão digital (SHA-256) a partir do conteúdo das entradas, dos
+parâmetros, do código da etapa e da versão das fontes remotas. Se ela for igual à registrada na última
+execução e todas as saídas existirem, a etapa é pulada. Como as entradas são
+comparadas pelo conteúdo, uma etapa que for reexecutada e produzir arquivos
+idênticos não força a reexecução das etapas seguintes.
+"""
+import hashlib
+import importlib.util
+import inspect
+import json
+import os
+import tempfile
+
+ARQUIVO_ESTADO = os.path.join("data", ".estado_pipeline.json")
+
+def hash_arquivo(caminho, tamanho_bloco=1024 * 1024):
+    """SHA-256 do conteúdo do arquivo (None se ele não existir)."""
+    if not os.path.exists(caminho):
+        return None
+    sha = hashlib.sha256()
+    with open(caminho, "rb") as f:
+        for bloco in iter(lambda: f.read(tamanho_bloco), b""):
+            sha.update(bloco)
+    return sha.hexdigest()
+
+def _hash_modulo(nome):
+    """Hash do código-fonte de um módulo, sem importá-lo."""
+    especificacao = importlib.util.find_spec(nome)
+    if especificacao is None or not especificacao.origin:
+        return None
+    return hash_arquivo(especificacao.origin)
+
+def impressao_digital(etapa, verificar_remoto=True):
+    """
+    Calcula a impressão digital da etapa a partir de entradas, parâmetros, código
+    e fontes remotas (sem consultá-las se `verificar_remoto` for False).
+    """
+    conteudo = {
+        "nome": etapa["nome"],
+        "parametros": etapa.get("parametros", {}),
+        "codigo": inspect.getsource(etapa["funcao"]),
+        "modulos": {nome: _hash_modulo(nome) for nome in etapa.get("modulos", [])},
+        "entradas": {caminho: hash_arquivo(caminho) for caminho in etapa.get("entradas", [])},
+    }
+    if "versao_remota" in etapa:
+        conteudo["remoto"] = etapa["versao_remota"](verificar=verificar_remoto)
+    texto = json.dumps(conteudo, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha256(texto.encode("utf-8")).hexdigest()
+
+def carregar_estado(caminho=ARQUIVO_ESTADO):
+    """Lê as impressões digitais registradas na última execução de cada etapa."""
+    if not os.path.exists(caminho):
+        return {}
+    with open(caminho, encoding="utf-8") as f:
+        return json.load(f)
+
+def salvar_estado(estado, caminho=ARQUIVO_ESTADO):
+    """Grava o estado do pipeline de forma atômica."""
+    diretorio = os.path.dirname(caminho) or "."
+    os.makedirs(diretorio, exist_ok=True)
+    fd, temporario = tempfile.mkstemp(dir=diretorio, suffix=".tmp")
+    with os.fdopen(fd, "w", encoding="utf-8") as f:
+        json.dump(estado, f, ensure_ascii=False, indent=2)
+    os.replace(temporario, caminho)
+
+def dependencias(etapa, etapas):
+    """Nomes das etapas que produzem as entradas da etapa."""
+    produtores = {saida: outra["nome"] for outra in etapas for saida in outra.get("saidas", [])}
+    return sorted({produtores[entrada] for entrada in etapa.get("entradas", []) if entrada in produtores})
+
+def selecionar_etapas(etapas, alvos=None, somente=False):
+    """
+    Retorna as etapas a considerar, na ordem de declaração: os alvos e, a menos
+    que `somente` seja True, todas as etapas das quais eles dependem.
+    """
+    nomes = [etapa["nome"] for etapa in etapas]
+    if alvos is None:
+        return list(etapas)
+    desconhecidas = [alvo for alvo in alvos if alvo not in nomes]
+    if desconhecidas:
+        raise ValueError(f"Etapas desconhecidas: {desconhecidas}. Opções: {nomes}")
+
+    por_nome = {etapa["nome"]: etapa for etapa in etapas}
+    selecionadas = set(alvos)
+    pendentes = list(alvos) if not somente else []
+    while pendentes:
+        for dependencia in dependencias(por_nome[pendentes.pop()], etapas):
+            if dependencia not in selecionadas:
+                selecionadas.add(dependencia)
+                pendentes.append(dependencia)
+    return [etapa for etapa in etapas if etapa["nome"] in selecionadas]
+
+def motivo_para_executar(etapa, estado, forcar=False, verificar_remoto=True):
+    """
+    Retorna (motivo, impressão digital): por que a etapa precisa ser executada,
+    ou None se ela está atualizada, e a impressão digital, se foi calculada.
+    """
+    if forcar:
+        return "execução forçada", None
+    registro = estado.get(etapa["nome"])
+    if registro is None:
+        return "nunca executada", None
+    faltantes = [saida for saida in etapa.get("saidas", []) if not os.path.exists(saida)]
+    if faltantes:
+        return f"saídas ausentes: {', '.join(faltantes)}", None
+    impressao = impressao_digital(etapa, verificar_remoto)
+    if registro.get("impressao") != impressao:
+        return "entradas, parâmetros, código ou fontes remotas alterados", impressao
+    return None, impressao
+
+def executar(etapas, alvos=None, somente=False, forcar=False, dry_run=False, arquivo_estado=ARQUIVO_ESTADO):
+    """
+    Executa as etapas selecionadas que estiverem desatualizadas.
+
+    Com `dry_run=True`, apenas mostra o que seria executado, sem consultar as
+    fontes remotas (vale a última versão conhecida delas). Retorna a lista de
+    nomes das etapas executadas (ou que seriam executadas).
+    """
+    estado = carregar_estado(arquivo_estado)
+    selecionadas = selecionar_etapas(etapas, alvos, somente)
+    executadas = []
+
+    for etapa in selecionadas:
+        dependencias_executadas = [nome for nome in dependencias(etapa, etapas) if nome in executadas]
+        if dry_run and dependencias_executadas:
+            # As entradas ainda serão regeneradas: a etapa só roda se o conteúdo mudar
+            print(f"[dry-run] {etapa['nome']}: pode executar (depende de {', '.join(dependencias_executadas)})")
+            executadas.append(etapa["nome"])
+            continue
+
+        motivo, impressao = motivo_para_executar(etapa, estado, forcar, verificar_remoto=not dry_run)
+        if dry_run:
+            aviso = "; fonte remota não verificada" if "versao_remota" in etapa else ""
+            print(f"[dry-run] {etapa['nome']}: " + (f"atualizada{aviso}" if motivo is None
+                                                     else f"executar ({motivo}{aviso})"))
+            if motivo is not None:
+                executadas.append(etapa["nome"])
+            continue
+        if motivo is None:
+            print(f"\n=== {etapa['titulo']} (atualizada, pulando) ===")
+            continue
+
+        print(f"\n=== {etapa['titulo']} ({motivo}) ===")
+        if impressao is None:
+            impressao = impressao_digital(etapa)
+        etapa["funcao"]()
+        estado[etapa["nome"]] = {
+            "impressao": impressao,
+            "saidas": {saida: hash_arquivo(saida) for saida in etapa.get("saidas", [])},
+        }
+        salvar_estado(estado, arquivo_estado)
+        executadas.append(etapa["nome"])
+    return executadas
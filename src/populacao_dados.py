@@ -1,24 +1,99 @@
-import requests
 import os
+import shutil
 import pandas as pd
 import numpy as np
 
+from armazenamento import caminho_intermediario, salvar_tabela
+from cache_http import baixar_com_cache
+from instrumentacao import instrumentar
+
 # URL do arquivo de projeção de população no IBGE
 ibge_url = "https://ftp.ibge.gov.br/Projecao_da_Populacao/Projecao_da_Populacao_2024/projecoes_2024_tab1_idade_simples.xlsx"
 excel_file_path = "data/projecoes_2024_tab1_idade_simples.xlsx"
-csv_input_path = "data/populacao.csv"
-csv_output_path = "data/populacao_filtrada.csv"
 
-# Função para baixar o arquivo do IBGE
+# Função para baixar o arquivo do IBGE (reaproveitando o cache em disco quando possível)
+@instrumentar()
 def baixar_arquivo_ibge(url, output_path):
     print("Baixando arquivo do IBGE...")
-    response = requests.get(url)
+    caminho_cache = baixar_com_cache(url)
     os.makedirs(os.path.dirname(output_path), exist_ok=True)  # Criar diretório, se não existir
-    with open(output_path, 'wb') as file:
-        file.write(response.content)
+    shutil.copyfile(caminho_cache, output_path)
     print(f"Arquivo baixado e salvo em: {output_path}")
 
+COLUNAS_IDENTIFICACAO = ['IDADE', 'SEXO', 'CÓD.', 'SIGLA', 'LOCAL']
+
+def _normalizar_cabecalho(valor):
+    """Converte o cabeçalho da planilha em texto ('2007.0' e 2007 viram '2007')."""
+    if isinstance(valor, float) and valor.is_integer():
+        valor = int(valor)
+    return "" if valor is None else str(valor).strip()
+
+def _idade_como_numero(valor):
+    """
+    Retorna a idade como número ("90+" vira 90), ou None para linhas que não são
+    de dados (notas, totais).
+    """
+    if isinstance(valor, (int, float)):
+        return valor
+    if isinstance(valor, str) and valor.strip().rstrip("+").isdigit():
+        return int(valor.strip().rstrip("+"))
+    return None
+
+# Função para ler a planilha em uma única passada, linha a linha, já aplicando os filtros
+@instrumentar()
+def ler_projecoes_filtradas(excel_path, faixa_etaria=(38, 58), anos=(2007, 2022), linha_cabecalho=6):
+    """
+    Lê a planilha de projeções em modo somente leitura (streaming), mantendo apenas
+    as idades da faixa etária e as colunas dos anos pedidos. Produz o mesmo
+    resultado de `salvar_csv` seguido de `filtrar_csv`, sem carregar a planilha
+    inteira nem gravar o CSV intermediário.
+    """
+    from openpyxl import load_workbook
+
+    anos_colunas = [str(ano) for ano in range(anos[0], anos[1] + 1)]
+    colunas = COLUNAS_IDENTIFICACAO + anos_colunas
+
+    workbook = load_workbook(excel_path, read_only=True, data_only=True)
+    try:
+        linhas = workbook.worksheets[0].iter_rows(min_row=linha_cabecalho, values_only=True)
+        cabecalho = [_normalizar_cabecalho(valor) for valor in next(linhas)]
+        faltantes = [coluna for coluna in colunas if coluna not in cabecalho]
+        if faltantes:
+            raise ValueError(f"Colunas não encontradas na planilha: {faltantes}")
+        indices = [cabecalho.index(coluna) for coluna in colunas]
+        indice_idade = cabecalho.index('IDADE')
+
+        registros = []
+        for linha in linhas:
+            idade = _idade_como_numero(linha[indice_idade]) if len(linha) > indice_idade else None
+            if idade is None or not (faixa_etaria[0] <= idade <= faixa_etaria[1]):
+                continue
+            registro = [linha[i] if i < len(linha) else None for i in indices]
+            registro[0] = idade  # 'IDADE' é a primeira coluna selecionada
+            registros.append(registro)
+    finally:
+        workbook.close()
+
+    df_pop = pd.DataFrame(registros, columns=colunas)
+    df_pop['IDADE'] = pd.to_numeric(df_pop['IDADE'])
+    df_pop[anos_colunas] = df_pop[anos_colunas].apply(pd.to_numeric, errors='coerce')
+    df_pop[anos_colunas] = df_pop[anos_colunas].interpolate(method='linear', axis=1)
+    return df_pop
+
+# Função que substitui salvar_csv + filtrar_csv: lê a planilha filtrando e salva só o resultado
+# (no formato indicado pela extensão de output_path, ver armazenamento.py; nada é salvo se for None)
+@instrumentar()
+def processar_projecoes(excel_path, output_path=None, faixa_etaria=(38, 58), anos=(2007, 2022)):
+    print(f"Lendo o arquivo Excel (faixa etária {faixa_etaria[0]} a {faixa_etaria[1]} anos, {anos[0]}-{anos[1]})...")
+    df_pop = ler_projecoes_filtradas(excel_path, faixa_etaria, anos)
+    print(f"{len(df_pop)} linhas selecionadas.")
+    if output_path:
+        print(f"Salvando os dados filtrados em: {output_path}")
+        salvar_tabela(df_pop, output_path)
+    return df_pop
+
 # Função para salvar os dados do Excel em CSV (removendo as 5 primeiras linhas)
+@instrumentar()
 def salvar_csv(excel_path, csv_output_path):
     # Ler o arquivo Excel, ignorando as 5 primeiras linhas
     print("Lendo o arquivo Excel...")
@@ -38,6 +113,7 @@ def salvar_csv(excel_path, csv_output_path):
     return df_pop
 
 # Função para filtrar a população na faixa etária de 38 a 58 anos e para os anos de 2007 a 2022
+@instrumentar()
 def filtrar_csv(csv_input_path, csv_output_path, faixa_etaria=(38, 58), anos=(2007, 2022)):
     # Ler o arquivo CSV
     print("Lendo o arquivo CSV...")
@@ -53,7 +129,10 @@ def filtrar_csv(csv_input_path, csv_output_path, faixa_etaria=(38, 58), anos=(20
 
     # Filtrar os dados de acordo com a faixa etária de 38 a 58 anos
     print("Filtrando a população na faixa etária de 38 a 58 anos...")
-    df_pop = df_pop[(df_pop['IDADE'] >= faixa_etaria[0]) & (df_pop['IDADE'] <= faixa_etaria[1])]
+    # Na planilha real a coluna IDADE tem "90+" e linhas de nota, então é lida como texto e a
+    # comparação direta com números falha; esses valores não numéricos ficam fora do filtro
+    idades = pd.to_numeric(df_pop['IDADE'], errors='coerce')
+    df_pop = df_pop[(idades >= faixa_etaria[0]) & (idades <= faixa_etaria[1])]
 
     # Filtrar os dados para os anos entre 2007 e 2022
     anos_colunas = [str(ano) for ano in range(anos[0], anos[1] + 1)]
@@ -73,9 +152,13 @@ def filtrar_csv(csv_input_path, csv_output_path, faixa_etaria=(38, 58), anos=(20
     df_pop.to_csv(csv_output_path, index=False)
     return df_pop
 
-# Baixar o arquivo do IBGE
-baixar_arquivo_ibge(ibge_url, excel_file_path)
+def main():
+    # Baixar o arquivo do IBGE
+    baixar_arquivo_ibge(ibge_url, excel_file_path)
+
+    # Ler a planilha já filtrando a faixa etária e os anos (o caminho é calculado
+    # aqui, e não na importação, para respeitar o formato definido com definir_formato)
+    processar_projecoes(excel_file_path, caminho_intermediario("populacao_filtrada"))
 
-# Executar as funções
-salvar_csv(excel_file_path, csv_input_path)
-filtrar_csv(csv_input_path, csv_output_path)
+if __name__ == "__main__":
+    main()
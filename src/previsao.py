@@ -0,0 +1,181 @@
+"""
+Previsão das séries anuais com seleção de modelo por acurácia medida.
+
+Os modelos são ajustados a todos os locais de uma vez, em operações NumPy sobre
+a matriz local x ano (com NaN nos anos sem observação):
+- "naive": repete o último valor observado;
+- "drift": prolonga a reta entre a primeira e a última observação;
+- "holt": suavização exponencial com tendência linear (Holt);
+- "amortecido": Holt com tendência amortecida.
+
+Os parâmetros de suavização do Holt são escolhidos por local, a partir de uma
+grade avaliada de uma só vez, pelo menor erro quadrático de previsão um passo à
+frente. A acurácia de cada modelo é medida por um backtest com origem móvel
+(treina até o ano t e prevê os `horizonte` anos seguintes, para as últimas
+`n_origens` origens). As origens são avaliadas em paralelo por um pool de
+processos quando o volume de dados compensa o custo de criá-lo.
+"""
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+MODELOS = ("naive", "drift", "holt", "amortecido")
+
+# Grade de parâmetros de suavização avaliada para cada local
+ALFAS = (0.2, 0.4, 0.6, 0.8, 1.0)
+BETAS = (0.05, 0.1, 0.2, 0.4)
+PHIS_AMORTECIDO = (0.8, 0.9, 0.98)
+
+# Abaixo deste número de séries x origens, o backtest roda no processo atual
+MINIMO_PARALELO = 10_000
+
+def _preencher(valores):
+    """Preenche lacunas internas com o último valor observado; retorna a matriz e o início de cada série."""
+    observado = ~np.isnan(valores)
+    n_anos = valores.shape[1]
+    indices = np.maximum.accumulate(np.where(observado, np.arange(n_anos), -1), axis=1)
+    preenchida = np.take_along_axis(valores, np.maximum(indices, 0), axis=1)
+    preenchida[indices < 0] = np.nan
+    inicio = np.where(observado.any(axis=1), np.argmax(observado, axis=1), n_anos)
+    return preenchida, inicio
+
+def _ultima_observacao(valores):
+    """Índice da última coluna observada de cada linha (-1 se não houver)."""
+    observado = ~np.isnan(valores)
+    ultima = valores.shape[1] - 1 - np.argmax(observado[:, ::-1], axis=1)
+    return np.where(observado.any(axis=1), ultima, -1)
+
+def _prever_naive(valores, anos, anos_alvo):
+    ultima = _ultima_observacao(valores)
+    linhas = np.arange(valores.shape[0])
+    ultimo = np.where(ultima >= 0, valores[linhas, np.maximum(ultima, 0)], np.nan)
+    return np.repeat(ultimo[:, None], len(anos_alvo), axis=1)
+
+def _prever_drift(valores, anos, anos_alvo):
+    _, inicio = _preencher(valores)
+    ultima = _ultima_observacao(valores)
+    linhas = np.arange(valores.shape[0])
+    valido = ultima > inicio
+    primeira_col, ultima_col = np.where(valido, inicio, 0), np.where(valido, ultima, 0)
+    y0, y1 = valores[linhas, primeira_col], valores[linhas, ultima_col]
+    with np.errstate(divide="ignore", invalid="ignore"):
+        inclinacao = (y1 - y0) / (anos[ultima_col] - anos[primeira_col])
+    previsao = y1[:, None] + inclinacao[:, None] * (anos_alvo[None, :] - anos[ultima_col][:, None])
+    previsao[~valido] = np.nan
+    return previsao
+
+def _ajustar_holt(valores, alfas, betas, phis):
+    """
+    Ajusta Holt para cada combinação (alfa, beta, phi) e cada local ao mesmo tempo.
+
+    Retorna nível, tendência e phi finais do melhor parâmetro de cada local
+    (menor soma dos erros quadráticos um passo à frente).
+    """
+    preenchida, inicio = _preencher(valores)
+    grade = np.array([(a, b, p) for a in alfas for b in betas for p in phis])
+    alfa, beta, phi = (grade[:, i][:, None] for i in range(3))
+    n_grade, (n_locais, n_anos) = len(grade), preenchida.shape
+
+    nivel = np.full((n_grade, n_locais), np.nan)
+    tendencia = np.zeros((n_grade, n_locais))
+    sse = np.zeros((n_grade, n_locais))
+    for t in range(n_anos):
+        y = preenchida[:, t]
+        # Cada local está em uma de três fases: primeira observação (inicia o nível),
+        # segunda (inicia a tendência) ou recursão de Holt
+        comeca, segundo, segue = inicio == t, inicio == t - 1, inicio < t - 1
+        with np.errstate(invalid="ignore"):
+            previsto = nivel + phi * tendencia
+            sse += np.where(segue, (y - previsto) ** 2, 0.0)
+            novo_nivel = alfa * y + (1 - alfa) * previsto
+            nova_tendencia = beta * (novo_nivel - nivel) + (1 - beta) * phi * tendencia
+        tendencia = np.where(segue, nova_tendencia, np.where(segundo, y - nivel, tendencia))
+        nivel = np.where(segue, novo_nivel, np.where(comeca | segundo, y, nivel))
+
+    melhor = np.argmin(sse, axis=0)
+    colunas = np.arange(n_locais)
+    nivel, tendencia = nivel[melhor, colunas], tendencia[melhor, colunas]
+    # Séries com menos de duas observações não têm tendência
+    nivel[inicio > n_anos - 2] = np.nan
+    return nivel, tendencia, grade[melhor, 2]
+
+def _prever_holt(valores, anos, anos_alvo, phis):
+    nivel, tendencia, phi = _ajustar_holt(valores, ALFAS, BETAS, phis)
+    passos = (anos_alvo - anos[-1]).astype(int)
+    # Soma phi + phi^2 + ... + phi^h para cada horizonte h
+    potencias = phi[:, None] ** np.arange(1, passos.max() + 1)[None, :]
+    acumulado = np.cumsum(potencias, axis=1)[:, passos - 1]
+    return nivel[:, None] + acumulado * tendencia[:, None]
+
+def prever_matriz(valores, anos, anos_alvo, modelo="holt"):
+    """
+    Prevê os `anos_alvo` (posteriores ao último ano de `anos`) para todas as
+    linhas de `valores` com o modelo indicado. Séries com menos de duas
+    observações ficam com NaN (exceto no modelo "naive").
+    """
+    valores = np.asarray(valores, dtype=float)
+    anos = np.asarray(anos, dtype=float)
+    anos_alvo = np.asarray(anos_alvo, dtype=float)
+    if modelo == "naive":
+        return _prever_naive(valores, anos, anos_alvo)
+    if modelo == "drift":
+        return _prever_drift(valores, anos, anos_alvo)
+    if modelo == "holt":
+        return _prever_holt(valores, anos, anos_alvo, (1.0,))
+    if modelo == "amortecido":
+        return _prever_holt(valores, anos, anos_alvo, PHIS_AMORTECIDO)
+    raise ValueError(f"Modelo desconhecido: {modelo}. Opções: {MODELOS}")
+
+def _avaliar_origem(valores, anos, origem, horizonte, modelos):
+    """Erros absolutos (modelos x locais x horizonte) de uma origem do backtest."""
+    treino, teste = valores[:, :origem], valores[:, origem:origem + horizonte]
+    anos_teste = anos[origem:origem + horizonte]
+    return np.stack([np.abs(prever_matriz(treino, anos[:origem], anos_teste, modelo) - teste)
+                     for modelo in modelos])
+
+def backtest(valores, anos, horizonte=2, n_origens=3, modelos=MODELOS, max_workers=None):
+    """
+    Backtest com origem móvel: para cada uma das últimas `n_origens` origens,
+    treina com os anos anteriores e prevê os `horizonte` anos seguintes.
+
+    Retorna uma matriz (modelos x locais) com o erro absoluto médio de cada
+    modelo em cada local (NaN se o local não pôde ser avaliado).
+    """
+    valores = np.asarray(valores, dtype=float)
+    anos = np.asarray(anos, dtype=float)
+    ultima_origem = valores.shape[1] - horizonte
+    origens = [o for o in range(ultima_origem - n_origens + 1, ultima_origem + 1) if o >= 2]
+    if not origens:
+        return np.full((len(modelos), valores.shape[0]), np.nan)
+
+    argumentos = [(valores, anos, origem, horizonte, modelos) for origem in origens]
+    max_workers = min(max_workers or os.cpu_count() or 1, len(origens))
+    if max_workers == 1 or valores.shape[0] * len(origens) < MINIMO_PARALELO:
+        erros = [_avaliar_origem(*args) for args in argumentos]
+    else:
+        with ProcessPoolExecutor(max_workers=max_workers) as executor:
+            erros = list(executor.map(_avaliar_origem, *zip(*argumentos)))
+
+    erros = np.concatenate(erros, axis=2)
+    validos = ~np.isnan(erros)
+    soma = np.where(validos, erros, 0.0).sum(axis=2)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return soma / validos.sum(axis=2)
+
+def selecionar_modelos(erros, modelos=MODELOS, padrao="drift"):
+    """Escolhe, para cada local, o modelo de menor erro no backtest (`padrao` se nenhum foi avaliado)."""
+    sem_erro = np.isnan(erros).all(axis=0)
+    melhor = np.argmin(np.where(np.isnan(erros), np.inf, erros), axis=0)
+    escolhidos = np.asarray(modelos, dtype=object)[melhor]
+    escolhidos[sem_erro] = padrao
+    return escolhidos
+
+def prever_por_modelo(valores, anos, anos_alvo, escolhidos):
+    """Prevê cada linha com o modelo escolhido para ela; cada modelo é ajustado uma vez sobre suas linhas."""
+    valores = np.asarray(valores, dtype=float)
+    resultado = np.full((valores.shape[0], len(anos_alvo)), np.nan)
+    for modelo in np.unique(escolhidos):
+        linhas = escolhidos == modelo
+        resultado[linhas] = prever_matriz(valores[linhas], anos, anos_alvo, modelo)
+    return resultado
@@ -2,6 +2,10 @@ import os
 import requests
 import pandas as pd
 
+from armazenamento import caminho_intermediario, salvar_tabela
+from consulta_sidra import obter_dados_sidra_particionado
+from instrumentacao import instrumentar
+
 # URL da API SIDRA para a Tabela 1757
 url = "https://apisidra.ibge.gov.br/values/t/1757/p/2007-2022/n1/1/n3/all/v/allxp"
 
@@ -10,16 +14,18 @@ def verificar_criar_diretorio(diretorio):
     if not os.path.exists(diretorio):
         os.makedirs(diretorio)
 
-# Função para fazer a requisição à API SIDRA
+# Função para fazer a requisição à API SIDRA (com cache em disco e revalidação condicional).
+# Consultas grandes são divididas em partições baixadas em paralelo (ver consulta_sidra.py).
+@instrumentar()
 def obter_dados_sidra(url):
-    response = requests.get(url)
-    if response.status_code == 200:
-        return response.json()
-    else:
-        print(f"Erro na requisição: {response.status_code}")
+    try:
+        return obter_dados_sidra_particionado(url)
+    except (requests.RequestException, FileNotFoundError) as erro:
+        print(f"Erro na requisição: {erro}")
         return None
 
 # Função para ajustar o DataFrame, com cabeçalho e conversão de colunas
+@instrumentar()
 def ajustar_dataframe(data):
     df = pd.DataFrame(data)
     df.columns = df.iloc[0]  # Definir a primeira linha como cabeçalho
@@ -28,6 +34,7 @@ def ajustar_dataframe(data):
     return df
 
 # Função para filtrar os dados entre os anos especificados
+@instrumentar()
 def filtrar_dados_por_ano(df, inicio, fim):
     return df[df['Ano'].between(inicio, fim)]
 
@@ -36,8 +43,16 @@ def salvar_csv(df, caminho):
     df.to_csv(caminho, index=False)
     print(f"Arquivo salvo em: {caminho}")
 
-# Função principal para executar todas as etapas
-def processar_dados_sidra(url, output_dir):
+# Função para salvar o DataFrame no formato intermediário tipado (ver armazenamento.py)
+@instrumentar()
+def salvar_intermediario(df, caminho):
+    salvar_tabela(df, caminho)
+    print(f"Arquivo salvo em: {caminho}")
+
+# Função principal para executar todas as etapas.
+# Retorna os dados de 2007 a 2022 (None em caso de erro); com salvar=False, nada é gravado em disco.
+@instrumentar()
+def processar_dados_sidra(url, output_dir, salvar=True):
     verificar_criar_diretorio(output_dir)
 
     # Obter dados da API SIDRA
@@ -53,16 +68,23 @@ def processar_dados_sidra(url, output_dir):
             df_2007_2020 = filtrar_dados_por_ano(df, 2007, 2020)
             df_2021_2022 = filtrar_dados_por_ano(df, 2021, 2022)
             
-            # Salvar os arquivos CSV
-            salvar_csv(df_2007_2020, f'{output_dir}/dados_2007_2020.csv')
-            salvar_csv(df_2021_2022, f'{output_dir}/dados_2021_2022.csv')
+            # Salvar os arquivos intermediários
+            if salvar:
+                salvar_intermediario(df_2007_2020, caminho_intermediario("dados_2007_2020", output_dir))
+                salvar_intermediario(df_2021_2022, caminho_intermediario("dados_2021_2022", output_dir))
+            return pd.concat([df_2007_2020, df_2021_2022], ignore_index=True)
         else:
             print("A coluna 'Ano' não foi encontrada após o ajuste do cabeçalho.")
     else:
         print("Dados vazios ou inválidos retornados pela API.")
+    return None
+
+def main():
+    # Definir o diretório de destino
+    output_dir = 'data'
 
-# Definir o diretório de destino
-output_dir = 'data'
+    # Chamar a função principal
+    processar_dados_sidra(url, output_dir)
 
-# Chamar a função principal
-processar_dados_sidra(url, output_dir)
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,155 @@
+"""
+Motor de razões entre variáveis de várias tabelas da SIDRA e a população.
+
+A consulta `v/allxp` da Tabela 1757 traz todas as variáveis da tabela (número de
+empresas ativas, pessoal ocupado, valor das obras...), mas a análise usa apenas
+o número de empresas. Aqui cada razão é descrita por uma especificação
+(numerador, denominador, tabela, variável):
+- `numerador`: "populacao" (projeções do IBGE, como na análise) ou o nome de
+  outra variável da mesma tabela;
+- `denominador`: nome do denominador usado no nome da razão
+  ("Razão População/<denominador>");
+- `tabela`: tabela da SIDRA de onde vêm as variáveis (chave de `tabelas`);
+- `variavel`: variável da tabela usada como denominador, de preferência pelo
+  código da SIDRA ("Variável (Código)", ex.: "706"). Também é aceito o nome
+  exato ou, se houver uma única, a variável cujo nome começa com o texto
+  indicado. Uma especificação que não corresponde a nenhuma variável da tabela
+  (ou que corresponde a mais de uma) levanta ValueError.
+
+Todas as razões são calculadas de uma vez sobre o painel já carregado: as
+variáveis usadas formam um cubo (variáveis x locais x anos) montado com uma
+única atribuição indexada por tabela, e numeradores e denominadores são
+empilhados e divididos em uma só operação. As razões entram no painel como
+métricas (ver `Painel.metrica`), prontas para a clusterização e os gráficos.
+"""
+from collections import namedtuple
+
+import numpy as np
+import pandas as pd
+
+from instrumentacao import instrumentar
+
+Razao = namedtuple("Razao", ["numerador", "denominador", "tabela", "variavel"])
+
+TABELA_PADRAO = "1757"
+
+# Razões calculadas pela análise além de População/Empresas (variáveis da Tabela 1757 pelo código)
+RAZOES_PADRAO = (
+    Razao("populacao", "Pessoal ocupado", TABELA_PADRAO, "706"),
+    Razao("populacao", "Pessoal assalariado", TABELA_PADRAO, "707"),
+)
+
+# Colunas de local das tabelas da SIDRA, em ordem de preferência
+COLUNAS_LOCAL = ("LOCAL", "Brasil e Unidade da Federação", "Unidade da Federação",
+                 "Brasil, Grande Região e Unidade da Federação", "Município")
+
+COLUNAS_VARIAVEIS = ["Ano", "Variável", "Variável (Código)", "Valor"]
+
+def nome_razao(especificacao):
+    """Nome da métrica de uma especificação (ex.: "Razão População/Pessoal ocupado")."""
+    numerador = "População" if especificacao.numerador == "populacao" else especificacao.numerador
+    return f"Razão {numerador}/{especificacao.denominador}"
+
+def coluna_local(colunas):
+    """Coluna de local de uma tabela da SIDRA."""
+    for coluna in COLUNAS_LOCAL:
+        if coluna in colunas:
+            return coluna
+    raise KeyError(f"Nenhuma coluna de local encontrada ({', '.join(COLUNAS_LOCAL)}).")
+
+def carregar_variaveis(caminho):
+    """Lê de uma tabela intermediária da SIDRA apenas as colunas usadas pelo motor de razões."""
+    from armazenamento import colunas_tabela, ler_tabela
+
+    colunas = colunas_tabela(caminho)
+    return ler_tabela(caminho, colunas=[coluna_local(colunas)] + [c for c in COLUNAS_VARIAVEIS if c in colunas])
+
+def resolver_variavel(df, texto):
+    """Nome da variável de `df` indicada por `texto` (nome, código ou início único do nome); None se não houver."""
+    nomes = pd.unique(df["Variável"].astype(str))
+    if texto in nomes:
+        return texto
+    if "Variável (Código)" in df:
+        codigos = df.drop_duplicates("Variável")
+        encontrados = codigos.loc[codigos["Variável (Código)"].astype(str) == str(texto), "Variável"]
+        if len(encontrados):
+            return str(encontrados.iloc[0])
+    prefixados = [nome for nome in nomes if nome.startswith(texto)]
+    return prefixados[0] if len(prefixados) == 1 else None
+
+def variaveis_disponiveis(df):
+    """Código e nome das variáveis de uma tabela da SIDRA, para mensagens de erro."""
+    if df is None:
+        return "tabela não carregada"
+    if "Variável (Código)" not in df:
+        return ", ".join(pd.unique(df["Variável"].astype(str)))
+    pares = df[["Variável (Código)", "Variável"]].drop_duplicates().astype(str)
+    return ", ".join(f"{codigo} ({nome})" for codigo, nome in pares.itertuples(index=False))
+
+@instrumentar()
+def calcular_razoes(painel, tabelas, especificacoes=RAZOES_PADRAO):
+    """
+    Retorna um novo painel com as razões das `especificacoes` como métricas.
+
+    `tabelas` mapeia o código da tabela da SIDRA para a tabela longa dessa
+    consulta (colunas de local, "Ano", "Variável" e "Valor"); um único
+    DataFrame é tratado como a Tabela 1757. Levanta ValueError, com as
+    variáveis disponíveis, se alguma especificação não puder ser resolvida.
+    """
+    if isinstance(tabelas, pd.DataFrame):
+        tabelas = {TABELA_PADRAO: tabelas}
+    especificacoes = [Razao(*especificacao) for especificacao in especificacoes]
+
+    # Variáveis usadas (tabela, nome) e, para cada razão, a posição do numerador e do denominador
+    termos, posicoes, validas = [], [], []
+    def posicao(tabela, variavel):
+        if variavel == "populacao":
+            return 0
+        if tabela not in tabelas:
+            return None
+        nome = resolver_variavel(tabelas[tabela], variavel)
+        if nome is None:
+            return None
+        if (tabela, nome) not in termos:
+            termos.append((tabela, nome))
+        return termos.index((tabela, nome)) + 1
+
+    nao_resolvidas = []
+    for especificacao in especificacoes:
+        numerador = posicao(especificacao.tabela, especificacao.numerador)
+        denominador = posicao(especificacao.tabela, especificacao.variavel)
+        if numerador is None or denominador is None:
+            nao_resolvidas.append(especificacao)
+            continue
+        posicoes.append((numerador, denominador))
+        validas.append(especificacao)
+    if nao_resolvidas:
+        raise ValueError("Razões com variáveis ausentes ou ambíguas: " + "; ".join(
+            f"{nome_razao(e)} ({e.numerador!r}/{e.variavel!r} na tabela {e.tabela}; disponíveis: "
+            f"{variaveis_disponiveis(tabelas.get(e.tabela))})" for e in nao_resolvidas))
+    if not validas:
+        return painel
+
+    # Cubo (população + variáveis) x locais x anos, com uma atribuição por tabela
+    cubo = np.full((len(termos) + 1, len(painel), len(painel.anos)), np.nan)
+    cubo[0] = painel.populacao
+    indice_locais = pd.Index(painel.locais.astype(str))
+    indice_anos = pd.Index(painel.anos)
+    for tabela, df in tabelas.items():
+        usados = [i + 1 for i, (origem, _) in enumerate(termos) if origem == tabela]
+        if not usados:
+            continue
+        variaveis = pd.Index([nome for origem, nome in termos if origem == tabela]).get_indexer(
+            df["Variável"].astype(str))
+        linhas = indice_locais.get_indexer(df[coluna_local(df.columns)].astype(str))
+        colunas = indice_anos.get_indexer(pd.to_numeric(df["Ano"], errors="coerce"))
+        valores = pd.to_numeric(df["Valor"], errors="coerce").to_numpy(dtype=float)
+        manter = (variaveis >= 0) & (linhas >= 0) & (colunas >= 0)
+        cubo[np.asarray(usados)[variaveis[manter]], linhas[manter], colunas[manter]] = valores[manter]
+
+    # Todas as razões em uma única divisão (razões x locais x anos)
+    numeradores, denominadores = (np.asarray(indices) for indices in zip(*posicoes))
+    with np.errstate(divide="ignore", invalid="ignore"):
+        razoes = cubo[numeradores] / cubo[denominadores]
+    razoes[~np.isfinite(razoes)] = np.nan
+    return painel.com_metricas({nome_razao(especificacao): matriz for especificacao, matriz in zip(validas, razoes)})
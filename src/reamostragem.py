@@ -0,0 +1,198 @@
+"""
+Incerteza da classificação de estados saturados e com oportunidades (bootstrap).
+
+`identificar_oportunidades_e_saturacao` compara a razão média de 2021 e 2022 de
+cada estado com os percentis 25 e 75 entre os estados. Aqui essa comparação é
+repetida em milhares de réplicas bootstrap em que as razões dos anos-alvo são
+perturbadas por erros relativos sorteados com reposição:
+- células observadas: resíduos relativos do próprio estado em torno da sua reta
+  de tendência (variação ano a ano);
+- células estimadas: erros relativos das previsões do backtest com origem móvel
+  (mesmo método da análise), reunidos entre os estados para cada horizonte.
+
+Em cada réplica, os percentis também são recalculados. O resultado é, por
+estado, a probabilidade de ficar saturado ou com oportunidades e o intervalo de
+confiança da razão média.
+
+As réplicas são geradas em blocos como arrays (réplicas x estados x anos), sem
+laço por réplica; a memória fica limitada ao tamanho do bloco. Os intervalos vêm
+de um histograma por estado com limites conhecidos de antemão (os erros
+possíveis são finitos), acumulado bloco a bloco. O resultado não depende do
+tamanho do bloco.
+"""
+import numpy as np
+import pandas as pd
+
+from extrapolacao import _reta_minimos_quadrados
+from instrumentacao import instrumentar
+
+N_REPLICAS = 10_000
+
+# Número máximo de células (réplicas x estados x anos) geradas por bloco
+MAXIMO_CELULAS_BLOCO = 2_000_000
+
+# Resolução dos histogramas usados nos intervalos de confiança
+N_FAIXAS_HISTOGRAMA = 1000
+
+def residuos_relativos(valores, anos):
+    """Resíduos relativos (valor / tendência - 1) de cada série em torno da sua reta de mínimos quadrados."""
+    observado = ~np.isnan(valores)
+    intercepto, inclinacao = _reta_minimos_quadrados(valores, anos, observado)
+    tendencia = intercepto[:, None] + inclinacao[:, None] * anos[None, :]
+    with np.errstate(divide="ignore", invalid="ignore"):
+        residuos = valores / tendencia - 1
+    # Correção dos graus de liberdade da reta (dois parâmetros)
+    n = observado.sum(axis=1, keepdims=True)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        residuos *= np.sqrt(n / (n - 2))
+    residuos[(n < 3).ravel()] = np.nan
+    return residuos
+
+def prever(treino, anos_treino, anos_alvo, metodo="automatico", escolhidos=None):
+    """Previsões dos `anos_alvo` com o método da análise (extrapolacao.py ou previsao.py)."""
+    from extrapolacao import METODOS, extrapolar_matriz
+    from previsao import prever_por_modelo
+
+    if metodo in METODOS:
+        return extrapolar_matriz(treino, anos_treino, anos_alvo, metodo=metodo)
+    if metodo != "automatico" or escolhidos is None:
+        escolhidos = np.full(treino.shape[0], "drift" if metodo == "automatico" else metodo, dtype=object)
+    return prever_por_modelo(treino, anos_treino, anos_alvo, escolhidos)
+
+def erros_relativos_previsao(valores, anos, horizonte=2, n_origens=3, metodo="automatico", escolhidos=None):
+    """
+    Erros relativos (previsto / observado - 1) do backtest com origem móvel,
+    reunidos entre todos os locais: lista com um vetor de erros por horizonte.
+    """
+    ultima_origem = valores.shape[1] - horizonte
+    relativos = []
+    for origem in range(max(2, ultima_origem - n_origens + 1), ultima_origem + 1):
+        previsto = prever(valores[:, :origem], anos[:origem], anos[origem:origem + horizonte], metodo, escolhidos)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            relativos.append(previsto / valores[:, origem:origem + horizonte] - 1)
+    if not relativos:
+        return [np.array([]) for _ in range(horizonte)]
+    relativos = np.concatenate(relativos)
+    return [relativos[:, h][np.isfinite(relativos[:, h])] for h in range(horizonte)]
+
+def _compactar(residuos):
+    """Move os valores definidos de cada linha para o início; retorna a matriz e o número de valores por linha."""
+    definidos = ~np.isnan(residuos)
+    ordem = np.argsort(~definidos, axis=1, kind="stable")
+    return np.take_along_axis(residuos, ordem, axis=1), definidos.sum(axis=1)
+
+def _quantis_histograma(contagens, inicio, largura, quantis):
+    """Quantis de cada linha a partir de histogramas (linhas x faixas), interpolando dentro da faixa."""
+    acumulado = np.cumsum(contagens, axis=1)
+    total = acumulado[:, -1]
+    linhas = np.arange(len(contagens))
+    resultado = []
+    for q in quantis:
+        alvo = q * total
+        faixa = np.minimum((acumulado < alvo[:, None]).sum(axis=1), contagens.shape[1] - 1)
+        anterior = np.where(faixa > 0, acumulado[linhas, np.maximum(faixa - 1, 0)], 0)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            fracao = np.clip((alvo - anterior) / contagens[linhas, faixa], 0, 1)
+        resultado.append(inicio + (faixa + np.nan_to_num(fracao)) * largura)
+    return resultado
+
+@instrumentar()
+def probabilidades_classificacao(painel, anos_alvo=(2021, 2022), percentis=(25, 75), n_replicas=N_REPLICAS,
+                                 metodo="automatico", modelos_por_local=None, nivel=0.95, semente=42,
+                                 tamanho_bloco=None):
+    """
+    Probabilidade bootstrap de cada local ficar saturado (razão média acima do
+    percentil alto) ou com oportunidades (abaixo do percentil baixo).
+
+    As células dos `anos_alvo` sem número de empresas observado são tratadas como
+    estimadas; `metodo` e `modelos_por_local` (saída de `avaliar_previsoes`) são
+    os da análise e definem os erros de previsão. Retorna um DataFrame por local
+    com a razão média, o intervalo de confiança de nível `nivel`, a situação
+    pelos percentis originais e as probabilidades.
+    """
+    anos_alvo = list(anos_alvo)
+    colunas = painel.colunas_anos(anos_alvo)
+    razao = painel.razao[:, colunas]
+    validos = ~np.isnan(razao).all(axis=1)
+    locais, razao = painel.locais[validos], razao[validos]
+    estimado = np.isnan(painel.empresas[validos][:, colunas]) & ~np.isnan(razao)
+
+    # Erros possíveis de cada célula: resíduos do próprio local ou erros do backtest por horizonte
+    treino = painel.anos < min(anos_alvo)
+    historico, anos_treino = painel.razao[validos][:, treino], painel.anos[treino].astype(float)
+    # Os resíduos usam apenas as razões observadas (sem as estimativas dos anos-alvo)
+    observadas = painel.razao[validos].copy()
+    observadas[:, colunas] = np.where(estimado, np.nan, razao)
+    residuos, n_residuos = _compactar(residuos_relativos(observadas, painel.anos.astype(float)))
+    escolhidos = None
+    if modelos_por_local is not None:
+        escolhidos = (modelos_por_local.set_index("LOCAL")["Modelo"].astype(object)
+                      .reindex(locais).fillna("drift").to_numpy(dtype=object))
+    erros_previsao = erros_relativos_previsao(historico, anos_treino, horizonte=len(anos_alvo),
+                                              metodo=metodo, escolhidos=escolhidos)
+    n_erros = np.array([len(erros) for erros in erros_previsao])
+    tabela_previsao = np.zeros((len(anos_alvo), max(n_erros.max(), 1)))
+    for h, erros in enumerate(erros_previsao):
+        tabela_previsao[h, :len(erros)] = erros
+
+    # Limites da razão média em qualquer réplica (para os histogramas)
+    menor_residuo = np.nanmin(residuos, axis=1, initial=np.inf)
+    maior_residuo = np.nanmax(residuos, axis=1, initial=-np.inf)
+    menor_residuo[n_residuos == 0] = maior_residuo[n_residuos == 0] = 0.0
+    menor_erro = np.array([erros.min() if len(erros) else 0.0 for erros in erros_previsao])
+    maior_erro = np.array([erros.max() if len(erros) else 0.0 for erros in erros_previsao])
+    menor = np.where(estimado, menor_erro[None, :], menor_residuo[:, None])
+    maior = np.where(estimado, maior_erro[None, :], maior_residuo[:, None])
+    inicio = np.nanmean(razao * (1 + menor), axis=1)
+    largura = np.maximum(np.nanmean(razao * (1 + maior), axis=1) - inicio, 1e-12) / N_FAIXAS_HISTOGRAMA
+
+    # Todos os erros possíveis em um único vetor (resíduos por local, erros por
+    # horizonte e um zero para as células sem erros), com o início e o tamanho do
+    # trecho de cada célula: cada sorteio vira um único acesso indexado
+    n_locais, n_anos = razao.shape
+    tabela = np.concatenate([residuos.ravel(), tabela_previsao.ravel(), [0.0]])
+    inicio_trecho = np.where(estimado, residuos.size + np.arange(n_anos)[None, :] * tabela_previsao.shape[1],
+                             np.arange(n_locais)[:, None] * residuos.shape[1])
+    tamanho_trecho = np.where(estimado, n_erros[None, :], n_residuos[:, None])
+    inicio_trecho[tamanho_trecho == 0] = len(tabela) - 1
+    tamanho_trecho = np.maximum(tamanho_trecho, 1)
+    presentes = ~np.isnan(razao)
+    base = np.where(presentes, razao, 0.0) / presentes.sum(axis=1, keepdims=True)
+
+    tamanho_bloco = tamanho_bloco or max(1, MAXIMO_CELULAS_BLOCO // (n_locais * n_anos))
+    rng = np.random.default_rng(semente)
+    saturado = np.zeros(n_locais)
+    oportunidade = np.zeros(n_locais)
+    histograma = np.zeros(n_locais * N_FAIXAS_HISTOGRAMA, dtype=np.int64)
+    deslocamento = np.arange(n_locais) * N_FAIXAS_HISTOGRAMA
+
+    for inicio_bloco in range(0, n_replicas, tamanho_bloco):
+        b = min(tamanho_bloco, n_replicas - inicio_bloco)
+        # Um sorteio por célula: posição no trecho de erros possíveis daquela célula
+        sorteio = rng.random((b, n_locais, n_anos))
+        erros = tabela[inicio_trecho + (sorteio * tamanho_trecho).astype(np.intp)]
+        # Razão média de cada réplica (anos sem razão não entram na média)
+        media = (base * (1 + erros)).sum(axis=2)
+
+        baixo, alto = np.percentile(media, percentis, axis=1)
+        saturado += (media > alto[:, None]).sum(axis=0)
+        oportunidade += (media < baixo[:, None]).sum(axis=0)
+        faixas = np.clip(((media - inicio) / largura).astype(np.intp), 0, N_FAIXAS_HISTOGRAMA - 1)
+        histograma += np.bincount((faixas + deslocamento).ravel(), minlength=len(histograma))
+
+    alfa = (1 - nivel) / 2
+    inferior, superior = _quantis_histograma(histograma.reshape(n_locais, N_FAIXAS_HISTOGRAMA), inicio, largura,
+                                             (alfa, 1 - alfa))
+    media = np.nanmean(razao, axis=1)
+    baixo, alto = np.percentile(media, percentis)
+    situacao = np.select([media > alto, media < baixo], ["Saturado", "Oportunidade"], default="Neutro")
+    rotulo = f"{nivel:.0%}".replace(".", ",")
+    return pd.DataFrame({
+        "LOCAL": locais,
+        f"Razão média {anos_alvo[0]}-{anos_alvo[-1]}": media,
+        f"IC {rotulo} inferior": inferior,
+        f"IC {rotulo} superior": superior,
+        "Situação": situacao,
+        "P(saturado)": saturado / n_replicas,
+        "P(oportunidade)": oportunidade / n_replicas,
+    }).sort_values(["P(saturado)", "P(oportunidade)"], ascending=[False, True], ignore_index=True)
@@ -0,0 +1,316 @@
+"""
+Serviço HTTP/JSON local para consultar o resultado da análise.
+
+Carrega uma vez o arquivo intermediário `merged_data` (gravado por
+`analize.salvar_dados`) em um painel indexado por local e ano (ver painel.py) e
+pré-calcula o cubo de agregação geográfica (ver cubo_geografico.py), a situação de cada local em cada ano (saturado, oportunidade ou
+neutro, pelos percentis 25 e 75 da razão naquele ano) e o ranking geral pela
+média de 2021 e 2022, como em `identificar_oportunidades_e_saturacao`. As
+respostas já codificadas ficam em um cache LRU. Uma thread verifica a data de
+modificação do arquivo e, quando uma nova saída aparece, recarrega o índice e
+descarta o cache, sem interromper o serviço.
+
+Rotas (GET):
+    /local?uf=<nome>[&ano=<ano>]     razão, população, empresas, cluster e situação
+    /ranking?tipo=oportunidades|saturados[&n=10][&ano=<ano>]
+    /clusters                        locais de cada cluster
+    /agregado?nivel=<nível>[&ano=<ano>]      totais de todos os nós de um nível (Brasil, Região, UF)
+    /agregado?local=<nome|código>[&ano=<ano>] totais do local, dos níveis acima e dos nós abaixo
+    /saude                           arquivo carregado, horário, locais e anos
+
+Uso:
+    python src/servico_consultas.py [--porta 8000] [--arquivo data/merged_data.parquet]
+"""
+import argparse
+import functools
+import json
+import math
+import os
+import threading
+import time
+import unicodedata
+from datetime import datetime, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qsl, urlsplit
+
+import numpy as np
+
+from armazenamento import caminho_intermediario, ler_tabela
+from cubo_geografico import CuboGeografico
+from painel import Painel
+
+ANOS_ALVO = (2021, 2022)
+PERCENTIS = (25, 75)
+TAMANHO_CACHE = 4096
+INTERVALO_VERIFICACAO = 2.0
+
+class ErroConsulta(Exception):
+    """Consulta inválida; `status` é o código HTTP da resposta."""
+
+    def __init__(self, mensagem, status=400):
+        super().__init__(mensagem)
+        self.status = status
+
+def normalizar_nome(nome):
+    """Nome sem acentos, em minúsculas e sem espaços extras ("São Paulo" -> "sao paulo")."""
+    sem_acentos = unicodedata.normalize("NFKD", str(nome)).encode("ascii", "ignore").decode("ascii")
+    return " ".join(sem_acentos.lower().split())
+
+def _numero(valor):
+    """Converte valores NumPy para JSON (NaN vira None)."""
+    valor = float(valor)
+    return None if math.isnan(valor) else valor
+
+def _situacoes(razao):
+    """Matriz locais x colunas com "saturado", "oportunidade", "neutro" ou None, pelos percentis de cada coluna."""
+    situacao = np.full(razao.shape, None, dtype=object)
+    colunas_validas = (~np.isnan(razao)).any(axis=0)
+    if not colunas_validas.any():
+        return situacao
+    baixo, alto = np.nanpercentile(razao[:, colunas_validas], PERCENTIS, axis=0)
+    valores = razao[:, colunas_validas]
+    parcial = np.where(np.isnan(valores), None, "neutro").astype(object)
+    parcial[valores > alto] = "saturado"
+    parcial[valores < baixo] = "oportunidade"
+    situacao[:, colunas_validas] = parcial
+    return situacao
+
+class IndiceConsultas:
+    """Estruturas em memória, imutáveis depois de construídas, usadas para responder às consultas."""
+
+    def __init__(self, painel, arquivo=None):
+        self.cubo = CuboGeografico.de_painel(painel)
+        self.painel = painel.sem_locais("Brasil")
+        self.arquivo = arquivo
+        self.carregado_em = datetime.now(timezone.utc).isoformat(timespec="seconds")
+        self.por_nome = {normalizar_nome(local): i for i, local in enumerate(self.painel.locais)}
+        self.situacao = _situacoes(self.painel.razao)
+
+        # Média de 2021 e 2022 (anos observados), situação geral e rankings já ordenados
+        colunas = self.painel.colunas_anos(ANOS_ALVO)
+        valores = self.painel.razao[:, colunas]
+        observados = ~np.isnan(valores)
+        with np.errstate(invalid="ignore"):
+            self.media = np.where(observados, valores, 0.0).sum(axis=1) / observados.sum(axis=1)
+        self.situacao_geral = _situacoes(self.media[:, None])[:, 0]
+        self.ordem_geral = self._ordenar(self.media)
+        self.ordem_por_ano = [self._ordenar(self.painel.razao[:, j]) for j in range(len(self.painel.anos))]
+
+    @classmethod
+    def de_arquivo(cls, caminho):
+        return cls(Painel.de_dataframe(ler_tabela(caminho)), arquivo=caminho)
+
+    @staticmethod
+    def _ordenar(valores):
+        """Índices dos locais com valor definido, em ordem crescente do valor."""
+        validos = np.flatnonzero(~np.isnan(valores))
+        return validos[np.argsort(valores[validos], kind="stable")]
+
+    def _linha(self, uf):
+        try:
+            return self.por_nome[normalizar_nome(uf)]
+        except KeyError:
+            raise ErroConsulta(f"Local não encontrado: {uf}", status=404) from None
+
+    def _coluna(self, ano):
+        try:
+            return self.painel.indice_ano[int(ano)]
+        except (KeyError, ValueError):
+            raise ErroConsulta(f"Ano não disponível: {ano}", status=404) from None
+
+    def local(self, uf, ano=None):
+        i = self._linha(uf)
+        cluster = None if self.painel.cluster is None else self.painel.cluster[i]
+        resposta = {
+            "local": self.painel.locais[i],
+            "cluster": None if cluster is None or cluster != cluster else int(cluster),
+            "media_razao_2021_2022": _numero(self.media[i]),
+            "situacao_geral": self.situacao_geral[i],
+        }
+        if ano is not None:
+            j = self._coluna(ano)
+            resposta.update({
+                "ano": int(self.painel.anos[j]),
+                "razao": _numero(self.painel.razao[i, j]),
+                "populacao": _numero(self.painel.populacao[i, j]),
+                "empresas": _numero(self.painel.empresas[i, j]),
+                "situacao": self.situacao[i, j],
+            })
+        return resposta
+
+    def ranking(self, tipo="oportunidades", n=10, ano=None):
+        if tipo not in ("oportunidades", "saturados"):
+            raise ErroConsulta("tipo deve ser 'oportunidades' ou 'saturados'")
+        if ano is None:
+            valores, ordem = self.media, self.ordem_geral
+        else:
+            j = self._coluna(ano)
+            valores, ordem = self.painel.razao[:, j], self.ordem_por_ano[j]
+        # Oportunidades: menores razões; saturados: maiores
+        selecionados = ordem[:n] if tipo == "oportunidades" else ordem[::-1][:n]
+        return {
+            "tipo": tipo,
+            "ano": None if ano is None else int(ano),
+            "locais": [{"local": self.painel.locais[i], "razao": _numero(valores[i])} for i in selecionados],
+        }
+
+    def clusters(self):
+        if self.painel.cluster is None:
+            return {}
+        return {str(cluster): locais for cluster, locais in sorted(self.painel.locais_por_cluster().items(),
+                                                                   key=lambda item: str(item[0]))}
+
+    def agregado(self, nivel=None, local=None, ano=None):
+        if (nivel is None) == (local is None):
+            raise ErroConsulta("Informe um dos parâmetros: nivel ou local")
+        if ano is not None:
+            ano = int(self.painel.anos[self._coluna(ano)])
+        try:
+            if nivel is not None:
+                return {"nivel": nivel, "nos": _registros(self.cubo.nivel(nivel, ano))}
+            return {"acima": _registros(self.cubo.ancestrais(local, ano)),
+                    "abaixo": _registros(self.cubo.filhos(local, ano))}
+        except KeyError as erro:
+            raise ErroConsulta(erro.args[0], status=404) from None
+
+    def saude(self):
+        return {"arquivo": self.arquivo, "carregado_em": self.carregado_em, "locais": len(self.painel),
+                "anos": [int(ano) for ano in self.painel.anos]}
+
+class ServicoConsultas:
+    """Índice atual, cache LRU das respostas e recarga automática do arquivo."""
+
+    def __init__(self, caminho, tamanho_cache=TAMANHO_CACHE, intervalo=INTERVALO_VERIFICACAO):
+        self.caminho = caminho
+        self.intervalo = intervalo
+        self._trava = threading.Lock()
+        self._mtime = None
+        # (geração, índice), trocados juntos a cada recarga; a geração faz parte da chave do cache
+        self._atual = (0, None)
+        self.responder = functools.lru_cache(maxsize=tamanho_cache)(self._responder)
+        self.recarregar_se_mudou()
+
+    @property
+    def indice(self):
+        return self._atual[1]
+
+    def recarregar_se_mudou(self):
+        """Recarrega o índice se o arquivo mudou desde a última carga; retorna True se recarregou."""
+        try:
+            mtime = os.stat(self.caminho).st_mtime_ns
+        except FileNotFoundError:
+            return False
+        with self._trava:
+            if mtime == self._mtime:
+                return False
+            try:
+                indice = IndiceConsultas.de_arquivo(self.caminho)
+            except Exception as erro:
+                # Arquivo ainda sendo gravado ou inválido: mantém o índice anterior
+                print(f"Falha ao carregar {self.caminho}: {erro}")
+                return False
+            # Troca atômica: consultas em andamento terminam com o índice anterior
+            self._atual, self._mtime = (self._atual[0] + 1, indice), mtime
+            self.responder.cache_clear()
+        print(f"Dados carregados de {self.caminho} ({len(indice.painel)} locais).")
+        return True
+
+    def vigiar(self):
+        """Inicia a thread que verifica periodicamente se há uma nova saída da análise."""
+        def verificar():
+            while True:
+                time.sleep(self.intervalo)
+                self.recarregar_se_mudou()
+
+        threading.Thread(target=verificar, name="vigia-merged-data", daemon=True).start()
+
+    def _responder(self, geracao, rota, consulta):
+        """
+        Resposta (status, corpo JSON codificado) para a rota e a consulta (tupla
+        ordenada de pares), com o índice da geração indicada ou de uma posterior.
+        """
+        # Uma resposta guardada sob a geração atual nunca vem de um índice anterior a ela,
+        # mesmo que a consulta tenha começado antes de uma recarga
+        indice = self._atual[1]
+        if indice is None:
+            return 503, _json({"erro": f"Arquivo {self.caminho} ainda não disponível."})
+        parametros = dict(consulta)
+        try:
+            if rota == "/local":
+                if "uf" not in parametros:
+                    raise ErroConsulta("Parâmetro obrigatório: uf")
+                resposta = indice.local(parametros["uf"], parametros.get("ano"))
+            elif rota == "/ranking":
+                try:
+                    n = int(parametros.get("n", 10))
+                except ValueError:
+                    raise ErroConsulta("n deve ser um número inteiro") from None
+                if n < 0:
+                    raise ErroConsulta("n deve ser positivo")
+                resposta = indice.ranking(parametros.get("tipo", "oportunidades"), n, parametros.get("ano"))
+            elif rota == "/clusters":
+                resposta = indice.clusters()
+            elif rota == "/agregado":
+                resposta = indice.agregado(parametros.get("nivel"), parametros.get("local"), parametros.get("ano"))
+            elif rota == "/saude":
+                resposta = indice.saude()
+            else:
+                raise ErroConsulta(f"Rota desconhecida: {rota}", status=404)
+        except ErroConsulta as erro:
+            return erro.status, _json({"erro": str(erro)})
+        return 200, _json(resposta)
+
+    def consultar(self, url):
+        """Responde a uma URL (caminho e query string)."""
+        partes = urlsplit(url)
+        consulta = tuple(sorted(parse_qsl(partes.query)))
+        geracao = self._atual[0]
+        if partes.path == "/saude":
+            # Não passa pelo cache, para refletir o horário da última carga
+            return self._responder(geracao, partes.path, consulta)
+        return self.responder(geracao, partes.path.rstrip("/") or "/", consulta)
+
+def _registros(tabela):
+    """Linhas de uma tabela do cubo como dicionários (NaN vira None)."""
+    return [{chave: _numero(valor) if isinstance(valor, float) else valor for chave, valor in linha.items()}
+            for linha in tabela.to_dict("records")]
+
+def _json(objeto):
+    return json.dumps(objeto, ensure_ascii=False).encode("utf-8")
+
+def criar_servidor(servico, host="127.0.0.1", porta=8000):
+    """Servidor HTTP (uma thread por conexão) que responde com `servico.consultar`."""
+    class Manipulador(BaseHTTPRequestHandler):
+        def do_GET(self):
+            status, corpo = servico.consultar(self.path)
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json; charset=utf-8")
+            self.send_header("Content-Length", str(len(corpo)))
+            self.end_headers()
+            self.wfile.write(corpo)
+
+        def log_message(self, formato, *args):
+            pass
+
+    return ThreadingHTTPServer((host, porta), Manipulador)
+
+def main():
+    parser = argparse.ArgumentParser(description="Serviço HTTP/JSON de consultas sobre o resultado da análise.")
+    parser.add_argument("--arquivo", default=caminho_intermediario("merged_data"))
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--porta", type=int, default=8000)
+    args = parser.parse_args()
+
+    servico = ServicoConsultas(args.arquivo)
+    servico.vigiar()
+    servidor = criar_servidor(servico, args.host, args.porta)
+    print(f"Servindo em http://{args.host}:{args.porta} (rotas: /local, /ranking, /clusters, /agregado, /saude)")
+    try:
+        servidor.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        servidor.server_close()
+
+if __name__ == "__main__":
+    main()
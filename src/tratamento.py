@@ -1,14 +1,148 @@
 import pandas as pd
 
-def load_csv_files(file_paths):
-    """Carrega e concatena múltiplos arquivos CSV em um único DataFrame."""
-    dfs = [pd.read_csv(file) for file in file_paths]
+from armazenamento import (
+    TAMANHO_BLOCO, aplicar_esquema, caminho_intermediario, colunas_tabela, ler_em_blocos, ler_tabela, salvar_tabela
+)
+from instrumentacao import instrumentar
+from perfil_colunas import formatar_perfil, perfilar_colunas
+
+class Plano:
+    """
+    Plano preguiçoso de transformações (filtros por igualdade, renomeação,
+    remoção e seleção de colunas) sobre arquivos intermediários ou um DataFrame.
+
+    Cada método retorna um novo plano, sem ler nem copiar dados. Ao executar um
+    plano sobre arquivos, os filtros e a lista de colunas necessárias são
+    repassados ao leitor (ver `armazenamento.ler_em_blocos`), que lê em blocos
+    apenas as linhas e colunas usadas; as renomeações são aplicadas no fim.
+    """
+
+    def __init__(self, fonte, filtros=(), renomeacoes=None, removidas=(), selecionadas=None):
+        # `fonte` é uma lista de caminhos ou um DataFrame; filtros, remoções e
+        # seleções guardam os nomes originais das colunas
+        self.fonte = fonte
+        self.filtros = tuple(filtros)
+        self.renomeacoes = dict(renomeacoes or {})
+        self.removidas = tuple(removidas)
+        self.selecionadas = selecionadas
+
+    def __repr__(self):
+        fonte = "DataFrame" if isinstance(self.fonte, pd.DataFrame) else list(self.fonte)
+        return (f"Plano({fonte}, filtros={list(self.filtros)}, renomeacoes={self.renomeacoes}, "
+                f"removidas={list(self.removidas)}, selecionadas={self.selecionadas})")
+
+    def _com(self, **alteracoes):
+        atributos = {"filtros": self.filtros, "renomeacoes": self.renomeacoes, "removidas": self.removidas,
+                     "selecionadas": self.selecionadas, **alteracoes}
+        return Plano(self.fonte, **atributos)
+
+    def _original(self, coluna):
+        """Nome original de uma coluna referida pelo nome atual (após as renomeações)."""
+        originais = {novo: antigo for antigo, novo in self.renomeacoes.items()}
+        if coluna not in originais and coluna in self.renomeacoes:
+            raise KeyError(f"A coluna '{coluna}' foi renomeada para '{self.renomeacoes[coluna]}'.")
+        return originais.get(coluna, coluna)
+
+    def filtrar(self, coluna, valor):
+        """Mantém apenas as linhas em que `coluna` é igual a `valor`."""
+        return self._com(filtros=self.filtros + ((self._original(coluna), valor),))
+
+    def renomear(self, antigo, novo):
+        """Renomeia a coluna `antigo` para `novo`."""
+        return self._com(renomeacoes={**self.renomeacoes, self._original(antigo): novo})
+
+    def remover(self, colunas):
+        """Remove as colunas indicadas."""
+        return self._com(removidas=self.removidas + tuple(self._original(coluna) for coluna in colunas))
+
+    def selecionar(self, colunas):
+        """Mantém apenas as colunas indicadas, nessa ordem."""
+        return self._com(selecionadas=[self._original(coluna) for coluna in colunas])
+
+    def colunas_fonte(self):
+        """Colunas da fonte, com os nomes originais (lidas do esquema dos arquivos, sem ler os dados)."""
+        if isinstance(self.fonte, pd.DataFrame):
+            return list(self.fonte.columns)
+        return list(dict.fromkeys(coluna for caminho in self.fonte for coluna in colunas_tabela(caminho)))
+
+    def _colunas_resultado(self):
+        """Colunas (nomes originais) que o resultado terá, na ordem da fonte ou da seleção."""
+        fonte = self.colunas_fonte()
+        colunas = self.selecionadas if self.selecionadas is not None else fonte
+        ausentes = [coluna for coluna in list(colunas) + list(self.removidas) if coluna not in fonte]
+        if ausentes:
+            raise KeyError(f"Colunas não encontradas: {ausentes}")
+        return [coluna for coluna in colunas if coluna not in self.removidas]
+
+    def colunas(self):
+        """Colunas do resultado, já com os nomes finais."""
+        return [self.renomeacoes.get(coluna, coluna) for coluna in self._colunas_resultado()]
+
+    def blocos(self, tamanho_bloco=TAMANHO_BLOCO):
+        """Gera o resultado em blocos de até `tamanho_bloco` linhas (com os tipos de cada arquivo)."""
+        colunas = self._colunas_resultado()
+        if isinstance(self.fonte, pd.DataFrame):
+            df = self.fonte
+            for inicio in range(0, len(df), tamanho_bloco):
+                bloco = df.iloc[inicio:inicio + tamanho_bloco]
+                for coluna, valor in self.filtros:
+                    bloco = bloco[bloco[coluna] == valor]
+                yield bloco[colunas].rename(columns=self.renomeacoes)
+            return
+        for caminho in self.fonte:
+            for bloco in ler_em_blocos(caminho, colunas, self.filtros, tamanho_bloco):
+                yield bloco.rename(columns=self.renomeacoes)
+
+    def executar(self):
+        """Materializa o plano em um DataFrame."""
+        colunas = self._colunas_resultado()
+        if isinstance(self.fonte, pd.DataFrame):
+            df = self.fonte
+            manter = pd.Series(True, index=df.index)
+            for coluna, valor in self.filtros:
+                manter &= df[coluna] == valor
+            # Uma única cópia, já filtrada e projetada (sem alterar visões da fonte)
+            resultado = df.loc[manter, colunas] if self.filtros else df[colunas].copy()
+            return resultado.rename(columns=self.renomeacoes)
+
+        blocos = list(self.blocos())
+        if not blocos:
+            return pd.DataFrame(columns=self.colunas())
+        # Blocos de arquivos diferentes podem ter categorias diferentes: o esquema as unifica
+        return aplicar_esquema(pd.concat(blocos, ignore_index=True))
+
+@instrumentar()
+def load_csv_files(file_paths, lazy=False):
+    """
+    Carrega e concatena múltiplos arquivos intermediários (CSV, Parquet ou Feather) em um único DataFrame.
+    Com `lazy=True`, retorna um `Plano` sobre os arquivos, sem lê-los.
+    """
+    if lazy:
+        return Plano(list(file_paths))
+    dfs = [ler_tabela(file) for file in file_paths]
     return pd.concat(dfs, ignore_index=True)
 
+@instrumentar()
+def profile_dataframe(df):
+    """
+    Perfil das colunas em uma única passada: nulos, distintos (exatos ou
+    aproximados por HyperLogLog), mínimo, máximo e amostra de valores.
+    Aceita um `Plano`, percorrido em blocos, sem materializar a tabela.
+    """
+    return perfilar_colunas(df.blocos() if isinstance(df, Plano) else df)
+
+@instrumentar()
+def print_profile(perfil):
+    """Exibe o perfil das colunas em formato compacto."""
+    print(formatar_perfil(perfil))
+    print("-" * 50)
+
+@instrumentar()
 def get_unique_values(df):
-    """Obtém valores únicos de cada coluna do DataFrame."""
+    """Obtém valores únicos de cada coluna do DataFrame (listagem completa; prefira `profile_dataframe`)."""
     return {col: df[col].unique() for col in df.columns}
 
+@instrumentar()
 def print_unique_values(unique_values):
     """Exibe os valores únicos por coluna."""
     for col, values in unique_values.items():
@@ -16,57 +150,61 @@ def print_unique_values(unique_values):
         print(values)
         print("-" * 50)
 
+@instrumentar()
 def filter_dataframe(df, column, value):
-    """Filtra o DataFrame para manter apenas as linhas onde a coluna especificada possui um valor específico."""
-    return df[df[column] == value]
+    """
+    Filtra o DataFrame para manter apenas as linhas onde a coluna especificada possui um valor específico.
+    Com um `Plano`, apenas acrescenta o filtro ao plano.
+    """
+    if isinstance(df, Plano):
+        return df.filtrar(column, value)
+    return Plano(df).filtrar(column, value).executar()
 
+@instrumentar()
 def save_dataframe(df, file_path):
-    """Salva um DataFrame em um arquivo CSV."""
-    df.to_csv(file_path, index=False)
+    """Salva um DataFrame no formato indicado pela extensão do arquivo (CSV, Parquet ou Feather)."""
+    salvar_tabela(df, file_path)
 
 def rename_column(df, old_name, new_name):
-    """Renomeia uma coluna do DataFrame."""
-    df.rename(columns={old_name: new_name}, inplace=True)
-    return df
+    """Renomeia uma coluna do DataFrame (retorna um novo DataFrame, ou um novo `Plano`)."""
+    if isinstance(df, Plano):
+        return df.renomear(old_name, new_name)
+    return df.rename(columns={old_name: new_name})
 
 def drop_columns(df, columns):
-    """Remove colunas específicas do DataFrame."""
+    """Remove colunas específicas do DataFrame (ou do `Plano`)."""
+    if isinstance(df, Plano):
+        return df.remover(columns)
     return df.drop(columns=columns)
 
 def main():
-    # Definição dos caminhos dos arquivos CSV
-    file_paths = ["data/dados_2007_2020.csv", "data/dados_2021_2022.csv"]
-    
-    # Carregar e combinar os arquivos CSV
-    df_combined = load_csv_files(file_paths)
-    
-    # Exibir valores únicos por coluna
-    unique_values = get_unique_values(df_combined)
-    print_unique_values(unique_values)
+    # Definição dos caminhos dos arquivos intermediários
+    file_paths = [caminho_intermediario("dados_2007_2020"), caminho_intermediario("dados_2021_2022")]
     
-    # Filtrar o DataFrame
-    df_filtered = filter_dataframe(df_combined, "Variável", "Número de empresas ativas")
-    save_dataframe(df_filtered, "data/dados_filtrados_numero_empresas_ativas.csv")
+    # Plano sobre os arquivos combinados (nada é lido ainda)
+    combined = load_csv_files(file_paths, lazy=True)
     
-    # Renomear colunas e remover desnecessárias
-    df_filtered = rename_column(df_filtered, "Variável (Código)", "Número de empresas ativas")
-    df_filtered = drop_columns(df_filtered, ["Variável"])
-    save_dataframe(df_filtered, "data/dados_filtrados_numero_empresas_ativas.csv")
+    # Exibir o perfil das colunas (leitura em blocos)
+    print_profile(profile_dataframe(combined))
     
-    # Carregar dados populacionais e exibir valores únicos
-    df_populacao = pd.read_csv("data/populacao_filtrada.csv")
-    unique_values_populacao = get_unique_values(df_populacao)
-    print_unique_values(unique_values_populacao)
+    # Filtrar, renomear colunas e remover desnecessárias: o filtro e a seleção de
+    # colunas são aplicados na leitura
+    filtered = filter_dataframe(combined, "Variável", "Número de empresas ativas")
+    filtered = rename_column(filtered, "Variável (Código)", "Número de empresas ativas")
+    filtered = drop_columns(filtered, ["Variável"])
+    save_dataframe(filtered.executar(), caminho_intermediario("dados_filtrados_numero_empresas_ativas"))
     
-    # Selecionar apenas colunas numéricas para agregação
-    numeric_columns = ["Ano", "População", "Número de empresas ativas", "Razão População/Empresas"]
+    # Carregar dados populacionais e exibir o perfil das colunas
+    df_populacao = ler_tabela(caminho_intermediario("populacao_filtrada"))
+    print_profile(profile_dataframe(df_populacao))
     
     # Remover a coluna "SIGLA" antes da agregação
-    if "SIGLA" in df_combined.columns:
-        df_combined = drop_columns(df_combined, ["SIGLA"])
+    if "SIGLA" in combined.colunas():
+        combined = drop_columns(combined, ["SIGLA"])
     
     # Salvar os dados processados
-    save_dataframe(df_combined, "data/dados_agrupados.csv")
+    df_combined = combined.executar()
+    save_dataframe(df_combined, caminho_intermediario("dados_agrupados"))
     print(df_combined.dtypes)
 
 if __name__ == "__main__":
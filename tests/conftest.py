@@ -0,0 +1,71 @@
+"""Configuração comum dos testes: módulos de `src/` no caminho, um servidor HTTP local e um painel por UF."""
+import os
+import sys
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(RAIZ, "src"))
+sys.path.insert(0, os.path.join(RAIZ, "benchmarks"))
+
+class ServidorLocal:
+    """
+    Servidor HTTP em uma thread, no lugar do IBGE/SIDRA. `rotas` mapeia o caminho
+    para uma função (cabeçalhos da requisição) -> (status, cabeçalhos, corpo);
+    `pedidos` guarda o caminho e os cabeçalhos de cada requisição recebida.
+    """
+
+    def __init__(self):
+        self.rotas = {}
+        self.pedidos = []
+        servidor = self
+
+        class Manipulador(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def do_GET(self):
+                cabecalhos = dict(self.headers)
+                servidor.pedidos.append((self.path, cabecalhos))
+                rota = servidor.rotas.get(self.path)
+                status, extras, corpo = rota(cabecalhos) if rota else (404, {}, b"")
+                self.send_response(status)
+                for chave, valor in extras.items():
+                    self.send_header(chave, valor)
+                self.send_header("Content-Length", str(len(corpo)))
+                self.end_headers()
+                self.wfile.write(corpo)
+
+            def log_message(self, formato, *args):
+                pass
+
+        self.http = ThreadingHTTPServer(("127.0.0.1", 0), Manipulador)
+        self.url = f"http://127.0.0.1:{self.http.server_address[1]}"
+        threading.Thread(target=self.http.serve_forever, daemon=True).start()
+
+    def pedidos_de(self, caminho):
+        return [cabecalhos for rota, cabecalhos in self.pedidos if rota == caminho]
+
+@pytest.fixture
+def servidor():
+    servidor = ServidorLocal()
+    yield servidor
+    servidor.http.shutdown()
+    servidor.http.server_close()
+
+@pytest.fixture
+def painel_ufs():
+    """Painel com as 27 UFs de 2007 a 2022, população e empresas crescentes e 4 clusters."""
+    import numpy as np
+
+    from dados_sinteticos import UFS
+    from painel import Painel
+
+    rng = np.random.default_rng(0)
+    anos = np.arange(2007, 2023)
+    crescimento = (1 + rng.normal(0.01, 0.01, size=(len(UFS), 1))) ** np.arange(len(anos))
+    populacao = rng.uniform(1e5, 1e7, size=(len(UFS), 1)) * crescimento
+    empresas = populacao / rng.uniform(20, 80, size=(len(UFS), 1))
+    return Painel([nome for _, _, nome in UFS], anos, populacao, empresas,
+                  cluster=np.arange(len(UFS)) % 4)
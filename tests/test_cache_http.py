@@ -0,0 +1,85 @@
+import hashlib
+import os
+
+import pytest
+
+from cache_http import baixar_com_cache, baixar_em_streaming, carregar_indice
+
+CONTEUDO = bytes(range(256)) * 400
+ETAG = '"v1"'
+
+def servir(conteudo=CONTEUDO, etag=ETAG):
+    """Rota com ETag, requisições condicionais (If-None-Match) e Range com If-Range."""
+    def rota(cabecalhos):
+        if etag and cabecalhos.get("If-None-Match") == etag:
+            return 304, {"ETag": etag}, b""
+        intervalo = cabecalhos.get("Range")
+        if intervalo and (cabecalhos.get("If-Range") == etag or not etag):
+            inicio = int(intervalo.split("=")[1].rstrip("-"))
+            return 206, {"ETag": etag, "Content-Range": f"bytes {inicio}-{len(conteudo) - 1}/{len(conteudo)}"}, \
+                conteudo[inicio:]
+        return 200, {"ETag": etag} if etag else {}, conteudo
+    return rota
+
+def ler(caminho):
+    with open(caminho, "rb") as f:
+        return f.read()
+
+def test_download_e_revalidacao_com_304(servidor, tmp_path):
+    servidor.rotas["/arquivo"] = servir()
+    url, cache = f"{servidor.url}/arquivo", str(tmp_path)
+
+    caminho = baixar_com_cache(url, diretorio_cache=cache, progresso=None)
+    assert ler(caminho) == CONTEUDO
+    assert carregar_indice(cache)[url]["sha256"] == hashlib.sha256(CONTEUDO).hexdigest()
+
+    assert baixar_com_cache(url, diretorio_cache=cache, progresso=None) == caminho
+    assert servidor.pedidos_de("/arquivo")[-1]["If-None-Match"] == ETAG
+
+    # Dentro de max_idade, nenhuma requisição é feita
+    pedidos = len(servidor.pedidos)
+    assert baixar_com_cache(url, diretorio_cache=cache, max_idade=3600, progresso=None) == caminho
+    assert len(servidor.pedidos) == pedidos
+
+def test_retomada_com_range_e_if_range(servidor, tmp_path):
+    servidor.rotas["/arquivo"] = servir()
+    destino = str(tmp_path / "arquivo")
+    with open(destino + ".part", "wb") as f:
+        f.write(CONTEUDO[:1000])
+    with open(destino + ".part.validador", "w", encoding="utf-8") as f:
+        f.write(ETAG)
+
+    resultado = baixar_em_streaming(f"{servidor.url}/arquivo", destino, progresso=None)
+    pedido = servidor.pedidos_de("/arquivo")[-1]
+    assert (pedido["Range"], pedido["If-Range"]) == ("bytes=1000-", ETAG)
+    assert resultado["status"] == 206
+    assert ler(destino) == CONTEUDO
+    assert resultado["sha256"] == hashlib.sha256(CONTEUDO).hexdigest()
+
+def test_parcial_sem_validador_nao_e_retomado(servidor, tmp_path):
+    servidor.rotas["/arquivo"] = servir(etag=None)
+    destino = str(tmp_path / "arquivo")
+    with open(destino + ".part", "wb") as f:
+        f.write(b"conteudo antigo")
+
+    resultado = baixar_em_streaming(f"{servidor.url}/arquivo", destino, progresso=None)
+    assert "Range" not in servidor.pedidos_de("/arquivo")[-1]
+    assert resultado["status"] == 200
+    assert ler(destino) == CONTEUDO
+
+def test_304_sem_copia_em_cache(servidor, tmp_path):
+    servidor.rotas["/arquivo"] = lambda cabecalhos: (304, {}, b"")
+    with pytest.raises(IOError, match="304"):
+        baixar_com_cache(f"{servidor.url}/arquivo", diretorio_cache=str(tmp_path), progresso=None)
+
+def test_modo_offline_usa_o_cache(servidor, tmp_path):
+    servidor.rotas["/arquivo"] = servir()
+    url, cache = f"{servidor.url}/arquivo", str(tmp_path)
+    caminho = baixar_com_cache(url, diretorio_cache=cache, progresso=None)
+
+    pedidos = len(servidor.pedidos)
+    assert baixar_com_cache(url, offline=True, diretorio_cache=cache) == caminho
+    assert len(servidor.pedidos) == pedidos
+    with pytest.raises(FileNotFoundError):
+        baixar_com_cache(f"{servidor.url}/outro", offline=True, diretorio_cache=cache)
+    assert os.path.exists(caminho)
@@ -0,0 +1,37 @@
+import numpy as np
+
+from clusterizacao import _atribuir, dtw_lote, envelope, lb_keogh
+
+def dtw_ingenuo(a, b, janela):
+    """DTW com janela de Sakoe-Chiba, célula a célula."""
+    t = len(a)
+    acumulado = np.full((t + 1, t + 1), np.inf)
+    acumulado[0, 0] = 0.0
+    for i in range(1, t + 1):
+        for j in range(max(1, i - janela), min(t, i + janela) + 1):
+            acumulado[i, j] = (a[i - 1] - b[j - 1]) ** 2 + min(acumulado[i - 1, j], acumulado[i, j - 1],
+                                                                 acumulado[i - 1, j - 1])
+    return np.sqrt(acumulado[t, t])
+
+def series_em_grupos(n=120, t=16, semente=0):
+    rng = np.random.default_rng(semente)
+    formas = np.array([np.linspace(0, 1, t), np.linspace(1, 0, t), np.sin(np.linspace(0, 3, t))])
+    return formas[rng.integers(0, len(formas), n)] + rng.normal(0, 0.1, size=(n, t))
+
+def test_dtw_e_limite_inferior():
+    X = series_em_grupos(n=20)
+    for janela in (1, 2, 4):
+        distancias = dtw_lote(X[0], X, janela)
+        np.testing.assert_allclose(distancias, [dtw_ingenuo(X[0], serie, janela) for serie in X])
+        superior, inferior = envelope(X[0], janela)
+        assert (lb_keogh(X, superior, inferior) <= distancias + 1e-12).all()
+
+def test_atribuicao_com_poda_igual_a_forca_bruta():
+    X = series_em_grupos()
+    medoides = np.array([3, 17, 42, 77])
+    rotulos, melhor, calculos = _atribuir(X, medoides, janela=2)
+
+    distancias = np.column_stack([dtw_lote(X[medoide], X, 2) for medoide in medoides])
+    np.testing.assert_array_equal(rotulos, distancias.argmin(axis=1))
+    np.testing.assert_allclose(melhor, distancias.min(axis=1))
+    assert calculos < X.shape[0] * len(medoides)
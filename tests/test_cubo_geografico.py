@@ -0,0 +1,51 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from cubo_geografico import REGIOES, CuboGeografico, codigos_das_ufs
+
+def _somas_por_regiao(painel, ano):
+    """Soma por região das UFs do painel, agrupando as linhas pelo código da região."""
+    coluna = int(np.flatnonzero(painel.anos == ano)[0])
+    codigos = codigos_das_ufs(painel.locais)
+    tabela = pd.DataFrame({"Código": codigos // 10, "População": painel.populacao[:, coluna],
+                           "Número de empresas ativas": painel.empresas[:, coluna]})
+    return tabela.groupby("Código").sum().sort_index()
+
+def test_roll_up_por_regiao_igual_ao_groupby(painel_ufs):
+    cubo = CuboGeografico.de_painel(painel_ufs)
+    for ano in (2007, 2015, 2022):
+        regioes = cubo.nivel("Regiao", ano).set_index("Código").sort_index()
+        esperado = _somas_por_regiao(painel_ufs, ano)
+        assert list(regioes.index) == list(esperado.index) == sorted(REGIOES)
+        assert list(regioes["LOCAL"]) == [REGIOES[codigo] for codigo in esperado.index]
+        for coluna in ("População", "Número de empresas ativas"):
+            np.testing.assert_allclose(regioes[coluna], esperado[coluna], rtol=1e-12)
+        np.testing.assert_allclose(regioes["Razão População/Empresas"],
+                                   esperado["População"] / esperado["Número de empresas ativas"], rtol=1e-12)
+
+        brasil = cubo.nivel("Brasil", ano).iloc[0]
+        assert brasil["População"] == pytest.approx(esperado["População"].sum(), rel=1e-12)
+        assert brasil["Locais com dados"] == 27
+
+def test_drill_down_e_ancestrais(painel_ufs):
+    cubo = CuboGeografico.de_painel(painel_ufs)
+    assert sorted(cubo.filhos("Sul", 2020)["LOCAL"]) == ["Paraná", "Rio Grande do Sul", "Santa Catarina"]
+    assert list(cubo.ancestrais("SC", 2020)["LOCAL"]) == ["Santa Catarina", "Sul", "Brasil"]
+    assert len(cubo.filhos("Brasil")) == len(REGIOES) * len(painel_ufs.anos)
+
+def test_cobertura_ignora_locais_sem_as_duas_variaveis():
+    anos = np.array([2020, 2021])
+    populacao = np.array([[100.0, 110.0], [200.0, 220.0]])
+    empresas = np.array([[10.0, np.nan], [20.0, 22.0]])
+    cubo = CuboGeografico(np.array([41, 42]), anos, populacao, empresas)
+    sul = cubo.nivel("Região").set_index("Ano")
+    assert list(sul["Locais com dados"]) == [2, 1]
+    assert sul.loc[2020, "Razão População/Empresas"] == pytest.approx(300 / 30)
+    assert sul.loc[2021, "Razão População/Empresas"] == pytest.approx(220 / 22)
+
+def test_salvar_e_carregar(tmp_path, painel_ufs):
+    cubo = CuboGeografico.de_painel(painel_ufs)
+    caminho = str(tmp_path / "cubo.npz")
+    cubo.salvar(caminho)
+    pd.testing.assert_frame_equal(CuboGeografico.carregar(caminho).nivel("UF"), cubo.nivel("UF"))
@@ -0,0 +1,28 @@
+import numpy as np
+
+from estabilidade_clusters import locais_instaveis, matriz_consenso, pac, resumir_consenso, varrer_estabilidade
+
+def test_resumo_por_blocos_igual_a_matriz_de_consenso():
+    rng = np.random.default_rng(0)
+    # Dois grupos estáveis e alguns locais que trocam de grupo entre as sementes
+    rotulos = np.tile(np.repeat([0, 1, 2], [20, 15, 10]), (12, 1)).astype(np.int32)
+    rotulos[:, 40:] = rng.integers(0, 3, size=(12, 5))
+
+    consenso = matriz_consenso(rotulos, 3)
+    ambiguos = (consenso > 0.1) & (consenso < 0.9)
+    for celulas in (1, 7 * 45, 2 ** 22):
+        proporcao, instaveis = resumir_consenso(rotulos, celulas_por_bloco=celulas)
+        assert np.isclose(proporcao, pac(consenso))
+        np.testing.assert_array_equal(instaveis, ambiguos.any(axis=1))
+    assert locais_instaveis(instaveis, np.arange(45).astype(str)) == [str(i) for i in range(45) if instaveis[i]]
+
+def test_concordancia_sem_a_propria_semente_de_referencia():
+    rng = np.random.default_rng(1)
+    X = np.vstack([rng.normal(centro, 5.0, size=(15, 6)) for centro in (0, 1, 2)])
+    resumo, instaveis, rotulos = varrer_estabilidade(X, valores_k=[3], n_sementes=4, max_workers=1)
+
+    from sklearn.metrics import adjusted_rand_score
+
+    esperado = np.mean([adjusted_rand_score(rotulos[3][0], r) for r in rotulos[3][1:]])
+    assert np.isclose(resumo.loc[0, "ARI com a semente 42"], esperado)
+    assert rotulos[3].shape == (4, 45) and instaveis[3].shape == (45,)
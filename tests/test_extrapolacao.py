@@ -0,0 +1,24 @@
+import numpy as np
+from scipy.interpolate import interp1d
+
+from extrapolacao import extrapolar_matriz
+
+def test_linear_igual_ao_interp1d_por_serie():
+    rng = np.random.default_rng(0)
+    anos = np.arange(2007, 2021)
+    valores = rng.uniform(10, 100, size=(200, len(anos)))
+    # Lacunas no início, no meio e no fim; algumas séries com um único ponto
+    valores[rng.random(valores.shape) < 0.35] = np.nan
+    valores[:5] = np.nan
+    valores[:5, 3] = 50.0
+    anos_alvo = np.array([2005, 2010, 2015, 2021, 2022])
+
+    estimado = extrapolar_matriz(valores, anos, anos_alvo, metodo="linear")
+
+    for linha, serie in zip(estimado, valores):
+        observado = ~np.isnan(serie)
+        if observado.sum() < 2:
+            assert np.isnan(linha).all()
+            continue
+        esperado = interp1d(anos[observado], serie[observado], kind="linear", fill_value="extrapolate")(anos_alvo)
+        np.testing.assert_allclose(linha, esperado, rtol=1e-10)
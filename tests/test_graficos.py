@@ -0,0 +1,46 @@
+import os
+
+import matplotlib
+import numpy as np
+
+from graficos import gerar_grafico_tendencia, renderizar_em_lote
+from painel import Painel
+
+def painel_agrupado(n_locais=6, k=3):
+    anos = np.arange(2007, 2023)
+    rng = np.random.default_rng(0)
+    populacao = rng.uniform(1e6, 2e6, size=(n_locais, len(anos)))
+    empresas = rng.uniform(100, 400, size=(n_locais, len(anos)))
+    locais = np.array([f"Estado {i}" for i in range(n_locais)], dtype=object)
+    return Painel(locais, anos, populacao, empresas, populacao / empresas, np.arange(n_locais) % k)
+
+def test_legenda_identifica_cada_estado(tmp_path, monkeypatch):
+    import matplotlib.pyplot as plt
+
+    painel = painel_agrupado()
+    legendas = []
+    monkeypatch.setattr(plt, "legend", lambda handles, **opcoes: legendas.append(handles))
+    gerar_grafico_tendencia(painel, painel.locais_por_cluster(), str(tmp_path), mostrar=False)
+
+    rotulos = [linha.get_label() for linha in legendas[0]]
+    assert sorted(rotulos) == sorted(f"{local} (Cluster {cluster})"
+                                     for local, cluster in zip(painel.locais, painel.cluster))
+    assert len({linha.get_color() for linha in legendas[0]}) == len(painel)
+
+def test_graficos_de_clusters_antigos_sao_apagados(tmp_path):
+    painel = painel_agrupado(k=3)
+    renderizar_em_lote(painel, painel.locais_por_cluster(), str(tmp_path), max_workers=1)
+    assert os.path.exists(tmp_path / "tendencias_cluster_2.png")
+
+    painel = painel_agrupado(k=2)
+    renderizar_em_lote(painel, painel.locais_por_cluster(), str(tmp_path), max_workers=1)
+    assert sorted(nome for nome in os.listdir(tmp_path) if nome.startswith("tendencias_cluster_")) == [
+        "tendencias_cluster_0.png", "tendencias_cluster_1.png"]
+    assert matplotlib.get_backend().lower() == "agg"
+
+def test_locais_sem_cluster_nao_ganham_grafico(tmp_path):
+    painel = painel_agrupado(k=2)
+    painel.cluster = np.where(np.arange(len(painel)) == 0, np.nan, painel.cluster)
+    renderizar_em_lote(painel, painel.locais_por_cluster(), str(tmp_path), max_workers=1)
+    assert sorted(nome for nome in os.listdir(tmp_path) if nome.startswith("tendencias_cluster_")) == [
+        "tendencias_cluster_0.png", "tendencias_cluster_1.png"]
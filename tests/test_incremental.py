@@ -0,0 +1,34 @@
+import numpy as np
+import pandas as pd
+
+from incremental import atualizar_painel
+from painel import Painel
+
+def test_anexa_anos_so_com_populacao_sem_ajustar_as_estimativas(painel_ufs, tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    # 2021 e 2022 sem empresas em um local: razões estimadas (e exageradas) pela análise anterior
+    empresas, razao = painel_ufs.empresas.copy(), painel_ufs.razao.copy()
+    colunas = painel_ufs.colunas_anos([2021, 2022])
+    empresas[0, colunas] = np.nan
+    razao[0, colunas] = 1e6
+    painel = Painel(painel_ufs.locais, painel_ufs.anos, painel_ufs.populacao, empresas, razao,
+                    cluster=painel_ufs.cluster)
+
+    # A SIDRA só publicou 2023; 2024 tem apenas a projeção de população
+    novas_empresas = pd.DataFrame({"LOCAL": painel.locais[1:], "Ano": 2023,
+                                   "Número de empresas ativas": painel.empresas[1:, -1] * 1.01})
+    populacao = pd.DataFrame(painel.populacao[:, [-1, -1]] * [1.01, 1.02],
+                             index=pd.Index(painel.locais, name="LOCAL"), columns=[2023, 2024])
+
+    atualizado = atualizar_painel([2023, 2024], None, None, painel=painel, empresas=novas_empresas,
+                                  populacao=populacao, metodo_previsao="drift", salvar=False)
+
+    assert list(atualizado.anos[-2:]) == [2023, 2024]
+    np.testing.assert_allclose(atualizado.populacao[:, -2:], populacao.to_numpy())
+    np.testing.assert_allclose(atualizado.empresas[1:, -2], novas_empresas["Número de empresas ativas"])
+    assert np.isnan(atualizado.empresas[:, -1]).all() and not np.isnan(atualizado.razao[:, -1]).any()
+    # As estimativas anteriores são mantidas, mas não entram no ajuste do drift
+    np.testing.assert_array_equal(atualizado.razao[0, colunas], 1e6)
+    observados = painel.anos < 2021
+    inclinacao = (razao[0, observados][-1] - razao[0, 0]) / (2020 - 2007)
+    np.testing.assert_allclose(atualizado.razao[0, -2:], razao[0, observados][-1] + inclinacao * np.array([3, 4]))
@@ -0,0 +1,76 @@
+import numpy as np
+import pandas as pd
+
+from analize import identificar_oportunidades_e_saturacao
+from dados_sinteticos import gerar_projecoes
+from indice_idades import carregar_indice, construir_indice, populacao_faixa, salvar_indice, varrer_cenarios
+from painel import Painel
+
+ANOS = tuple(range(2018, 2023))
+
+def _projecoes():
+    tabela = gerar_projecoes(28, anos=ANOS, idades=tuple(range(0, 91)))
+    tabela["IDADE"] = tabela["IDADE"].astype(str).str.rstrip("+").astype(int)
+    # Uma linha repetida (mesmo local, sexo e idade) é somada à original
+    return pd.concat([tabela, tabela.iloc[[40]]], ignore_index=True)
+
+def _soma_direta(tabela, idade_min, idade_max, sexos=None):
+    linhas = tabela["IDADE"].between(idade_min, idade_max)
+    if sexos is not None:
+        linhas &= tabela["SEXO"].isin(sexos)
+    return tabela[linhas].groupby("LOCAL")[list(ANOS)].sum().sort_index()
+
+def test_populacao_da_faixa_igual_a_soma_direta(tmp_path):
+    tabela = _projecoes()
+    indice = construir_indice(tabela, list(ANOS))
+    assert list(indice["locais"]) == sorted(tabela["LOCAL"].unique())
+    for idade_min, idade_max, sexos in ((38, 58, None), (0, 0, None), (18, 200, None), (60, 90, ["Mulheres"])):
+        np.testing.assert_allclose(populacao_faixa(indice, idade_min, idade_max, sexos),
+                                   _soma_direta(tabela, idade_min, idade_max, sexos).to_numpy())
+
+    caminho = salvar_indice(indice, str(tmp_path / "indice.npz"))
+    carregado = carregar_indice(caminho)
+    np.testing.assert_array_equal(carregado["acumulado"], indice["acumulado"])
+    assert list(carregado["locais"]) == list(indice["locais"])
+
+def _painel(tabela, faixa):
+    """Painel com a população da `faixa` e um número de empresas fixo por local."""
+    populacao = _soma_direta(tabela, *faixa)
+    locais = populacao.index.to_numpy()
+    empresas = np.random.default_rng(0).uniform(1e3, 1e4, size=(len(locais), 1)) * np.ones(len(ANOS))
+    return Painel(locais, ANOS, populacao.to_numpy(dtype=float), empresas)
+
+def test_um_cenario_igual_a_classificacao_da_analise():
+    tabela = _projecoes()
+    indice = construir_indice(tabela, list(ANOS))
+    painel = _painel(tabela, (38, 58))
+    resultado = varrer_cenarios(indice, painel, faixas=[(38, 58)], percentis=[(25, 75)], max_workers=1)
+    saturados, oportunidades = identificar_oportunidades_e_saturacao(painel)
+    por_local = resultado.set_index("LOCAL")
+    assert sorted(por_local.index[por_local["Cenários saturado (%)"] == 100]) == sorted(saturados)
+    assert sorted(por_local.index[por_local["Cenários oportunidade (%)"] == 100]) == sorted(oportunidades)
+    assert set(por_local.loc[saturados, "Classificação"]) == {"Sempre saturado"}
+
+def test_contagens_de_cenarios_com_empresas_deduzidas():
+    tabela = _projecoes()
+    indice = construir_indice(tabela, list(ANOS))
+    painel = _painel(tabela, (38, 58))
+    faixas = [(inicio, inicio + 20) for inicio in range(18, 60, 3)]
+    percentis = [(10, 90), (25, 75)]
+    esperado = varrer_cenarios(indice, painel, faixas=faixas, percentis=percentis, max_workers=1)
+    empresas = painel.empresas[:, -2:].copy()
+
+    # Sem as empresas de 2022, o número é deduzido da razão e da população da faixa base
+    painel.empresas[:, -1] = np.nan
+    deduzido = varrer_cenarios(indice, painel, faixas=faixas, percentis=percentis, max_workers=2)
+    pd.testing.assert_frame_equal(deduzido, esperado)
+
+    # Contagem cenário a cenário para alguns locais
+    por_local = esperado.set_index("LOCAL")
+    for local in por_local.index[:5]:
+        linha = list(indice["locais"]).index(local)
+        vezes = 0
+        for inicio, fim in faixas:
+            media = (populacao_faixa(indice, inicio, fim)[:, -2:] / empresas).mean(axis=1)
+            vezes += sum(media[linha] > np.percentile(media, alto) for _, alto in percentis)
+        assert por_local.loc[local, "Cenários saturado (%)"] == round(100 * vezes / (len(faixas) * len(percentis)), 1)
@@ -0,0 +1,25 @@
+import os
+
+import pytest
+
+from armazenamento import caminho_intermediario
+from dados_sinteticos import gerar_projecoes, salvar_projecoes_xlsx
+from ingestao import ErroIngestao, ingerir_fontes
+
+def test_falha_da_sidra_nao_interrompe_o_ibge(servidor, tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    planilha = salvar_projecoes_xlsx(gerar_projecoes(n_locais=3), str(tmp_path / "sintetica.xlsx"))
+    with open(planilha, "rb") as f:
+        conteudo = f.read()
+    servidor.rotas["/projecoes.xlsx"] = lambda cabecalhos: (200, {"ETag": '"v1"'}, conteudo)
+
+    # A SIDRA responde 404 a todas as partições da consulta
+    sidra_url = f"{servidor.url}/values/t/1757/p/2007-2022/n1/1/n3/all/v/allxp"
+    caminho_populacao = caminho_intermediario("populacao_filtrada", "data")
+    with pytest.raises(ErroIngestao) as erro:
+        ingerir_fontes(sidra_url, f"{servidor.url}/projecoes.xlsx", os.path.join("data", "projecoes.xlsx"),
+                       caminho_populacao=caminho_populacao)
+
+    assert set(erro.value.erros) == {"sidra"}
+    assert os.path.exists(caminho_populacao)
+    assert not os.path.exists(caminho_intermediario("dados_2007_2020", "data"))
@@ -0,0 +1,53 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import instrumentacao
+from instrumentacao import contexto, definir_instrumentacao, instrumentar, no_contexto
+
+def test_memoria_medida_apenas_na_thread_principal():
+    instrumentacao.limpar_registros()
+    definir_instrumentacao(memoria=True)
+    alocadas = threading.Barrier(2)
+
+    @instrumentar("fonte")
+    def fonte(tamanho):
+        dados = bytearray(tamanho)
+        alocadas.wait()  # as duas fontes mantêm a memória ao mesmo tempo
+        return len(dados)
+
+    @instrumentar("etapa")
+    def etapa():
+        chamadas = contexto()
+        with ThreadPoolExecutor(max_workers=2) as executor:
+            return list(executor.map(no_contexto(chamadas, fonte), [20 * 1024 ** 2, 10 * 1024 ** 2]))
+
+    try:
+        etapa()
+    finally:
+        definir_instrumentacao(ativo=False)
+    registros = {registro["nome"]: registro for registro in instrumentacao._registros if registro["pai"] is None}
+    fontes = [registro for registro in instrumentacao._registros if registro["nome"] == "fonte"]
+    assert registros["etapa"]["pico_mb"] >= 30
+    assert all("pico_mb" not in registro and registro["pai"] is not None for registro in fontes)
+    instrumentacao.limpar_registros()
+
+def test_registra_apenas_com_a_instrumentacao_ligada(tmp_path):
+    instrumentacao.limpar_registros()
+
+    @instrumentar("soma")
+    def soma(a, b):
+        return a + b
+
+    soma(1, 2)
+    assert instrumentacao._registros == []
+
+    definir_instrumentacao()
+    try:
+        soma(1, 2)
+    finally:
+        definir_instrumentacao(ativo=False)
+    assert [registro["nome"] for registro in instrumentacao._registros] == ["soma"]
+    assert "memoria_mb" not in instrumentacao._registros[0]
+
+    instrumentacao.salvar_relatorio(str(tmp_path / "relatorio.json"))
+    assert instrumentacao._registros == []
@@ -0,0 +1,53 @@
+import numpy as np
+import pandas as pd
+
+from painel import Painel
+
+def test_ida_e_volta_pela_tabela_longa(painel_ufs):
+    metrica = painel_ufs.empresas / painel_ufs.populacao
+    painel = painel_ufs.com_metricas({"Razão Empresas/População": metrica})
+    painel.clusters_metricas["Razão Empresas/População"] = np.arange(len(painel)) % 2
+    painel.razao[0, 3] = np.nan
+
+    tabela = painel.para_dataframe()
+    assert len(tabela) == painel.razao.size - 1
+    assert tabela["Ano"].is_monotonic_increasing
+
+    volta = Painel.de_dataframe(tabela.sample(frac=1, random_state=0))
+    ordem = np.argsort(painel.locais)
+    assert list(volta.locais) == list(painel.locais[ordem])
+    np.testing.assert_array_equal(volta.anos, painel.anos)
+    np.testing.assert_array_equal(volta.razao, painel.razao[ordem])
+    np.testing.assert_array_equal(volta.cluster, painel.cluster[ordem])
+    # A célula sem razão não vai para a tabela, e com ela a métrica daquele local e ano
+    esperada = metrica.copy()
+    esperada[0, 3] = np.nan
+    np.testing.assert_array_equal(volta.metricas["Razão Empresas/População"], esperada[ordem])
+    np.testing.assert_array_equal(volta.clusters_metricas["Razão Empresas/População"], (np.arange(len(painel)) % 2)[ordem])
+
+def test_serie_e_corte_iguais_ao_pivot(painel_ufs):
+    tabela = painel_ufs.para_dataframe()
+    pivot = tabela.pivot(index="LOCAL", columns="Ano", values="Razão População/Empresas")
+    local = painel_ufs.locais[5]
+    np.testing.assert_array_equal(painel_ufs.serie(local), pivot.loc[local].to_numpy())
+    np.testing.assert_array_equal(painel_ufs.corte(2015), pivot.loc[painel_ufs.locais, 2015].to_numpy())
+    assert np.shares_memory(painel_ufs.serie(local), painel_ufs.razao)
+
+def test_com_anos_amplia_a_grade_com_nan(painel_ufs):
+    ampliado = painel_ufs.com_anos([2023, 2025])
+    assert list(ampliado.anos) == list(range(2007, 2024)) + [2025]
+    np.testing.assert_array_equal(ampliado.razao[:, :len(painel_ufs.anos)], painel_ufs.razao)
+    assert np.isnan(ampliado.populacao[:, -2:]).all()
+    assert painel_ufs.com_anos([2010]) is painel_ufs
+
+def test_filtros_de_locais(painel_ufs):
+    cluster = painel_ufs.do_cluster(1)
+    assert list(cluster.locais) == list(painel_ufs.locais[1::4])
+    assert (np.asarray(cluster.cluster) == 1).all()
+    np.testing.assert_array_equal(cluster.empresas, painel_ufs.empresas[1::4])
+
+    sem = painel_ufs.sem_locais("São Paulo", "Bahia")
+    assert len(sem) == len(painel_ufs) - 2
+    assert "São Paulo" not in sem.indice_local and "Bahia" not in sem.indice_local
+    assert sum(len(locais) for locais in painel_ufs.locais_por_cluster().values()) == len(painel_ufs)
+    assert isinstance(painel_ufs.para_dataframe(), pd.DataFrame)
@@ -0,0 +1,48 @@
+import numpy as np
+import pandas as pd
+
+from perfil_colunas import HyperLogLog, perfilar_colunas
+
+def _tabela(linhas=5_000):
+    rng = np.random.default_rng(0)
+    tabela = pd.DataFrame({
+        "Ano": rng.integers(2007, 2023, size=linhas),
+        "LOCAL": pd.Categorical(rng.choice(["Acre", "Bahia", "Pará", "Sergipe"], size=linhas)),
+        "Valor": rng.normal(size=linhas),
+        "Nome": rng.choice(["a", "b", None], size=linhas),
+    })
+    tabela.loc[::7, "Valor"] = np.nan
+    return tabela
+
+def test_perfil_em_blocos_igual_ao_da_tabela_inteira():
+    tabela = _tabela()
+    inteira = perfilar_colunas(tabela, tamanho_bloco=len(tabela)).set_index("coluna")
+    em_blocos = perfilar_colunas(tabela, tamanho_bloco=333).set_index("coluna")
+    de_iteravel = perfilar_colunas(tabela.iloc[i:i + 1000] for i in range(0, len(tabela), 1000)).set_index("coluna")
+    for perfil in (em_blocos, de_iteravel):
+        pd.testing.assert_frame_equal(perfil.drop(columns="amostra"), inteira.drop(columns="amostra"))
+
+    for coluna in tabela:
+        assert inteira.loc[coluna, "linhas"] == len(tabela)
+        assert inteira.loc[coluna, "nulos"] == tabela[coluna].isna().sum()
+        assert inteira.loc[coluna, "distintos"] == tabela[coluna].nunique()
+        assert not inteira.loc[coluna, "aproximado"]
+    assert inteira.loc["Ano", "minimo"] == tabela["Ano"].min()
+    assert inteira.loc["Valor", "maximo"] == tabela["Valor"].max()
+    assert inteira.loc["LOCAL", "minimo"] == "Acre" and inteira.loc["LOCAL", "maximo"] == "Sergipe"
+    assert inteira.loc["Nome", "tipo"] == "object"
+
+def test_distintos_aproximados_acima_do_limite():
+    valores = pd.DataFrame({"id": np.arange(50_000)})
+    perfil = perfilar_colunas(valores, limite_exato=1_000, tamanho_bloco=4_096).iloc[0]
+    assert perfil["aproximado"]
+    assert abs(perfil["distintos"] - 50_000) / 50_000 < 0.05
+
+def test_hyperloglog_repetidos_nao_contam():
+    hashes = pd.util.hash_pandas_object(pd.Series(np.arange(20_000)), index=False).to_numpy()
+    hll = HyperLogLog()
+    hll.adicionar(hashes)
+    estimativa = hll.estimar()
+    hll.adicionar(hashes[:5_000])
+    assert hll.estimar() == estimativa
+    assert abs(estimativa - 20_000) / 20_000 < 0.05
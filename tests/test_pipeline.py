@@ -0,0 +1,39 @@
+import os
+
+from cache_http import versoes_remotas
+from pipeline import executar
+
+def test_etapa_de_download_refeita_quando_a_fonte_muda(servidor, tmp_path):
+    conteudo = {"versao": b"primeira"}
+    servidor.rotas["/fonte.csv"] = lambda cabecalhos: (
+        (304, {}, b"") if cabecalhos.get("If-None-Match") == '"%s"' % conteudo["versao"].decode()
+        else (200, {"ETag": '"%s"' % conteudo["versao"].decode()}, conteudo["versao"]))
+    url = f"{servidor.url}/fonte.csv"
+    cache = str(tmp_path / "cache")
+    saida = str(tmp_path / "saida.txt")
+    execucoes, verificacoes = [], []
+
+    def baixar():
+        execucoes.append(1)
+        with open(saida, "w") as f:
+            f.write("ok")
+
+    etapas = [{"nome": "baixar", "titulo": "Baixar", "funcao": baixar, "entradas": [], "saidas": [saida],
+               "versao_remota": lambda verificar=True: verificacoes.append(verificar) or versoes_remotas(
+                   [url], max_idade=0, diretorio_cache=cache, verificar=verificar)}]
+    estado = str(tmp_path / "estado.json")
+
+    assert executar(etapas, arquivo_estado=estado) == ["baixar"]
+    # Fonte igual: revalidação com 304 e a etapa é pulada
+    assert executar(etapas, arquivo_estado=estado) == []
+    assert servidor.pedidos_de("/fonte.csv")[-1].get("If-None-Match") == '"primeira"'
+    # Fonte alterada: o dry-run não consulta o servidor e ainda vê a versão em cache
+    conteudo["versao"] = b"segunda"
+    pedidos = len(servidor.pedidos)
+    assert executar(etapas, arquivo_estado=estado, dry_run=True) == []
+    assert len(servidor.pedidos) == pedidos and verificacoes[-1] is False
+    # A etapa roda de novo sem --forcar, com a fonte consultada uma única vez
+    del verificacoes[:]
+    assert executar(etapas, arquivo_estado=estado) == ["baixar"]
+    assert len(execucoes) == 2 and os.path.exists(saida)
+    assert verificacoes == [True]
@@ -0,0 +1,39 @@
+import numpy as np
+
+from previsao import backtest, prever_matriz, selecionar_modelos
+
+ANOS = np.arange(2007, 2021)
+
+def test_modelos_em_series_conhecidas():
+    linear = 10 + 2 * (ANOS - ANOS[0])
+    valores = np.vstack([linear, np.full(len(ANOS), 5.0)])
+    alvo = np.array([2021, 2022])
+    esperado = np.array([[38.0, 40.0], [5.0, 5.0]])
+    for modelo in ("drift", "holt", "amortecido"):
+        previsto = prever_matriz(valores, ANOS, alvo, modelo)
+        np.testing.assert_allclose(previsto[1], esperado[1])
+        if modelo != "amortecido":
+            np.testing.assert_allclose(previsto[0], esperado[0])
+    np.testing.assert_allclose(prever_matriz(valores, ANOS, alvo, "naive"), [[36.0, 36.0], [5.0, 5.0]])
+
+def test_holt_calculado_a_mao():
+    # Nível 1 e tendência 2 iniciais; no 3º ano (4 contra 5 previsto) todos os parâmetros têm o mesmo erro,
+    # e vale o primeiro da grade (alfa 0,2 e beta 0,05): nível 4,8 e tendência 1,99
+    previsto = prever_matriz([[1.0, 3.0, 4.0]], [2018, 2019, 2020], [2021, 2022], "holt")
+    np.testing.assert_allclose(previsto, [[4.8 + 1.99, 4.8 + 2 * 1.99]])
+
+def test_backtest_escolhe_o_modelo_sem_erro():
+    linear = 10 + 2 * (ANOS - ANOS[0])
+    erros = backtest(np.vstack([linear, [np.nan] * len(ANOS)]), ANOS, horizonte=2, n_origens=3)
+    assert erros.shape == (4, 2)
+    np.testing.assert_allclose(erros[:, 0], [3.0, 0.0, 0.0, erros[3, 0]])
+    assert list(selecionar_modelos(erros)) == ["drift", "drift"]
+
+def test_incerteza_so_le_os_erros_no_metodo_automatico(monkeypatch):
+    import main
+
+    for metodo, esperado in (("automatico", True), ("linear", False)):
+        monkeypatch.setattr(main, "METODO_PREVISAO", metodo)
+        etapas = {etapa["nome"]: etapa for etapa in main.declarar_etapas()}
+        assert any("erros_previsao" in entrada for entrada in etapas["incerteza"]["entradas"]) == esperado
+        assert any("erros_previsao" in saida for saida in etapas["analisar"]["saidas"]) == esperado
@@ -0,0 +1,29 @@
+import numpy as np
+import pytest
+
+from dados_sinteticos import gerar_locais, gerar_sidra
+from painel import Painel
+from puxar_sidra import ajustar_dataframe
+from razoes import RAZOES_PADRAO, Razao, calcular_razoes, nome_razao
+
+def painel_e_tabela():
+    tabela = ajustar_dataframe(gerar_sidra(n_locais=6, faltantes=0))
+    locais = np.array([nome for _, _, nome, _ in gerar_locais(6)], dtype=object)
+    anos = np.arange(2007, 2023)
+    populacao = np.full((len(locais), len(anos)), 1_000_000.0)
+    return Painel(locais, anos, populacao, populacao / 100, np.full_like(populacao, 100.0)), tabela
+
+def test_razoes_padrao_resolvidas_pelo_codigo():
+    painel, tabela = painel_e_tabela()
+    resultado = calcular_razoes(painel, tabela)
+    for especificacao in RAZOES_PADRAO:
+        razao = resultado.metricas[nome_razao(especificacao)]
+        assert np.isfinite(razao).all() and (razao > 0).all()
+
+def test_razao_nao_resolvida_levanta_erro():
+    painel, tabela = painel_e_tabela()
+    with pytest.raises(ValueError, match="Valor das obras"):
+        calcular_razoes(painel, tabela, [Razao("populacao", "Obras", "1757", "Valor das obras")])
+    # "Pessoal ocupado" corresponde a duas variáveis (706 e 707)
+    with pytest.raises(ValueError, match="706 \\(Pessoal ocupado total\\)"):
+        calcular_razoes(painel, tabela, [Razao("populacao", "Pessoal", "1757", "Pessoal ocupado")])
@@ -0,0 +1,52 @@
+import numpy as np
+import pandas as pd
+
+from analize import identificar_oportunidades_e_saturacao
+from painel import Painel
+from reamostragem import probabilidades_classificacao, residuos_relativos
+
+def _com_ruido(painel):
+    """Painel com 5% de ruído na população, para que as réplicas mudem a classificação de alguns locais."""
+    ruido = 1 + np.random.default_rng(1).normal(0, 0.05, size=painel.populacao.shape)
+    return Painel(painel.locais, painel.anos, painel.populacao * ruido, painel.empresas, cluster=painel.cluster)
+
+def _por_local(resultado):
+    return resultado.set_index("LOCAL").sort_index()
+
+def test_probabilidades_validas_e_situacao_da_analise(painel_ufs):
+    painel_ufs = _com_ruido(painel_ufs)
+    resultado = probabilidades_classificacao(painel_ufs, n_replicas=400, metodo="linear")
+    assert len(resultado) == len(painel_ufs)
+    for coluna in ("P(saturado)", "P(oportunidade)"):
+        assert resultado[coluna].between(0, 1).all()
+    assert (resultado["P(saturado)"] + resultado["P(oportunidade)"] <= 1).all()
+    assert resultado["P(saturado)"].between(0, 1, inclusive="neither").any()
+    media = resultado["Razão média 2021-2022"]
+    assert (resultado["IC 95% inferior"] <= media + 1e-9).all() and (media <= resultado["IC 95% superior"] + 1e-9).all()
+
+    saturados, oportunidades = identificar_oportunidades_e_saturacao(painel_ufs)
+    situacao = resultado.set_index("LOCAL")["Situação"]
+    assert sorted(situacao[situacao == "Saturado"].index) == sorted(saturados)
+    assert sorted(situacao[situacao == "Oportunidade"].index) == sorted(oportunidades)
+
+def test_resultado_determinado_pela_semente_e_nao_pelo_bloco(painel_ufs):
+    painel_ufs = _com_ruido(painel_ufs)
+    opcoes = {"n_replicas": 300, "metodo": "linear", "semente": 7}
+    referencia = _por_local(probabilidades_classificacao(painel_ufs, **opcoes))
+    pd.testing.assert_frame_equal(_por_local(probabilidades_classificacao(painel_ufs, **opcoes)), referencia)
+    pd.testing.assert_frame_equal(_por_local(probabilidades_classificacao(painel_ufs, tamanho_bloco=16, **opcoes)),
+                                  referencia)
+    outra = _por_local(probabilidades_classificacao(painel_ufs, **{**opcoes, "semente": 8}))
+    assert not outra["P(saturado)"].equals(referencia["P(saturado)"])
+
+def test_series_sem_ruido_tem_classificacao_certa():
+    anos = np.arange(2010, 2023)
+    inclinacoes = np.linspace(1, 10, 8)
+    populacao = 100 + inclinacoes[:, None] * (anos - anos[0])[None, :]
+    painel = Painel([f"L{i}" for i in range(8)], anos, populacao, np.ones_like(populacao))
+    assert np.allclose(np.nan_to_num(residuos_relativos(painel.razao, anos.astype(float))), 0)
+
+    resultado = probabilidades_classificacao(painel, n_replicas=200, metodo="linear")
+    esperado = resultado["Situação"].map({"Saturado": 1.0, "Oportunidade": 0.0, "Neutro": 0.0})
+    np.testing.assert_array_equal(resultado["P(saturado)"], esperado)
+    np.testing.assert_allclose(resultado["IC 95% inferior"], resultado["Razão média 2021-2022"], rtol=1e-3)
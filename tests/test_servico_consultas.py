@@ -0,0 +1,55 @@
+import json
+import os
+
+import pandas as pd
+import pytest
+
+from analize import identificar_oportunidades_e_saturacao
+from armazenamento import ler_tabela, salvar_tabela
+from painel import Painel
+from servico_consultas import ServicoConsultas
+
+def _salvar(painel, caminho, mtime_ns):
+    salvar_tabela(painel.para_dataframe(), caminho)
+    os.utime(caminho, ns=(mtime_ns, mtime_ns))
+
+def test_ranking_igual_ao_da_analise(painel_ufs, tmp_path):
+    caminho = str(tmp_path / "merged_data.parquet")
+    _salvar(painel_ufs, caminho, 10 ** 18)
+    servico = ServicoConsultas(caminho)
+    saturados, oportunidades = identificar_oportunidades_e_saturacao(painel_ufs)
+    for tipo, esperados in (("saturados", saturados), ("oportunidades", oportunidades)):
+        status, corpo = servico.consultar(f"/ranking?tipo={tipo}&n={len(esperados)}")
+        assert status == 200
+        assert {item["local"] for item in json.loads(corpo)["locais"]} == set(esperados)
+
+def test_recarga_troca_a_geracao_do_cache(painel_ufs, tmp_path):
+    caminho = str(tmp_path / "merged_data.parquet")
+    _salvar(painel_ufs, caminho, 10 ** 18)
+    servico = ServicoConsultas(caminho)
+    antes = servico.consultar("/ranking?n=1")
+    geracao = servico._atual[0]
+
+    invertido = Painel(painel_ufs.locais, painel_ufs.anos, painel_ufs.empresas, painel_ufs.populacao,
+                       cluster=painel_ufs.cluster)
+    _salvar(invertido, caminho, 2 * 10 ** 18)
+    assert servico.recarregar_se_mudou()
+    assert servico._atual[0] == geracao + 1
+    assert servico.consultar("/ranking?n=1") != antes
+
+def test_gravacao_interrompida_mantem_o_arquivo_anterior(tmp_path, monkeypatch):
+    caminho = str(tmp_path / "tabela.parquet")
+    salvar_tabela(pd.DataFrame({"LOCAL": ["a"], "Valor": [1.0]}), caminho)
+
+    def falhar(self, destino, **opcoes):
+        with open(destino, "wb") as f:
+            f.write(b"PAR1 incompleto")
+        raise OSError("disco cheio")
+
+    monkeypatch.setattr(pd.DataFrame, "to_parquet", falhar)
+    with pytest.raises(OSError):
+        salvar_tabela(pd.DataFrame({"LOCAL": ["b"], "Valor": [2.0]}), caminho)
+    monkeypatch.undo()
+
+    assert ler_tabela(caminho)["Valor"].tolist() == [1.0]
+    assert os.listdir(tmp_path) == ["tabela.parquet"]
@@ -0,0 +1,42 @@
+import pandas as pd
+import pytest
+
+from armazenamento import salvar_tabela
+from dados_sinteticos import gerar_sidra
+from puxar_sidra import ajustar_dataframe
+from tratamento import Plano, drop_columns, filter_dataframe, load_csv_files, rename_column
+
+@pytest.mark.parametrize("extensao", [".parquet", ".feather", ".csv"])
+def test_plano_preguicoso_igual_as_funcoes_imediatas(tmp_path, extensao):
+    sidra = ajustar_dataframe(gerar_sidra(40, n_variaveis=3))
+    caminhos = []
+    for nome, anos in (("dados_2007_2020", range(2007, 2021)), ("dados_2021_2022", (2021, 2022))):
+        caminhos.append(salvar_tabela(sidra[sidra["Ano"].astype(int).isin(anos)], str(tmp_path / (nome + extensao))))
+
+    imediato = load_csv_files(caminhos)
+    imediato = filter_dataframe(imediato, "Variável", "Número de empresas ativas")
+    imediato = rename_column(imediato, "Variável (Código)", "Número de empresas ativas")
+    imediato = drop_columns(imediato, ["Variável"]).reset_index(drop=True)
+
+    plano = load_csv_files(caminhos, lazy=True)
+    plano = drop_columns(rename_column(filter_dataframe(plano, "Variável", "Número de empresas ativas"),
+                                       "Variável (Código)", "Número de empresas ativas"), ["Variável"])
+    assert isinstance(plano, Plano)
+    assert plano.colunas() == list(imediato.columns)
+
+    opcoes = {"check_dtype": False, "check_categorical": False}
+    pd.testing.assert_frame_equal(plano.executar(), imediato, **opcoes)
+    em_blocos = pd.concat(list(plano.blocos(tamanho_bloco=97)), ignore_index=True)
+    pd.testing.assert_frame_equal(em_blocos, imediato, **opcoes)
+    # O mesmo plano sobre um DataFrame em memória
+    pd.testing.assert_frame_equal(Plano(load_csv_files(caminhos)).filtrar("Variável", "Número de empresas ativas")
+                                  .renomear("Variável (Código)", "Número de empresas ativas")
+                                  .remover(["Variável"]).executar().reset_index(drop=True), imediato, **opcoes)
+
+def test_plano_recusa_coluna_ja_renomeada():
+    plano = Plano(pd.DataFrame({"a": [1, 2], "b": [3, 4]})).renomear("a", "c")
+    with pytest.raises(KeyError, match="renomeada"):
+        plano.filtrar("a", 1)
+    with pytest.raises(KeyError):
+        plano.remover(["z"]).colunas()
+    assert plano.filtrar("c", 2).executar().to_dict("list") == {"c": [2], "b": [4]}